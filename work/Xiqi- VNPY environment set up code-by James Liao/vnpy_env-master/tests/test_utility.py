@@ -0,0 +1,33 @@
+import random
+import unittest
+
+import numpy as np
+
+from vnpy.trader.utility import round_to, round_to_array
+
+
+class RoundToArrayTest(unittest.TestCase):
+    """"""
+
+    def test_half_values(self):
+        """"""
+        values = np.array([0.15, 0.25, 0.35, 1.05, 2.5, 3.5, -0.15, -2.5])
+        for target in (0.1, 1, 0.2, 0.5):
+            expected = [round_to(value, target) for value in values]
+            self.assertEqual(round_to_array(values, target).tolist(), expected)
+
+    def test_random_values(self):
+        """"""
+        rng = random.Random(0)
+
+        for target in (0.001, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 5, 10):
+            values = np.array([
+                round(rng.uniform(-10000, 10000), rng.randint(0, 4))
+                for _ in range(20000)
+            ])
+            expected = [round_to(value, target) for value in values]
+            self.assertEqual(round_to_array(values, target).tolist(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
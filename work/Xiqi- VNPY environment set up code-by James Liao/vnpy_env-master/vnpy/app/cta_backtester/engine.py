@@ -3,6 +3,7 @@ import importlib
 import traceback
 from datetime import datetime
 from threading import Thread
+from time import perf_counter
 from pathlib import Path
 from inspect import getfile
 
@@ -384,8 +385,14 @@ class BacktesterEngine(BaseEngine):
                 data = rqdata_client.query_history(req)
 
             if data:
+                start_time = perf_counter()
                 database_manager.save_bar_data(data)
-                self.write_log(f"{vt_symbol}-{interval}历史数据下载完成")
+                cost = max(perf_counter() - start_time, 1e-6)
+
+                self.write_log(
+                    f"{vt_symbol}-{interval}历史数据下载完成，"
+                    f"数据量：{len(data)}，写入速度：{len(data) / cost:.0f}条/秒"
+                )
             else:
                 self.write_log(f"数据下载失败，无法获取{vt_symbol}的历史数据")
         except Exception:
@@ -1,104 +1,111 @@
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta
-from typing import Callable
-from itertools import product
+from typing import Callable, Dict, Iterator, List, Tuple
+from itertools import chain, islice
 from functools import lru_cache
 from time import time
+import hashlib
+import inspect
 import multiprocessing
-import random
+import pickle
+import shutil
+import tempfile
 import traceback
 
 import numpy as np
 from pandas import DataFrame
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from deap import creator, base, tools, algorithms
 
 from vnpy.trader.constant import (Direction, Offset, Exchange,
                                   Interval, Status)
 from vnpy.trader.database import database_manager
 from vnpy.trader.object import OrderData, TradeData, BarData, TickData
-from vnpy.trader.utility import round_to
+from vnpy.trader.optimize import (
+    OptimizationSetting,
+    OptimizationMixin,
+    run_ga_optimization,
+    init_optimization,
+    evaluate
+)
+from vnpy.trader.utility import round_to, BarArrays, get_folder_path
 
 from .base import (
     BacktestingMode,
     EngineType,
     STOPORDER_PREFIX,
     StopOrder,
+    StopOrderBook,
     StopOrderStatus,
     INTERVAL_DELTA_MAP
 )
 from .template import CtaTemplate
 
 
-# Set deap algo
-creator.create("FitnessMax", base.Fitness, weights=(1.0,))
-creator.create("Individual", list, fitness=creator.FitnessMax)
-
-
-class OptimizationSetting:
-    """
-    Setting for runnning optimization.
+class OptimizationCache:
     """
+    On-disk cache of optimization results.
 
-    def __init__(self):
-        """"""
-        self.params = {}
-        self.target_name = ""
+    Results of one backtesting context (strategy code, data range and
+    trading costs) are appended to a pickle file as soon as they are
+    calculated, so that interrupted optimization can be resumed and
+    settings already evaluated are skipped in later runs.
+    """
 
-    def add_parameter(
-        self, name: str, start: float, end: float = None, step: float = None
-    ):
+    def __init__(self, key: str):
         """"""
-        if not end and not step:
-            self.params[name] = [start]
-            return
+        self.key: str = key
+        self.file_path = get_folder_path("optimization").joinpath(f"{key}.pkl")
+        self.results: dict = {}
 
-        if start >= end:
-            print("参数优化起始点必须小于终止点")
-            return
+        self.load()
 
-        if step <= 0:
-            print("参数优化步进必须大于0")
+    def load(self):
+        """
+        Load all results saved before.
+        """
+        if not self.file_path.exists():
             return
 
-        value = start
-        value_list = []
-
-        while value <= end:
-            value_list.append(value)
-            value += step
+        with open(self.file_path, mode="rb") as f:
+            while True:
+                try:
+                    setting_str, statistics = pickle.load(f)
+                except EOFError:
+                    break
+                # Last record may be incomplete if process was killed
+                except Exception:
+                    break
 
-        self.params[name] = value_list
+                self.results[setting_str] = statistics
 
-    def set_target(self, target_name: str):
-        """"""
-        self.target_name = target_name
+    def get(self, setting: dict):
+        """
+        Get statistics of setting, return None if not calculated.
+        """
+        return self.results.get(str(setting), None)
 
-    def generate_setting(self):
-        """"""
-        keys = self.params.keys()
-        values = self.params.values()
-        products = list(product(*values))
+    def put(self, setting_str: str, statistics: dict):
+        """
+        Save statistics of setting into cache file.
+        """
+        self.results[setting_str] = statistics
 
-        settings = []
-        for p in products:
-            setting = dict(zip(keys, p))
-            settings.append(setting)
+        with open(self.file_path, mode="ab") as f:
+            pickle.dump((setting_str, statistics), f)
 
-        return settings
+    def clear(self):
+        """
+        Remove all results of this context.
+        """
+        self.results.clear()
 
-    def generate_setting_ga(self):
-        """"""
-        settings_ga = []
-        settings = self.generate_setting()
-        for d in settings:
-            param = [tuple(i) for i in d.items()]
-            settings_ga.append(param)
-        return settings_ga
+        if self.file_path.exists():
+            self.file_path.unlink()
 
 
-class BacktestingEngine:
+class BacktestingEngine(OptimizationMixin):
     """"""
 
     engine_type = EngineType.BACKTESTING
@@ -133,6 +140,7 @@ class BacktestingEngine:
         self.stop_order_count = 0
         self.stop_orders = {}
         self.active_stop_orders = {}
+        self.stop_order_book = StopOrderBook()
 
         self.limit_order_count = 0
         self.limit_orders = {}
@@ -143,7 +151,7 @@ class BacktestingEngine:
 
         self.logs = []
 
-        self.daily_results = {}
+        self.daily_recorder = DailyRecorder()
         self.daily_df = None
 
         self.collection_name = None
@@ -160,6 +168,7 @@ class BacktestingEngine:
         self.stop_order_count = 0
         self.stop_orders.clear()
         self.active_stop_orders.clear()
+        self.stop_order_book.clear()
 
         self.limit_order_count = 0
         self.limit_orders.clear()
@@ -169,7 +178,8 @@ class BacktestingEngine:
         self.trades.clear()
 
         self.logs.clear()
-        self.daily_results.clear()
+        self.daily_recorder.clear()
+        self.daily_df = None
 
     def set_parameters(
         self,
@@ -213,8 +223,17 @@ class BacktestingEngine:
             self, strategy_class.__name__, self.vt_symbol, setting
         )
 
-    def load_data(self):
-        """"""
+    def load_data(self, stream: bool = False, workers: int = 4, prefetch: int = 8):
+        """
+        Load history data from database in windows of 30 days. Windows
+        are queried concurrently by a pool of workers threads, with at most
+        prefetch windows loaded ahead of the one being consumed.
+
+        With stream, nothing is loaded here. Instead history_data is set
+        to a generator which loads windows in background while it is
+        consumed by run_backtesting, so that the whole history (e.g. ticks
+        of several years) never has to fit in memory at once.
+        """
         self.output("开始加载历史数据")
 
         if not self.end:
@@ -224,49 +243,119 @@ class BacktestingEngine:
             self.output("起始日期必须小于结束日期")
             return
 
-        self.history_data.clear()       # Clear previously loaded history data
+        if stream:
+            self.history_data = self.iter_history_data(workers, prefetch)
+            self.output("历史数据将在回放时流式加载")
+            return
 
-        # Load 30 days of data each time and allow for progress update
+        # Clear previously loaded history data
+        self.history_data = []
+
+        for data in self.iter_history_windows(workers, prefetch):
+            self.history_data.extend(data)
+
+        self.output(f"历史数据加载完成，数据量：{len(self.history_data)}")
+
+    def generate_windows(self) -> List[Tuple[datetime, datetime]]:
+        """
+        Split backtesting date range into windows of 30 days.
+        """
         progress_delta = timedelta(days=30)
-        total_delta = self.end - self.start
         interval_delta = INTERVAL_DELTA_MAP[self.interval]
 
         start = self.start
         end = self.start + progress_delta
-        progress = 0
+
+        windows = []
 
         while start < self.end:
             end = min(end, self.end)  # Make sure end time stays within set range
+            windows.append((start, end))
 
-            if self.mode == BacktestingMode.BAR:
-                data = load_bar_data(
-                    self.symbol,
-                    self.exchange,
-                    self.interval,
-                    start,
-                    end,
-                    self.collection_name
-                )
+            start = end + interval_delta
+            end += (progress_delta + interval_delta)
+
+        return windows
+
+    def load_window(self, start: datetime, end: datetime, use_cache: bool = True):
+        """
+        Load history data of one window. Data loaded with use_cache is
+        kept in process memory for later backtesting runs.
+        """
+        if self.mode == BacktestingMode.BAR:
+            if use_cache:
+                func = load_bar_data
             else:
-                data = load_tick_data(
-                    self.symbol,
-                    self.exchange,
-                    start,
-                    end,
-                    self.collection_name
-                )
+                func = database_manager.load_bar_data
 
-            self.history_data.extend(data)
+            return func(
+                self.symbol,
+                self.exchange,
+                self.interval,
+                start,
+                end,
+                self.collection_name
+            )
+        else:
+            if use_cache:
+                func = load_tick_data
+            else:
+                func = database_manager.load_tick_data
+
+            return func(
+                self.symbol,
+                self.exchange,
+                start,
+                end,
+                self.collection_name
+            )
 
-            progress += progress_delta / total_delta
-            progress = min(progress, 1)
-            progress_bar = "#" * int(progress * 10)
-            self.output(f"加载进度：{progress_bar} [{progress:.0%}]")
+    def iter_history_windows(
+        self,
+        workers: int = 4,
+        prefetch: int = 8,
+        use_cache: bool = True
+    ) -> Iterator:
+        """
+        Load windows concurrently with thread pool and yield data of every
+        window in time order.
+        """
+        windows = self.generate_windows()
+        if not windows:
+            return
 
-            start = end + interval_delta
-            end += (progress_delta + interval_delta)
+        progress_delta = timedelta(days=30)
+        total_delta = self.end - self.start
+        progress = 0
 
-        self.output(f"历史数据加载完成，数据量：{len(self.history_data)}")
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            window_iter = iter(windows)
+            futures = deque()
+
+            for start, end in islice(window_iter, max(prefetch, 1)):
+                futures.append(executor.submit(self.load_window, start, end, use_cache))
+
+            while futures:
+                data = futures.popleft().result()
+
+                # Keep number of windows loaded ahead bounded
+                for start, end in islice(window_iter, 1):
+                    futures.append(executor.submit(self.load_window, start, end, use_cache))
+
+                progress += progress_delta / total_delta
+                progress = min(progress, 1)
+                progress_bar = "#" * int(progress * 10)
+                self.output(f"加载进度：{progress_bar} [{progress:.0%}]")
+
+                yield data
+
+    def iter_history_data(self, workers: int = 4, prefetch: int = 8) -> Iterator:
+        """
+        Generate history data one by one for streaming backtesting. Data
+        is not cached so that memory used is bounded by prefetch windows.
+        """
+        for data in self.iter_history_windows(workers, prefetch, False):
+            yield from data
 
     def run_backtesting(self):
         """"""
@@ -277,11 +366,14 @@ class BacktestingEngine:
 
         self.strategy.on_init()
 
-        # Use the first [days] of history data for initializing strategy
+        # Use the first [days] of history data for initializing strategy.
+        # History data may be a generator in streaming mode, so it is
+        # consumed only once with an iterator.
         day_count = 0
-        ix = 0
+        data_iter = iter(self.history_data)
+        data = None
 
-        for ix, data in enumerate(self.history_data):
+        for data in data_iter:
             if self.datetime and data.datetime.day != self.datetime.day:
                 day_count += 1
                 if day_count >= self.days:
@@ -303,8 +395,14 @@ class BacktestingEngine:
         self.strategy.trading = True
         self.output("开始回放历史数据")
 
-        # Use the rest of history data for running backtesting
-        for data in self.history_data[ix:]:
+        # Use the rest of history data for running backtesting, starting
+        # from the last data checked above
+        if data is not None:
+            replay_data = chain([data], data_iter)
+        else:
+            replay_data = []
+
+        for data in replay_data:
             try:
                 func(data)
             except Exception:
@@ -314,45 +412,67 @@ class BacktestingEngine:
 
         self.output("历史数据回放结束")
 
-    def calculate_result(self):
-        """"""
+    def calculate_result(self, include_trades: bool = False):
+        """
+        Calculate daily pnl of all days at once with values recorded
+        during replay. Trade list of every day is only added into result
+        DataFrame with include_trades.
+        """
         self.output("开始计算逐日盯市盈亏")
 
         if not self.trades:
             self.output("成交记录为空，无法计算")
             return
 
-        # Add trade data into daily reuslt.
-        for trade in self.trades.values():
-            d = trade.datetime.date()
-            daily_result = self.daily_results[d]
-            daily_result.add_trade(trade)
+        dates, data = self.daily_recorder.get_arrays()
 
-        # Calculate daily result by iteration.
-        pre_close = 0
-        start_pos = 0
+        close_price = data["close_price"]
+        pos_change = data["pos_change"]
+        trade_cost = data["trade_cost"]
 
-        for daily_result in self.daily_results.values():
-            daily_result.calculate_pnl(
-                pre_close,
-                start_pos,
-                self.size,
-                self.rate,
-                self.slippage,
-                self.inverse
-            )
+        # If no pre_close provided (on the first day),
+        # use value 1 to avoid zero division error
+        pre_close = np.concatenate(([0], close_price[:-1]))
+        pre_close[pre_close == 0] = 1
+
+        end_pos = pos_change.cumsum()
+        start_pos = np.concatenate(([0], end_pos[:-1]))
+
+        if not self.inverse:     # For normal contract
+            holding_pnl = start_pos * (close_price - pre_close) * self.size
+            trading_pnl = (pos_change * close_price - trade_cost) * self.size
+        else:               # For crypto currency inverse contract
+            holding_pnl = start_pos * (1 / pre_close - 1 / close_price) * self.size
+            trading_pnl = (trade_cost - pos_change / close_price) * self.size
 
-            pre_close = daily_result.close_price
-            start_pos = daily_result.end_pos
+        # Net pnl takes account of commission and slippage cost
+        total_pnl = trading_pnl + holding_pnl
+        net_pnl = total_pnl - data["commission"] - data["slippage"]
+
+        results = {
+            "date": dates,
+            "close_price": close_price,
+            "pre_close": pre_close,
+            "trade_count": data["trade_count"].astype(int),
+            "start_pos": start_pos,
+            "end_pos": end_pos,
+            "turnover": data["turnover"],
+            "commission": data["commission"],
+            "slippage": data["slippage"],
+            "trading_pnl": trading_pnl,
+            "holding_pnl": holding_pnl,
+            "total_pnl": total_pnl,
+            "net_pnl": net_pnl,
+        }
 
-        # Generate dataframe
-        results = defaultdict(list)
+        if include_trades:
+            daily_trades = defaultdict(list)
+            for trade in self.trades.values():
+                daily_trades[trade.datetime.date()].append(trade)
 
-        for daily_result in self.daily_results.values():
-            for key, value in daily_result.__dict__.items():
-                results[key].append(value)
+            results["trades"] = [daily_trades[d] for d in dates]
 
-        self.daily_df = DataFrame.from_dict(results).set_index("date")
+        self.daily_df = DataFrame(results).set_index("date")
 
         self.output("逐日盯市盈亏计算完成")
         return self.daily_df
@@ -566,28 +686,109 @@ class BacktestingEngine:
         fig.update_layout(height=1000, width=1000)
         fig.show()
 
-    def run_optimization(self, optimization_setting: OptimizationSetting, output=True):
-        """"""
-        # Get optimization setting and target
-        settings = optimization_setting.generate_setting()
-        target_name = optimization_setting.target_name
+    def run_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        output=True,
+        callback: Callable = None,
+        use_cache: bool = True
+    ):
+        """
+        Run optimization and return results sorted by target value.
 
-        if not settings:
+        Callback (if provided) is called with every result as soon as it
+        is available. See iter_optimization for caching of results.
+        """
+        if not optimization_setting.generate_setting():
             self.output("优化参数组合为空，请检查")
             return
 
-        if not target_name:
+        if not optimization_setting.target_name:
             self.output("优化目标未设置，请检查")
             return
 
+        result_values = []
+
+        for result in self.iter_optimization(optimization_setting, output, use_cache):
+            result_values.append(result)
+
+            if callback:
+                callback(result)
+
+        # Sort results and output
+        result_values.sort(reverse=True, key=lambda result: result[1])
+
+        if output:
+            for value in result_values:
+                msg = f"参数：{value[0]}, 目标：{value[1]}"
+                self.output(msg)
+
+        return result_values
+
+    def iter_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        output=True,
+        use_cache: bool = True
+    ) -> Iterator[tuple]:
+        """
+        Run optimization with multiprocessing pool and yield result of
+        every setting (in completion order) as soon as it is calculated.
+
+        With use_cache, every result is saved into OptimizationCache
+        immediately, and settings already evaluated with the same strategy
+        code, data range and costs are yielded from cache without running
+        backtesting again, so an interrupted optimization can be resumed.
+        """
+        settings = optimization_setting.generate_setting()
+        target_name = optimization_setting.target_name
+
+        if not settings or not target_name:
+            return
+
+        use_cache = self.check_optimization_cache(use_cache, output)
+
+        if not self.end:
+            self.end = datetime.now()
+
+        if use_cache:
+            cache = OptimizationCache(self.get_optimization_key())
+        else:
+            cache = None
+
+        # Yield results already calculated before
+        pending = []
+
+        for setting in settings:
+            statistics = None
+            if cache:
+                statistics = cache.get(setting)
+
+            if statistics:
+                yield (str(setting), statistics[target_name], statistics)
+            else:
+                pending.append(setting)
+
+        total = len(settings)
+        finished = total - len(pending)
+
+        if not pending:
+            return
+
+        if output and finished:
+            self.output(f"从缓存读取优化结果：{finished}/{total}")
+
+        # Load history data only once and share it with all processes
+        history_path = self.publish_history_data()
+
         # Use multiprocessing pool for running backtesting with different setting
         # Force to use spawn method to create new process (instead of fork on Linux)
         ctx = multiprocessing.get_context("spawn")
         pool = ctx.Pool(multiprocessing.cpu_count())
 
-        results = []
-        for setting in settings:
-            result = (pool.apply_async(optimize, (
+        args_list = []
+        for setting in pending:
+            args_list.append((
                 target_name,
                 self.strategy_class,
                 setting,
@@ -601,163 +802,256 @@ class BacktestingEngine:
                 self.capital,
                 self.end,
                 self.mode,
-                self.inverse
-            )))
-            results.append(result)
+                self.inverse,
+                self.collection_name,
+                history_path
+            ))
 
-        pool.close()
-        pool.join()
+        start = time()
+        count = 0
+        output_step = max(len(pending) // 100, 1)
 
-        # Sort results and output
-        result_values = [result.get() for result in results]
-        result_values.sort(reverse=True, key=lambda result: result[1])
+        try:
+            for result in pool.imap_unordered(optimize_args, args_list):
+                if cache:
+                    cache.put(result[0], result[2])
 
-        if output:
-            for value in result_values:
-                msg = f"参数：{value[0]}, 目标：{value[1]}"
-                self.output(msg)
+                count += 1
+                finished += 1
 
-        return result_values
+                if output and (not count % output_step or finished == total):
+                    cost = time() - start
+                    eta = int(cost / count * (len(pending) - count))
+                    self.output(f"优化进度：{finished}/{total}，预计剩余{eta}秒")
 
-    def run_ga_optimization(self, optimization_setting: OptimizationSetting, population_size=100, ngen_size=30, output=True):
-        """"""
-        # Get optimization setting and target
-        settings = optimization_setting.generate_setting_ga()
-        target_name = optimization_setting.target_name
+                yield result
 
-        if not settings:
-            self.output("优化参数组合为空，请检查")
-            return
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+            self.remove_history_data(history_path)
 
-        if not target_name:
-            self.output("优化目标未设置，请检查")
-            return
+    def check_optimization_cache(self, use_cache: bool, output: bool = True) -> bool:
+        """
+        Results are only cached with end date set explicitly, since default
+        end (current time) makes key of cache different in every run.
+        """
+        if use_cache and not self.end:
+            if output:
+                self.output("未设置结束日期，优化结果不使用缓存")
+            return False
 
-        # Define parameter generation function
-        def generate_parameter():
-            """"""
-            return random.choice(settings)
-
-        def mutate_individual(individual, indpb):
-            """"""
-            size = len(individual)
-            paramlist = generate_parameter()
-            for i in range(size):
-                if random.random() < indpb:
-                    individual[i] = paramlist[i]
-            return individual,
-
-        # Create ga object function
-        global ga_target_name
-        global ga_strategy_class
-        global ga_setting
-        global ga_vt_symbol
-        global ga_interval
-        global ga_start
-        global ga_rate
-        global ga_slippage
-        global ga_size
-        global ga_pricetick
-        global ga_capital
-        global ga_end
-        global ga_mode
-        global ga_inverse
-        global ga_collection_name
-
-        ga_target_name = target_name
-        ga_strategy_class = self.strategy_class
-        ga_setting = settings[0]
-        ga_vt_symbol = self.vt_symbol
-        ga_interval = self.interval
-        ga_start = self.start
-        ga_rate = self.rate
-        ga_slippage = self.slippage
-        ga_size = self.size
-        ga_pricetick = self.pricetick
-        ga_capital = self.capital
-        ga_end = self.end
-        ga_mode = self.mode
-        ga_inverse = self.inverse
-        ga_collection_name = self.collection_name
-
-        # Set up genetic algorithem
-        toolbox = base.Toolbox()
-        toolbox.register("individual", tools.initIterate, creator.Individual, generate_parameter)
-        toolbox.register("population", tools.initRepeat, list, toolbox.individual)
-        toolbox.register("mate", tools.cxTwoPoint)
-        toolbox.register("mutate", mutate_individual, indpb=1)
-        toolbox.register("evaluate", ga_optimize)
-        toolbox.register("select", tools.selNSGA2)
-
-        total_size = len(settings)
-        pop_size = population_size                      # number of individuals in each generation
-        lambda_ = pop_size                              # number of children to produce at each generation
-        mu = int(pop_size * 0.8)                        # number of individuals to select for the next generation
-
-        cxpb = 0.95         # probability that an offspring is produced by crossover
-        mutpb = 1 - cxpb    # probability that an offspring is produced by mutation
-        ngen = ngen_size    # number of generation
-
-        pop = toolbox.population(pop_size)
-        hof = tools.ParetoFront()               # end result of pareto front
-
-        stats = tools.Statistics(lambda ind: ind.fitness.values)
-        np.set_printoptions(suppress=True)
-        stats.register("mean", np.mean, axis=0)
-        stats.register("std", np.std, axis=0)
-        stats.register("min", np.min, axis=0)
-        stats.register("max", np.max, axis=0)
-
-        # Multiprocessing is not supported yet.
-        # pool = multiprocessing.Pool(multiprocessing.cpu_count())
-        # toolbox.register("map", pool.map)
-
-        # Run ga optimization
-        self.output(f"参数优化空间：{total_size}")
-        self.output(f"每代族群总数：{pop_size}")
-        self.output(f"优良筛选个数：{mu}")
-        self.output(f"迭代次数：{ngen}")
-        self.output(f"交叉概率：{cxpb:.0%}")
-        self.output(f"突变概率：{mutpb:.0%}")
+        return use_cache
 
-        start = time()
+    def get_optimization_key(self) -> str:
+        """
+        Generate key of optimization cache from strategy code, data range
+        and trading costs.
+        """
+        try:
+            strategy_code = inspect.getsource(self.strategy_class)
+        except (OSError, TypeError):
+            strategy_code = self.strategy_class.__name__
+
+        def to_str(value) -> str:
+            """Use qualified name for functions (e.g. pricetick callable)"""
+            if isinstance(value, Callable):
+                return f"{value.__module__}.{value.__qualname__}"
+            return str(value)
+
+        context = [
+            strategy_code,
+            self.vt_symbol,
+            self.interval,
+            self.start,
+            self.end,
+            self.mode,
+            self.collection_name,
+            self.rate,
+            self.slippage,
+            self.size,
+            self.pricetick,
+            self.capital,
+            self.inverse,
+        ]
+        text = "|".join(to_str(value) for value in context)
+
+        return hashlib.md5(text.encode("UTF-8")).hexdigest()
+
+    def clear_optimization_cache(self):
+        """
+        Remove cached optimization results of current context.
+        """
+        OptimizationCache(self.get_optimization_key()).clear()
 
-        algorithms.eaMuPlusLambda(
-            pop,
-            toolbox,
-            mu,
-            lambda_,
-            cxpb,
-            mutpb,
-            ngen,
-            stats,
-            halloffame=hof
-        )
+    def run_ga_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        population_size=100,
+        ngen_size=30,
+        output=True,
+        use_cache: bool = True,
+        max_workers: int = None
+    ):
+        """
+        Run genetic algorithm optimization in process pool. See
+        iter_optimization for caching of results.
+        """
+        use_cache = self.check_optimization_cache(use_cache, output)
 
-        end = time()
-        cost = int((end - start))
+        if not self.end:
+            self.end = datetime.now()
+
+        if use_cache:
+            cache = OptimizationCache(self.get_optimization_key())
+        else:
+            cache = None
+
+        # Load history data only once and share it with all processes
+        history_path = self.publish_history_data()
+
+        try:
+            return run_ga_optimization(
+                evaluate,
+                optimization_setting,
+                population_size=population_size,
+                ngen_size=ngen_size,
+                max_workers=max_workers,
+                initializer=init_optimization,
+                initargs=self.get_optimization_args(history_path),
+                output=self.get_optimization_output(output),
+                cache=cache
+            )
+        finally:
+            self.remove_history_data(history_path)
 
-        self.output(f"遗传算法优化完成，耗时{cost}秒")
+    def get_optimization_parameters(self) -> dict:
+        """"""
+        parameters = {
+            "vt_symbol": self.vt_symbol,
+            "interval": self.interval,
+            "start": self.start,
+            "rate": self.rate,
+            "slippage": self.slippage,
+            "size": self.size,
+            "pricetick": self.pricetick,
+            "capital": self.capital,
+            "end": self.end,
+            "mode": self.mode,
+            "inverse": self.inverse,
+            "collection_name": self.collection_name,
+        }
+        return parameters
 
-        # Return result list
-        results = []
+    def get_optimization_data(self) -> str:
+        """
+        History data is published by run_ga_optimization, otherwise loaded
+        from database in worker.
+        """
+        return ""
 
-        for parameter_values in hof:
-            setting = dict(parameter_values)
-            target_value = ga_optimize(parameter_values)[0]
-            results.append((setting, target_value, {}))
+    def set_optimization_data(self, history_path: str) -> None:
+        """
+        Attach bar data saved by publish_history_data, or load from database
+        if not available.
+        """
+        if history_path:
+            self.history_data = list(BarArrays.load(history_path).iter_bars())
+        else:
+            self.load_data()
 
-        return results
+    def get_optimization_engine_class(self) -> type:
+        """"""
+        return FastBacktestingEngine
+
+    def publish_history_data(self) -> str:
+        """
+        Load bar history data once and save it into memory-mapped numpy
+        files, which are attached by optimization runs without loading
+        from database or copying data again.
+
+        Return path of the data folder, or empty string for tick mode or
+        if no data is available.
+        """
+        if self.mode != BacktestingMode.BAR:
+            return ""
+
+        engine = FastBacktestingEngine()
+        engine.output = self.output
+        engine.set_parameters(
+            vt_symbol=self.vt_symbol,
+            interval=self.interval,
+            start=self.start,
+            rate=self.rate,
+            slippage=self.slippage,
+            size=self.size,
+            pricetick=self.pricetick,
+            capital=self.capital,
+            end=self.end,
+            mode=self.mode,
+            inverse=self.inverse,
+            collection_name=self.collection_name
+        )
+        engine.load_data()
+
+        if not engine.bar_arrays:
+            return ""
+
+        history_path = tempfile.mkdtemp(prefix="vnpy_backtesting_")
+        engine.bar_arrays.save(history_path)
+        return history_path
+
+    def remove_history_data(self, history_path: str):
+        """
+        Remove data folder created by publish_history_data.
+        """
+        if history_path:
+            shutil.rmtree(history_path, ignore_errors=True)
 
     def update_daily_close(self, price: float):
         """"""
-        d = self.datetime.date()
+        self.daily_recorder.update_close(self.datetime.date(), price)
 
-        daily_result = self.daily_results.get(d, None)
-        if daily_result:
-            daily_result.close_price = price
+    def update_daily_trade(self, trade: TradeData):
+        """
+        Accumulate trade into statistics of its day.
+        """
+        if trade.direction == Direction.LONG:
+            pos_change = trade.volume
         else:
-            self.daily_results[d] = DailyResult(d, price)
+            pos_change = -trade.volume
+
+        if isinstance(self.slippage, Callable):
+            slippage = self.slippage(trade.price)
+        else:
+            slippage = self.slippage
+
+        # Trading pnl of the day is calculated after replay as
+        # (pos_change * close_price - trade_cost) * size for normal contract
+        # (trade_cost - pos_change / close_price) * size for inverse contract
+        if not self.inverse:
+            trade_cost = pos_change * trade.price
+            turnover = trade.volume * self.size * trade.price
+            slippage_cost = trade.volume * self.size * slippage
+        else:
+            trade_cost = pos_change / trade.price
+            turnover = trade.volume * self.size / trade.price
+            slippage_cost = trade.volume * self.size * slippage / (trade.price ** 2)
+
+        if isinstance(self.rate, Callable):
+            commission = self.rate(cost=trade.price, multiplier=self.size, qty=trade.volume)
+        else:
+            commission = turnover * self.rate
+
+        self.daily_recorder.add_trade(
+            trade.datetime.date(),
+            pos_change,
+            trade_cost,
+            turnover,
+            commission,
+            slippage_cost
+        )
 
     def new_bar(self, bar: BarData):
         """"""
@@ -852,6 +1146,7 @@ class BacktestingEngine:
             self.strategy.on_trade(trade)
 
             self.trades[trade.vt_tradeid] = trade
+            self.update_daily_trade(trade)
 
     def cross_stop_order(self):
         """
@@ -868,20 +1163,14 @@ class BacktestingEngine:
             long_best_price = long_cross_price
             short_best_price = short_cross_price
 
-        for stop_order in list(self.active_stop_orders.values()):
-            # Check whether stop order can be triggered.
-            long_cross = (
-                stop_order.direction == Direction.LONG
-                and stop_order.price <= long_cross_price
-            )
+        # Only stop orders can be triggered are found from stop order book,
+        # in the same order as they are sent.
+        triggered = self.stop_order_book.get_triggered(
+            self.vt_symbol, long_cross_price, short_cross_price
+        )
 
-            short_cross = (
-                stop_order.direction == Direction.SHORT
-                and stop_order.price >= short_cross_price
-            )
-
-            if not long_cross and not short_cross:
-                continue
+        for stop_order in triggered:
+            long_cross = stop_order.direction == Direction.LONG
 
             # Create order data.
             self.limit_order_count += 1
@@ -925,6 +1214,7 @@ class BacktestingEngine:
             )
 
             self.trades[trade.vt_tradeid] = trade
+            self.update_daily_trade(trade)
 
             # Update stop order.
             stop_order.vt_orderids.append(order.vt_orderid)
@@ -932,6 +1222,7 @@ class BacktestingEngine:
 
             if stop_order.stop_orderid in self.active_stop_orders:
                 self.active_stop_orders.pop(stop_order.stop_orderid)
+            self.stop_order_book.remove(stop_order.stop_orderid)
 
             # Push update to strategy.
             self.strategy.on_stop_order(stop_order)
@@ -1000,6 +1291,7 @@ class BacktestingEngine:
 
         self.active_stop_orders[stop_order.stop_orderid] = stop_order
         self.stop_orders[stop_order.stop_orderid] = stop_order
+        self.stop_order_book.add(stop_order)
 
         return stop_order.stop_orderid
 
@@ -1045,6 +1337,7 @@ class BacktestingEngine:
         if vt_orderid not in self.active_stop_orders:
             return
         stop_order = self.active_stop_orders.pop(vt_orderid)
+        self.stop_order_book.remove(vt_orderid)
 
         stop_order.status = StopOrderStatus.CANCELLED
         self.strategy.on_stop_order(stop_order)
@@ -1127,9 +1420,276 @@ class BacktestingEngine:
 
     def get_all_daily_results(self):
         """
-        Return all daily result data.
+        Return all daily result data calculated by calculate_result.
+        """
+        if self.daily_df is None:
+            return []
+
+        results = []
+
+        for d, values in zip(self.daily_df.index, self.daily_df.to_dict("records")):
+            daily_result = DailyResult(d, values["close_price"])
+            daily_result.__dict__.update(values)
+            results.append(daily_result)
+
+        return results
+
+
+class FastBacktestingEngine(BacktestingEngine):
+    """
+    Backtesting engine with a fast path for bar mode.
+
+    History bars are stored in columnar numpy arrays (BarArrays) instead of
+    a list of BarData objects, and BarData is only created right before it
+    is passed into strategy callbacks. Order matching is skipped when there
+    is no active order, and daily close prices are calculated from arrays
+    after replay instead of being updated on every bar.
+
+    Trades and daily results are identical to those of BacktestingEngine.
+    Tick mode falls back to the normal implementation.
+    """
+
+    def __init__(self):
+        """"""
+        super().__init__()
+
+        self.bar_arrays: BarArrays = None
+
+    def set_optimization_data(self, history_path: str) -> None:
+        """"""
+        if history_path:
+            self.bar_arrays = BarArrays.load(history_path)
+        else:
+            super().set_optimization_data(history_path)
+
+    def load_data(self, stream: bool = False, workers: int = 4, prefetch: int = 8):
+        """
+        Load bar data into arrays. Streaming is done by BacktestingEngine
+        since arrays are always kept in memory.
+        """
+        self.bar_arrays = None
+
+        if self.mode != BacktestingMode.BAR or stream:
+            super().load_data(stream, workers, prefetch)
+            return
+
+        self.output("开始加载历史数据")
+
+        if not self.end:
+            self.end = datetime.now()
+
+        if self.start >= self.end:
+            self.output("起始日期必须小于结束日期")
+            return
+
+        arrays_list = list(self.iter_history_windows(workers, prefetch))
+        self.bar_arrays = BarArrays.concatenate(arrays_list)
+
+        if self.bar_arrays:
+            count = len(self.bar_arrays)
+        else:
+            count = 0
+        self.output(f"历史数据加载完成，数据量：{count}")
+
+    def load_window(self, start: datetime, end: datetime, use_cache: bool = True):
+        """
+        Load bar data of one window as arrays.
+        """
+        if self.mode != BacktestingMode.BAR or not use_cache:
+            return super().load_window(start, end, use_cache)
+
+        return load_bar_arrays(
+            self.symbol,
+            self.exchange,
+            self.interval,
+            start,
+            end,
+            self.collection_name
+        )
+
+    def set_bar_data(self, bars: list):
+        """
+        Use bar data provided directly instead of loading from database.
+        """
+        self.bar_arrays = BarArrays.from_bars(bars)
+
+    def run_backtesting(self):
+        """"""
+        if self.mode != BacktestingMode.BAR or not self.bar_arrays:
+            super().run_backtesting()
+            return
+
+        arrays = self.bar_arrays
+
+        self.strategy.on_init()
+
+        # Use the first [days] of history data for initializing strategy,
+        # the day count increases every time day of month changes.
+        days = arrays.datetime.astype("datetime64[D]") - arrays.datetime.astype("datetime64[M]")
+        day_changes = np.flatnonzero(days[1:] != days[:-1]) + 1
+
+        if self.datetime:
+            # Day change against the datetime left by previous run
+            previous_day = self.datetime.day - 1
+            if days[0].astype(int) != previous_day:
+                day_changes = np.concatenate(([0], day_changes))
+
+        # Index of the bar which stops initialization
+        target = max(self.days, 1) - 1
+        if target < len(day_changes):
+            ix = int(day_changes[target])
+            init_end = ix
+        else:
+            ix = len(arrays) - 1
+            init_end = len(arrays)
+
+        for bar in arrays.iter_bars(0, init_end):
+            self.datetime = bar.datetime
+
+            try:
+                self.callback(bar)
+            except Exception:
+                self.output("触发异常，回测终止")
+                self.output(traceback.format_exc())
+                return
+
+        self.strategy.inited = True
+        self.output("策略初始化完成")
+
+        self.strategy.on_start()
+        self.strategy.trading = True
+        self.output("开始回放历史数据")
+
+        # Use the rest of history data for running backtesting
+        on_bar = self.strategy.on_bar
+        replay_end = ix
+
+        for bar in arrays.iter_bars(ix):
+            self.bar = bar
+            self.datetime = bar.datetime
+
+            try:
+                if self.active_limit_orders:
+                    self.cross_limit_order()
+                if self.active_stop_orders:
+                    self.cross_stop_order()
+                on_bar(bar)
+            except Exception:
+                self.update_daily_results(ix, replay_end)
+                self.output("触发异常，回测终止")
+                self.output(traceback.format_exc())
+                return
+
+            replay_end += 1
+
+        self.update_daily_results(ix, replay_end)
+        self.output("历史数据回放结束")
+
+    def update_daily_results(self, start: int, end: int):
+        """
+        Update daily close price with the last bar of every day
+        in index range [start, end).
         """
-        return list(self.daily_results.values())
+        if start >= end:
+            return
+
+        arrays = self.bar_arrays
+        dates = arrays.get_dates()[start:end]
+
+        last_ixs = np.flatnonzero(dates[1:] != dates[:-1])
+        last_ixs = np.append(last_ixs, len(dates) - 1)
+
+        close_prices = arrays.close_price[start:end][last_ixs].tolist()
+
+        for d, price in zip(dates[last_ixs].tolist(), close_prices):
+            self.daily_recorder.update_close(d, price)
+
+
+class DailyRecorder:
+    """
+    Close price and trade statistics of every day recorded during replay.
+
+    Every trade is accumulated into values of its day as soon as it
+    happens, so that daily pnl of all days can be calculated with arrays
+    at once after replay, without keeping trade list of every day.
+    """
+
+    fields: List[str] = [
+        "close_price",
+        "trade_count",
+        "pos_change",
+        "trade_cost",
+        "turnover",
+        "commission",
+        "slippage",
+    ]
+
+    def __init__(self):
+        """"""
+        self.dates: List[date] = []
+        self.indexes: Dict[date, int] = {}
+        self.data: Dict[str, List[float]] = {name: [] for name in self.fields}
+
+    def get_index(self, d: date) -> int:
+        """
+        Get index of the day, add a new day if not exists.
+        """
+        ix = self.indexes.get(d, None)
+
+        if ix is None:
+            ix = len(self.dates)
+            self.indexes[d] = ix
+            self.dates.append(d)
+
+            for values in self.data.values():
+                values.append(0)
+
+        return ix
+
+    def update_close(self, d: date, price: float) -> None:
+        """"""
+        self.data["close_price"][self.get_index(d)] = price
+
+    def add_trade(
+        self,
+        d: date,
+        pos_change: float,
+        trade_cost: float,
+        turnover: float,
+        commission: float,
+        slippage: float
+    ) -> None:
+        """"""
+        ix = self.get_index(d)
+        data = self.data
+
+        data["trade_count"][ix] += 1
+        data["pos_change"][ix] += pos_change
+        data["trade_cost"][ix] += trade_cost
+        data["turnover"][ix] += turnover
+        data["commission"][ix] += commission
+        data["slippage"][ix] += slippage
+
+    def get_arrays(self) -> Tuple[List[date], Dict[str, np.ndarray]]:
+        """
+        Get dates and values of all days as arrays in date order.
+        """
+        order = sorted(range(len(self.dates)), key=self.dates.__getitem__)
+        dates = [self.dates[ix] for ix in order]
+
+        arrays = {
+            name: np.array(values, dtype=float)[order]
+            for name, values in self.data.items()
+        }
+        return dates, arrays
+
+    def clear(self) -> None:
+        """"""
+        self.dates.clear()
+        self.indexes.clear()
+
+        for values in self.data.values():
+            values.clear()
 
 
 class DailyResult:
@@ -1241,12 +1801,19 @@ def optimize(
     end: datetime,
     mode: BacktestingMode,
     inverse: bool,
-    collection_name: str = None
+    collection_name: str = None,
+    history_path: str = ""
 ):
     """
     Function for running in multiprocessing.pool
+
+    If history_path is given, bar data saved by publish_history_data
+    is attached with memory mapping instead of loading from database.
     """
-    engine = BacktestingEngine()
+    if history_path:
+        engine = FastBacktestingEngine()
+    else:
+        engine = BacktestingEngine()
 
     engine.set_parameters(
         vt_symbol=vt_symbol,
@@ -1264,7 +1831,12 @@ def optimize(
     )
 
     engine.add_strategy(strategy_class, setting)
-    engine.load_data()
+
+    if history_path:
+        engine.bar_arrays = BarArrays.load(history_path)
+    else:
+        engine.load_data()
+
     engine.run_backtesting()
     engine.calculate_result()
     statistics = engine.calculate_statistics(output=False)
@@ -1273,34 +1845,11 @@ def optimize(
     return (str(setting), target_value, statistics)
 
 
-@lru_cache(maxsize=1000000)
-def _ga_optimize(parameter_values: tuple):
-    """"""
-    setting = dict(parameter_values)
-
-    result = optimize(
-        ga_target_name,
-        ga_strategy_class,
-        setting,
-        ga_vt_symbol,
-        ga_interval,
-        ga_start,
-        ga_rate,
-        ga_slippage,
-        ga_size,
-        ga_pricetick,
-        ga_capital,
-        ga_end,
-        ga_mode,
-        ga_inverse,
-        ga_collection_name
-    )
-    return (result[1],)
-
-
-def ga_optimize(parameter_values: list):
-    """"""
-    return _ga_optimize(tuple(parameter_values))
+def optimize_args(args: tuple):
+    """
+    Function for running in multiprocessing.pool with imap.
+    """
+    return optimize(*args)
 
 
 @lru_cache(maxsize=999)
@@ -1332,18 +1881,16 @@ def load_tick_data(
     )
 
 
-# GA related global value
-ga_end = None
-ga_mode = None
-ga_target_name = None
-ga_strategy_class = None
-ga_setting = None
-ga_vt_symbol = None
-ga_interval = None
-ga_start = None
-ga_rate = None
-ga_slippage = None
-ga_size = None
-ga_pricetick = None
-ga_capital = None
-ga_collection_name = None
+@lru_cache(maxsize=999)
+def load_bar_arrays(
+    symbol: str,
+    exchange: Exchange,
+    interval: Interval,
+    start: datetime,
+    end: datetime,
+    collection_name: str,
+):
+    """"""
+    return database_manager.load_bar_arrays(
+        symbol, exchange, interval, start, end, collection_name
+    )
@@ -2,9 +2,12 @@
 Defines constants and objects used in CtaStrategy App.
 """
 
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
 from dataclasses import dataclass, field
 from enum import Enum
 from datetime import timedelta
+from typing import Dict, List, Tuple
 
 from vnpy.trader.constant import Direction, Offset, Interval
 
@@ -42,6 +45,97 @@ class StopOrder:
     status: StopOrderStatus = StopOrderStatus.WAITING
 
 
+class StopOrderBook:
+    """
+    Index of active stop orders by vt_symbol and direction. Orders of
+    each side are sorted by price, so that those can be triggered by a
+    price are found with bisect instead of checking all stop orders.
+    """
+
+    def __init__(self):
+        """"""
+        self.count: int = 0
+
+        # (vt_symbol, direction): sorted list of (price, count, stop_orderid)
+        self.books: Dict[Tuple[str, Direction], List[tuple]] = defaultdict(list)
+
+        # stop_orderid: (book key, entry, stop order)
+        self.entries: Dict[str, tuple] = {}
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.entries)
+
+    def __contains__(self, stop_orderid: str) -> bool:
+        """"""
+        return stop_orderid in self.entries
+
+    def add(self, stop_order: StopOrder) -> None:
+        """
+        Add new stop order into book.
+        """
+        self.count += 1
+
+        key = (stop_order.vt_symbol, stop_order.direction)
+        entry = (stop_order.price, self.count, stop_order.stop_orderid)
+
+        insort(self.books[key], entry)
+        self.entries[stop_order.stop_orderid] = (key, entry, stop_order)
+
+    def remove(self, stop_orderid: str) -> StopOrder:
+        """
+        Remove stop order from book, return None if not found.
+        """
+        if stop_orderid not in self.entries:
+            return None
+
+        key, entry, stop_order = self.entries.pop(stop_orderid)
+
+        book = self.books[key]
+        ix = bisect_left(book, entry)
+        del book[ix]
+
+        if not book:
+            self.books.pop(key)
+
+        return stop_order
+
+    def clear(self) -> None:
+        """"""
+        self.count = 0
+        self.books.clear()
+        self.entries.clear()
+
+    def get_triggered(
+        self,
+        vt_symbol: str,
+        long_cross_price: float,
+        short_cross_price: float
+    ) -> List[StopOrder]:
+        """
+        Get stop orders of vt_symbol which can be triggered, that is long
+        orders with price <= long_cross_price and short orders with
+        price >= short_cross_price, in the order they were added.
+        """
+        triggered = []
+
+        book = self.books.get((vt_symbol, Direction.LONG), None)
+        if book:
+            ix = bisect_right(book, (long_cross_price, float("inf")))
+            triggered.extend(book[:ix])
+
+        book = self.books.get((vt_symbol, Direction.SHORT), None)
+        if book:
+            ix = bisect_left(book, (short_cross_price, float("-inf")))
+            triggered.extend(book[ix:])
+
+        if not triggered:
+            return triggered
+
+        triggered.sort(key=lambda entry: entry[1])
+        return [self.entries[entry[2]][2] for entry in triggered]
+
+
 EVENT_CTA_LOG = "eCtaLog"
 EVENT_CTA_STRATEGY = "eCtaStrategy"
 EVENT_CTA_STOPORDER = "eCtaStopOrder"
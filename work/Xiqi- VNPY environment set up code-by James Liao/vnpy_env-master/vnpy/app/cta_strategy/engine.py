@@ -40,6 +40,8 @@ from vnpy.trader.utility import load_json, save_json, extract_vt_symbol, round_t
 from vnpy.trader.database import database_manager
 from vnpy.trader.rqdata import rqdata_client
 from vnpy.trader.converter import OffsetConverter
+from vnpy.trader.persistence import JsonDataStore
+from vnpy.trader.history import HistoryService
 
 from .base import (
     APP_NAME,
@@ -48,6 +50,7 @@ from .base import (
     EVENT_CTA_STOPORDER,
     EngineType,
     StopOrder,
+    StopOrderBook,
     StopOrderStatus,
     STOPORDER_PREFIX
 )
@@ -79,6 +82,7 @@ class CtaEngine(BaseEngine):
 
         self.strategy_setting = {}  # strategy_name: dict
         self.strategy_data = {}     # strategy_name: dict
+        self.data_store = JsonDataStore(self.data_filename)
 
         self.classes = {}           # class_name: stategy_class
         self.strategies = {}        # strategy_name: strategy
@@ -91,6 +95,7 @@ class CtaEngine(BaseEngine):
 
         self.stop_order_count = 0   # for generating stop_orderid
         self.stop_orders = {}       # stop_orderid: stop_order
+        self.stop_order_book = StopOrderBook()  # index of stop_orders
 
         self.init_executor = ThreadPoolExecutor(max_workers=1)
 
@@ -101,6 +106,8 @@ class CtaEngine(BaseEngine):
 
         self.offset_converter = OffsetConverter(self.main_engine)
 
+        self.history_service = HistoryService(self.main_engine)
+
     def init_engine(self):
         """
         """
@@ -114,6 +121,7 @@ class CtaEngine(BaseEngine):
     def close(self):
         """"""
         self.stop_all_strategies()
+        self.data_store.close()
 
     def register_event(self):
         """"""
@@ -229,64 +237,66 @@ class CtaEngine(BaseEngine):
         self.offset_converter.update_position(position)
 
     def check_stop_order(self, tick: TickData):
-        """"""
-        for stop_order in list(self.stop_orders.values()):
-            if stop_order.vt_symbol != tick.vt_symbol:
+        """
+        Only stop orders of tick vt_symbol which can be triggered by last
+        price are found from stop order book.
+        """
+        triggered = self.stop_order_book.get_triggered(
+            tick.vt_symbol, tick.last_price, tick.last_price
+        )
+
+        for stop_order in triggered:
+            # Stop order may be cancelled by strategy callback of
+            # previous triggered one
+            if stop_order.stop_orderid not in self.stop_orders:
                 continue
 
-            long_triggered = (
-                stop_order.direction == Direction.LONG and tick.last_price >= stop_order.price
-            )
-            short_triggered = (
-                stop_order.direction == Direction.SHORT and tick.last_price <= stop_order.price
-            )
+            strategy = self.strategies[stop_order.strategy_name]
 
-            if long_triggered or short_triggered:
-                strategy = self.strategies[stop_order.strategy_name]
-
-                # To get excuted immediately after stop order is
-                # triggered, use limit price if available, otherwise
-                # use ask_price_5 or bid_price_5
-                if stop_order.direction == Direction.LONG:
-                    if tick.limit_up:
-                        price = tick.limit_up
-                    else:
-                        price = tick.ask_price_5
+            # To get excuted immediately after stop order is
+            # triggered, use limit price if available, otherwise
+            # use ask_price_5 or bid_price_5
+            if stop_order.direction == Direction.LONG:
+                if tick.limit_up:
+                    price = tick.limit_up
                 else:
-                    if tick.limit_down:
-                        price = tick.limit_down
-                    else:
-                        price = tick.bid_price_5
-
-                contract = self.main_engine.get_contract(stop_order.vt_symbol)
-
-                vt_orderids = self.send_limit_order(
-                    strategy,
-                    contract,
-                    stop_order.direction,
-                    stop_order.offset,
-                    price,
-                    stop_order.volume,
-                    stop_order.lock
-                )
+                    price = tick.ask_price_5
+            else:
+                if tick.limit_down:
+                    price = tick.limit_down
+                else:
+                    price = tick.bid_price_5
+
+            contract = self.main_engine.get_contract(stop_order.vt_symbol)
+
+            vt_orderids = self.send_limit_order(
+                strategy,
+                contract,
+                stop_order.direction,
+                stop_order.offset,
+                price,
+                stop_order.volume,
+                stop_order.lock
+            )
 
-                # Update stop order status if placed successfully
-                if vt_orderids:
-                    # Remove from relation map.
-                    self.stop_orders.pop(stop_order.stop_orderid)
+            # Update stop order status if placed successfully
+            if vt_orderids:
+                # Remove from relation map.
+                self.stop_orders.pop(stop_order.stop_orderid)
+                self.stop_order_book.remove(stop_order.stop_orderid)
 
-                    strategy_vt_orderids = self.strategy_orderid_map[strategy.strategy_name]
-                    if stop_order.stop_orderid in strategy_vt_orderids:
-                        strategy_vt_orderids.remove(stop_order.stop_orderid)
+                strategy_vt_orderids = self.strategy_orderid_map[strategy.strategy_name]
+                if stop_order.stop_orderid in strategy_vt_orderids:
+                    strategy_vt_orderids.remove(stop_order.stop_orderid)
 
-                    # Change stop order status to cancelled and update to strategy.
-                    stop_order.status = StopOrderStatus.TRIGGERED
-                    stop_order.vt_orderids = vt_orderids
+                # Change stop order status to cancelled and update to strategy.
+                stop_order.status = StopOrderStatus.TRIGGERED
+                stop_order.vt_orderids = vt_orderids
 
-                    self.call_strategy_func(
-                        strategy, strategy.on_stop_order, stop_order
-                    )
-                    self.put_stop_order_event(stop_order)
+                self.call_strategy_func(
+                    strategy, strategy.on_stop_order, stop_order
+                )
+                self.put_stop_order_event(stop_order)
 
     def send_server_order(
         self,
@@ -417,6 +427,7 @@ class CtaEngine(BaseEngine):
         )
 
         self.stop_orders[stop_orderid] = stop_order
+        self.stop_order_book.add(stop_order)
 
         vt_orderids = self.strategy_orderid_map[strategy.strategy_name]
         vt_orderids.add(stop_orderid)
@@ -449,6 +460,7 @@ class CtaEngine(BaseEngine):
 
         # Remove from relation map.
         self.stop_orders.pop(stop_orderid)
+        self.stop_order_book.remove(stop_orderid)
 
         vt_orderids = self.strategy_orderid_map[strategy.strategy_name]
         if stop_orderid in vt_orderids:
@@ -535,28 +547,14 @@ class CtaEngine(BaseEngine):
         symbol, exchange = extract_vt_symbol(vt_symbol)
         end = datetime.now(get_localzone())
         start = end - timedelta(days)
-        bars = []
 
-        # Pass gateway and RQData if use_database set to True
+        # Download data missing in database from gateway or RQData,
+        # pass them if use_database set to True
         if not use_database:
-            # Query bars from gateway if available
-            contract = self.main_engine.get_contract(vt_symbol)
-
-            if contract and contract.history_data:
-                req = HistoryRequest(
-                    symbol=symbol,
-                    exchange=exchange,
-                    interval=interval,
-                    start=start,
-                    end=end
-                )
-                bars = self.main_engine.query_history(req, contract.gateway_name)
-
-            # Try to query bars from RQData, if not found, load from database.
-            else:
-                bars = self.query_bar_from_rq(symbol, exchange, interval, start, end)
-
-        if not bars:
+            bars = self.history_service.load_bar_data(
+                symbol, exchange, interval, start, end
+            )
+        else:
             bars = database_manager.load_bar_data(
                 symbol=symbol,
                 exchange=exchange,
@@ -798,18 +796,19 @@ class CtaEngine(BaseEngine):
         """
         Load strategy data from json file.
         """
-        self.strategy_data = load_json(self.data_filename)
+        self.strategy_data = self.data_store.load()
 
     def sync_strategy_data(self, strategy: CtaTemplate):
         """
-        Sync strategy data into json file.
+        Sync strategy data into json file, which is saved by background
+        writer of data store.
         """
         data = strategy.get_variables()
         data.pop("inited")      # Strategy status (inited, trading) should not be synced.
         data.pop("trading")
 
         self.strategy_data[strategy.strategy_name] = data
-        save_json(self.data_filename, self.strategy_data)
+        self.data_store.update(strategy.strategy_name, data)
 
     def get_all_strategy_class_names(self):
         """
@@ -839,9 +838,32 @@ class CtaEngine(BaseEngine):
     def init_all_strategies(self):
         """
         """
+        # Update history data of all symbols concurrently first
+        self.init_executor.submit(self.update_history_data)
+
         for strategy_name in self.strategies.keys():
             self.init_strategy(strategy_name)
 
+    def update_history_data(self):
+        """
+        Download history data after newest bar in database for symbols
+        of strategies not inited.
+        """
+        vt_symbols = [
+            strategy.vt_symbol for strategy in self.strategies.values()
+            if not strategy.inited
+        ]
+
+        # Exception is not raised from future of init executor, so log it here
+        try:
+            count = self.history_service.update_symbols(vt_symbols)
+        except Exception:
+            msg = f"历史数据更新失败，触发异常：\n{traceback.format_exc()}"
+            self.write_log(msg)
+            return
+
+        self.write_log(f"历史数据更新完成，共下载{count}条数据")
+
     def start_all_strategies(self):
         """
         """
@@ -1,16 +1,120 @@
-import csv
-from datetime import datetime
-from typing import List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from queue import Queue
+from threading import Event
+from time import perf_counter
+from typing import BinaryIO, Callable, List, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
 
 from vnpy.trader.engine import BaseEngine, MainEngine, EventEngine
 from vnpy.trader.constant import Interval, Exchange
 from vnpy.trader.object import BarData, HistoryRequest
 from vnpy.trader.database import database_manager
-from vnpy.trader.rqdata import rqdata_client
+from vnpy.trader.database.database import DB_TZ
+from vnpy.trader.history import HistoryService
+from vnpy.trader.utility import BarArrays
 
 
 APP_NAME = "DataManager"
 
+# Rows parsed and saved at a time when importing csv file
+CSV_CHUNK_SIZE = 100_000
+
+# Time range of data loaded at a time when exporting csv file
+EXPORT_WINDOWS: Dict[Interval, timedelta] = {
+    Interval.MINUTE: timedelta(days=30),
+    Interval.HOUR: timedelta(days=365),
+    Interval.DAILY: timedelta(days=3650),
+}
+
+# Callback of progress, with count of bars and finished ratio (0 to 1).
+# Returning False cancels the task.
+ProgressCallback = Callable[[int, float], Optional[bool]]
+
+
+class NulFilter:
+    """
+    Binary file wrapper which removes NUL characters in data read.
+    """
+
+    def __init__(self, f: BinaryIO):
+        """"""
+        self.f: BinaryIO = f
+
+    def read(self, size: int = -1) -> bytes:
+        """"""
+        return self.f.read(size).replace(b"\0", b"")
+
+
+def read_csv_arrays(
+    file_path: str,
+    symbol: str,
+    exchange: Exchange,
+    interval: Interval,
+    heads: Dict[str, str],
+    datetime_format: str,
+    chunk_size: int = CSV_CHUNK_SIZE
+) -> Iterator[Tuple[BarArrays, float]]:
+    """
+    Parse csv file chunk by chunk into bar arrays, with ratio of file read.
+
+    Heads is the dict of BarArrays field name (and "datetime") to column
+    name in csv file. Open interest is set to 0 if its column not found,
+    while KeyError is raised if column of other fields not found.
+    """
+    usecols = set(heads.values())
+    float_heads = {heads[name] for name in BarArrays.fields}
+
+    with open(file_path, mode="rb") as f:
+        f.seek(0, 2)
+        total = max(f.tell(), 1)
+        f.seek(0)
+
+        reader = pd.read_csv(
+            NulFilter(f),
+            usecols=lambda c: c in usecols,
+            dtype={head: float for head in float_heads},
+            float_precision="round_trip",       # same value as float(str)
+            chunksize=chunk_size
+        )
+
+        for df in reader:
+            if datetime_format:
+                dt = pd.to_datetime(df[heads["datetime"]], format=datetime_format)
+            else:
+                dt = pd.to_datetime(df[heads["datetime"]])
+
+            # Keep timezone of datetime with offset, e.g. "2020-01-02 09:00:00+08:00"
+            if dt.dt.tz is not None:
+                dt = dt.dt.tz_convert(DB_TZ.zone).dt.tz_localize(None)
+                tz = DB_TZ
+            else:
+                tz = None
+
+            data = {"datetime": dt.to_numpy("datetime64[us]")}
+
+            for name in BarArrays.fields:
+                head = heads[name]
+                if head in df:
+                    data[name] = df[head].to_numpy(float)
+                elif name == "open_interest":
+                    data[name] = np.zeros(len(df))
+                else:
+                    raise KeyError(head)
+
+            arrays = BarArrays(
+                symbol,
+                exchange,
+                interval,
+                tzinfo=tz,
+                gateway_name="DB",
+                **data
+            )
+
+            yield arrays, f.tell() / total
+
 
 class ManagerEngine(BaseEngine):
     """"""
@@ -23,6 +127,8 @@ class ManagerEngine(BaseEngine):
         """"""
         super().__init__(main_engine, event_engine, APP_NAME)
 
+        self.history_service: HistoryService = HistoryService(main_engine)
+
     def import_data_from_csv(
         self,
         file_path: str,
@@ -36,52 +142,140 @@ class ManagerEngine(BaseEngine):
         close_head: str,
         volume_head: str,
         open_interest_head: str,
-        datetime_format: str
+        datetime_format: str,
+        callback: ProgressCallback = None
     ) -> Tuple:
-        """"""
-        with open(file_path, "rt") as f:
-            buf = [line.replace("\0", "") for line in f]
-
-        reader = csv.DictReader(buf, delimiter=",")
+        """
+        Import csv file chunk by chunk, so that memory used does not grow
+        with size of file.
+        """
+        results = self.import_data_from_csv_files(
+            [(file_path, symbol, exchange)],
+            interval,
+            datetime_head,
+            open_head,
+            high_head,
+            low_head,
+            close_head,
+            volume_head,
+            open_interest_head,
+            datetime_format,
+            max_workers=1,
+            callback=callback
+        )
+        return results[0]
 
-        bars = []
-        start = None
-        count = 0
+    def import_data_from_csv_files(
+        self,
+        files: List[Tuple[str, str, Exchange]],
+        interval: Interval,
+        datetime_head: str,
+        open_head: str,
+        high_head: str,
+        low_head: str,
+        close_head: str,
+        volume_head: str,
+        open_interest_head: str,
+        datetime_format: str,
+        max_workers: int = 4,
+        callback: ProgressCallback = None
+    ) -> List[Tuple]:
+        """
+        Import csv files of (file_path, symbol, exchange) with the same
+        format. Files are parsed in worker threads, while chunks parsed are
+        saved into database in calling thread one by one. Number of chunks
+        waiting to be saved is limited to bound memory used.
 
-        for item in reader:
-            if datetime_format:
-                dt = datetime.strptime(item[datetime_head], datetime_format)
+        Return (start, end, count, speed) of every file.
+        """
+        heads = {
+            "datetime": datetime_head,
+            "open_price": open_head,
+            "high_price": high_head,
+            "low_price": low_head,
+            "close_price": close_head,
+            "volume": volume_head,
+            "open_interest": open_interest_head,
+        }
+
+        queue = Queue(maxsize=max_workers * 2)
+        stopped = Event()
+
+        def parse(ix: int) -> None:
+            """"""
+            file_path, symbol, exchange = files[ix]
+
+            try:
+                for arrays, progress in read_csv_arrays(
+                    file_path, symbol, exchange, interval, heads, datetime_format
+                ):
+                    if stopped.is_set():
+                        break
+                    queue.put((ix, arrays, progress))
+            except Exception as e:
+                queue.put((ix, e, 1))
             else:
-                dt = datetime.fromisoformat(item[datetime_head])
-
-            open_interest = item.get(open_interest_head, 0)
-
-            bar = BarData(
-                symbol=symbol,
-                exchange=exchange,
-                datetime=dt,
-                interval=interval,
-                volume=item[volume_head],
-                open_price=item[open_head],
-                high_price=item[high_head],
-                low_price=item[low_head],
-                close_price=item[close_head],
-                open_interest=open_interest,
-                gateway_name="DB",
-            )
-
-            bars.append(bar)
+                queue.put((ix, None, 1))
 
-            # do some statistics
-            count += 1
-            if not start:
-                start = bar.datetime
+        starts = [None] * len(files)
+        ends = [None] * len(files)
+        counts = [0] * len(files)
+        progresses = [0] * len(files)
+        cost = 0
+        error = None
 
-        # insert into database
-        database_manager.save_bar_data(bars)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        for ix in range(len(files)):
+            executor.submit(parse, ix)
 
-        end = bar.datetime
-        return start, end, count
+        finished = 0
+        try:
+            while finished < len(files) and not stopped.is_set():
+                ix, arrays, progress = queue.get()
+
+                if arrays is None:
+                    finished += 1
+                elif isinstance(arrays, Exception):
+                    finished += 1
+                    error = arrays
+                    stopped.set()
+                    continue
+                elif len(arrays):
+                    start_time = perf_counter()
+                    database_manager.save_bar_arrays(arrays)
+                    cost += perf_counter() - start_time
+
+                    if starts[ix] is None:
+                        starts[ix] = arrays.get_bar(0).datetime
+                    ends[ix] = arrays.get_bar(len(arrays) - 1).datetime
+                    counts[ix] += len(arrays)
+
+                progresses[ix] = progress
+
+                if callback:
+                    total_progress = sum(progresses) / len(files)
+                    if callback(sum(counts), total_progress) is False:
+                        stopped.set()
+        finally:
+            # Keep draining queue after stopped (or failed) so that
+            # workers blocked on full queue can exit
+            stopped.set()
+
+            while finished < len(files):
+                _, arrays, _ = queue.get()
+                if not isinstance(arrays, BarArrays):
+                    finished += 1
+
+            executor.shutdown()
+
+        if error:
+            raise error
+
+        speed = sum(counts) / max(cost, 1e-6)
+        return [
+            (start, end, count, speed)
+            for start, end, count in zip(starts, ends, counts)
+        ]
 
     def output_data_to_csv(
         self,
@@ -90,46 +284,75 @@ class ManagerEngine(BaseEngine):
         exchange: Exchange,
         interval: Interval,
         start: datetime,
-        end: datetime
+        end: datetime,
+        callback: ProgressCallback = None
     ) -> bool:
-        """"""
-        bars = self.load_bar_data(symbol, exchange, interval, start, end)
-
-        fieldnames = [
-            "symbol",
-            "exchange",
-            "datetime",
-            "open",
-            "high",
-            "low",
-            "close",
-            "volume",
-            "open_interest"
-        ]
+        """
+        Export data into csv file window by window, so that memory used does
+        not grow with size of data.
+        """
+        header = "symbol,exchange,datetime,open,high,low,close,volume,open_interest\n"
+        count = 0
 
         try:
             with open(file_path, "w") as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator="\n")
-                writer.writeheader()
-
-                for bar in bars:
-                    d = {
-                        "symbol": bar.symbol,
-                        "exchange": bar.exchange.value,
-                        "datetime": bar.datetime.strftime("%Y-%m-%d %H:%M:%S"),
-                        "open": bar.open_price,
-                        "high": bar.high_price,
-                        "low": bar.low_price,
-                        "close": bar.close_price,
-                        "volume": bar.volume,
-                        "open_interest": bar.open_interest,
-                    }
-                    writer.writerow(d)
+                f.write(header)
+
+                for arrays, progress in self.iter_bar_arrays(
+                    symbol, exchange, interval, start, end
+                ):
+                    if len(arrays):
+                        dts = np.datetime_as_string(arrays.datetime, unit="s")
+
+                        df = pd.DataFrame({
+                            "symbol": symbol,
+                            "exchange": exchange.value,
+                            "datetime": np.char.replace(dts, "T", " "),
+                            "open": arrays.open_price,
+                            "high": arrays.high_price,
+                            "low": arrays.low_price,
+                            "close": arrays.close_price,
+                            "volume": arrays.volume,
+                            "open_interest": arrays.open_interest,
+                        })
+                        df.to_csv(f, header=False, index=False, lineterminator="\n")
+
+                        count += len(arrays)
+
+                    if callback and callback(count, progress) is False:
+                        break
 
             return True
         except PermissionError:
             return False
 
+    def iter_bar_arrays(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime
+    ) -> Iterator[Tuple[BarArrays, float]]:
+        """
+        Load bar data within [start, end] window by window, with ratio of
+        time range loaded.
+        """
+        window = EXPORT_WINDOWS.get(interval, timedelta(days=30))
+        total = max((end - start).total_seconds(), 1)
+
+        window_start = start
+        while window_start <= end:
+            window_end = min(window_start + window - timedelta(microseconds=1), end)
+
+            arrays = database_manager.load_bar_arrays(
+                symbol, exchange, interval, window_start, window_end
+            )
+            progress = min((window_end - start).total_seconds() / total, 1)
+            yield arrays, progress
+
+            window_start = window_end + timedelta(microseconds=1)
+
     def get_bar_data_available(self) -> List[Dict]:
         """"""
         data = database_manager.get_bar_data_statistics()
@@ -189,33 +412,29 @@ class ManagerEngine(BaseEngine):
         start: datetime
     ) -> int:
         """
-        Query bar data from RQData.
+        Download bar data not in database from gateway or RQData.
         """
-        req = HistoryRequest(
-            symbol=symbol,
-            exchange=exchange,
-            interval=Interval(interval),
-            start=start,
-            end=datetime.now()
+        return self.history_service.update(
+            symbol, exchange, Interval(interval), start
         )
 
-        vt_symbol = f"{symbol}.{exchange.value}"
-        contract = self.main_engine.get_contract(vt_symbol)
-
-        # If history data provided in gateway, then query
-        if contract and contract.history_data:
-            data = self.main_engine.query_history(
-                req, contract.gateway_name
+    def update_bar_data(self, callback: Callable[[int, int], Optional[bool]] = None) -> int:
+        """
+        Download bar data after newest bar of all data in database
+        concurrently. Callback is called with number of data finished and
+        total number, and returning False cancels the task.
+        """
+        end = datetime.now(DB_TZ)
+
+        reqs = [
+            HistoryRequest(
+                symbol=d["symbol"],
+                exchange=Exchange(d["exchange"]),
+                interval=Interval(d["interval"]),
+                start=d["end"],
+                end=end
             )
-        # Otherwise use RQData to query data
-        else:
-            if not rqdata_client.inited:
-                rqdata_client.init()
-
-            data = rqdata_client.query_history(req)
-
-        if data:
-            database_manager.save_bar_data(data)
-            return(len(data))
+            for d in self.get_bar_data_available()
+        ]
 
-        return 0
+        return sum(self.history_service.update_many(reqs, callback))
@@ -215,7 +215,9 @@ class ManagerWidget(QtWidgets.QWidget):
         open_interest_head = dialog.open_interest_edit.text()
         datetime_format = dialog.format_edit.text()
 
-        start, end, count = self.engine.import_data_from_csv(
+        progress_dialog = self.create_progress_dialog("CSV数据载入中", "载入进度")
+
+        start, end, count, speed = self.engine.import_data_from_csv(
             file_path,
             symbol,
             exchange,
@@ -227,9 +229,12 @@ class ManagerWidget(QtWidgets.QWidget):
             close_head,
             volume_head,
             open_interest_head,
-            datetime_format
+            datetime_format,
+            callback=partial(self.update_progress, progress_dialog)
         )
 
+        progress_dialog.close()
+
         msg = f"\
         CSV载入成功\n\
         代码：{symbol}\n\
@@ -238,6 +243,7 @@ class ManagerWidget(QtWidgets.QWidget):
         起始：{start}\n\
         结束：{end}\n\
         总数量：{count}\n\
+        写入速度：{speed:.0f}条/秒\n\
         "
         QtWidgets.QMessageBox.information(self, "载入成功！", msg)
 
@@ -267,15 +273,20 @@ class ManagerWidget(QtWidgets.QWidget):
         if not path:
             return
 
+        progress_dialog = self.create_progress_dialog("数据导出中", "导出进度")
+
         result = self.engine.output_data_to_csv(
             path,
             symbol,
             exchange,
             interval,
             start,
-            end
+            end,
+            callback=partial(self.update_progress, progress_dialog)
         )
 
+        progress_dialog.close()
+
         if not result:
             QtWidgets.QMessageBox.warning(
                 self,
@@ -283,6 +294,27 @@ class ManagerWidget(QtWidgets.QWidget):
                 "该文件已在其他程序中打开，请关闭相关程序后再尝试导出数据。"
             )
 
+    def create_progress_dialog(self, text: str, title: str) -> QtWidgets.QProgressDialog:
+        """"""
+        dialog = QtWidgets.QProgressDialog(text, "取消", 0, 100)
+        dialog.setWindowTitle(title)
+        dialog.setWindowModality(QtCore.Qt.WindowModal)
+        dialog.setValue(0)
+        return dialog
+
+    def update_progress(
+        self,
+        dialog: QtWidgets.QProgressDialog,
+        count: int,
+        progress: float
+    ) -> bool:
+        """
+        Callback of csv import/export, return False if canceled.
+        """
+        dialog.setLabelText(f"已处理{count}条数据")
+        dialog.setValue(int(progress * 100))
+        return not dialog.wasCanceled()
+
     def show_data(
         self,
         symbol: str,
@@ -352,33 +384,15 @@ class ManagerWidget(QtWidgets.QWidget):
 
     def update_data(self) -> None:
         """"""
-        data = self.engine.get_bar_data_available()
-        total = len(data)
-        count = 0
-
-        dialog = QtWidgets.QProgressDialog(
-            "历史数据更新中",
-            "取消",
-            0,
-            100
-        )
-        dialog.setWindowTitle("更新进度")
-        dialog.setWindowModality(QtCore.Qt.WindowModal)
-        dialog.setValue(0)
+        dialog = self.create_progress_dialog("历史数据更新中", "更新进度")
 
-        for d in data:
-            if dialog.wasCanceled():
-                break
-
-            self.engine.download_bar_data(
-                d["symbol"],
-                Exchange(d["exchange"]),
-                Interval(d["interval"]),
-                d["end"]
-            )
-            count += 1
-            progress = int(round(count / total * 100, 0))
-            dialog.setValue(progress)
+        def callback(finished: int, total: int) -> bool:
+            """"""
+            dialog.setLabelText(f"已更新{finished}/{total}个合约")
+            dialog.setValue(int(finished / total * 100))
+            return not dialog.wasCanceled()
+
+        self.engine.update_bar_data(callback)
 
         dialog.close()
 
@@ -1,9 +1,14 @@
 """"""
 
+import pickle
 import sys
-from threading import Thread
-from queue import Queue, Empty
+from threading import Event as ThreadEvent, Thread
+from queue import Queue, Empty, Full
 from copy import copy
+from time import perf_counter
+from typing import Dict, List
+
+from vnpy.event.stats import LatencyHistogram
 
 from vnpy.event import Event, EventEngine
 from vnpy.trader.engine import BaseEngine, MainEngine
@@ -15,10 +20,12 @@ from vnpy.trader.object import (
     ContractData
 )
 from vnpy.trader.event import EVENT_TICK, EVENT_CONTRACT
-from vnpy.trader.utility import load_json, save_json, BarGenerator
+from vnpy.trader.utility import load_json, save_json, get_folder_path, BarGenerator
 from vnpy.trader.database import database_manager
 from vnpy.app.spread_trading.base import EVENT_SPREAD_DATA, SpreadData
 
+from .spool import RecordSpool, FsyncPolicy
+
 
 APP_NAME = "DataRecorder"
 
@@ -28,22 +35,54 @@ EVENT_RECORDER_EXCEPTION = "eRecorderException"
 
 
 class RecorderEngine(BaseEngine):
-    """"""
+    """
+    Data received is put into a bounded queue, and appended into local
+    spool by writer thread. Shipper thread reads data from spool and saves
+    it into database in batches of ticks and bars. Every batch is flushed
+    when its size reaches batch_size or flush_interval passed since last
+    flush.
+
+    Database error does not stop recording. Shipper keeps retrying, and
+    data not saved yet is kept in spool until saved, even after restart.
+    Data is dropped (and counted) only when queue is full, so that event
+    thread is never blocked by slow disk.
+    """
     setting_filename = "data_recorder_setting.json"
 
     def __init__(self, main_engine: MainEngine, event_engine: EventEngine):
         """"""
         super().__init__(main_engine, event_engine, APP_NAME)
 
-        self.queue = Queue()
+        self.batch_size: int = 1000
+        self.flush_interval: float = 1.0
+        self.queue_size: int = 100_000
+        self.retry_interval: float = 5.0
+        self.fsync_policy: FsyncPolicy = FsyncPolicy.INTERVAL
+        self.fsync_interval: float = 1.0
+
         self.thread = Thread(target=self.run)
+        self.ship_thread = Thread(target=self.ship)
         self.active = False
 
+        self.spool: RecordSpool = None
+        self.spooled: ThreadEvent = ThreadEvent()      # set after appended into spool
+        self.stopped: ThreadEvent = ThreadEvent()
+
         self.tick_recordings = {}
         self.bar_recordings = {}
         self.bar_generators = {}
 
+        # Backpressure and flush statistics
+        self.dropped_count: int = 0
+        self.peak_depth: int = 0
+        self.spooled_count: int = 0
+        self.saved_counts: Dict[str, int] = {"tick": 0, "bar": 0}
+        self.flush_latency: LatencyHistogram = LatencyHistogram()
+        self.error_count: int = 0
+        self.last_error: str = ""
+
         self.load_setting()
+        self.queue = Queue(maxsize=self.queue_size)
         self.register_event()
         self.start()
         self.put_event()
@@ -54,47 +93,211 @@ class RecorderEngine(BaseEngine):
         self.tick_recordings = setting.get("tick", {})
         self.bar_recordings = setting.get("bar", {})
 
+        self.batch_size = setting.get("batch_size", self.batch_size)
+        self.flush_interval = setting.get("flush_interval", self.flush_interval)
+        self.queue_size = setting.get("queue_size", self.queue_size)
+        self.retry_interval = setting.get("retry_interval", self.retry_interval)
+        self.fsync_policy = FsyncPolicy(setting.get("fsync_policy", self.fsync_policy.value))
+        self.fsync_interval = setting.get("fsync_interval", self.fsync_interval)
+
     def save_setting(self):
         """"""
         setting = {
             "tick": self.tick_recordings,
-            "bar": self.bar_recordings
+            "bar": self.bar_recordings,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "queue_size": self.queue_size,
+            "retry_interval": self.retry_interval,
+            "fsync_policy": self.fsync_policy.value,
+            "fsync_interval": self.fsync_interval
         }
         save_json(self.setting_filename, setting)
 
     def run(self):
-        """"""
-        while self.active:
+        """
+        Append data in queue into spool.
+        """
+        try:
+            while self.active:
+                try:
+                    task = self.queue.get(timeout=self.fsync_interval)
+                except Empty:
+                    self.spool.check_sync()
+                    continue
+
+                # Take all data already in queue without waiting
+                self.peak_depth = max(self.peak_depth, self.queue.qsize() + 1)
+
+                tasks = [task]
+                self.drain(tasks, self.batch_size)
+                self.append(tasks)
+
+            # Append all data left after stopped
+            tasks = []
+            self.drain(tasks)
+            self.append(tasks)
+
+            self.spool.sync()
+
+        except Exception:
+            self.active = False
+
+            info = sys.exc_info()
+            event = Event(EVENT_RECORDER_EXCEPTION, info)
+            self.event_engine.put(event)
+
+    def drain(self, tasks: list, limit: int = 0) -> None:
+        """
+        Move data in queue into tasks until limit reached (0 for no limit).
+        """
+        while not limit or len(tasks) < limit:
             try:
-                task = self.queue.get(timeout=1)
-                task_type, data = task
-                print(f'in RecorderEngine.run, {task_type}, {data}')
-                if task_type == "tick":
-                    database_manager.save_tick_data([data])
-                elif task_type == "bar":
-                    database_manager.save_bar_data([data])
-
+                tasks.append(self.queue.get_nowait())
             except Empty:
+                return
+
+    def append(self, tasks: list) -> None:
+        """"""
+        if not tasks:
+            return
+
+        payloads = [pickle.dumps(task, pickle.HIGHEST_PROTOCOL) for task in tasks]
+        self.spool.append(payloads)
+
+        self.spooled_count += len(tasks)
+        self.spooled.set()
+
+    def ship(self):
+        """
+        Save data in spool into database, and commit checkpoint of spool
+        after every successful flush.
+        """
+        position = self.spool.checkpoint
+        batches: Dict[str, list] = {"tick": [], "bar": []}
+        last_flush = perf_counter()
+
+        while True:
+            # All data is in spool after writer thread stopped
+            finished = not self.thread.is_alive()
+
+            full = any(len(batch) >= self.batch_size for batch in batches.values())
+            payloads: List[bytes] = []
+
+            # Stop reading when batches are full (e.g. database is down)
+            if not full:
+                self.spooled.clear()
+                payloads, position = self.spool.read(position)
+
+                for payload in payloads:
+                    task_type, data = pickle.loads(payload)
+                    batches[task_type].append(data)
+
+                full = any(len(batch) >= self.batch_size for batch in batches.values())
+
+            due = perf_counter() - last_flush >= self.flush_interval
+            if full or due or (finished and not payloads):
+                if self.flush(batches):
+                    if position != self.spool.checkpoint:
+                        self.spool.commit(position)
+                    last_flush = perf_counter()
+                elif finished:
+                    break
+                else:
+                    self.stopped.wait(self.retry_interval)
+                    continue
+
+            if finished and not payloads:
+                break
+
+            if not payloads:
+                timeout = max(last_flush + self.flush_interval - perf_counter(), 0)
+                self.spooled.wait(timeout)
+
+    def flush(self, batches: Dict[str, list]) -> bool:
+        """
+        Save every batch with one bulk save of database, return whether all
+        batches are saved.
+        """
+        for task_type, batch in batches.items():
+            if not batch:
                 continue
 
-            except Exception:
-                self.active = False
+            start = perf_counter()
 
-                info = sys.exc_info()
-                event = Event(EVENT_RECORDER_EXCEPTION, info)
-                self.event_engine.put(event)
+            try:
+                if task_type == "tick":
+                    database_manager.save_tick_data(batch)
+                else:
+                    database_manager.save_bar_data(batch)
+            except Exception as e:
+                if not self.last_error:
+                    self.write_log(f"数据库写入失败，{self.retry_interval}秒后重试：{e}")
+
+                self.error_count += 1
+                self.last_error = repr(e)
+                return False
+
+            self.flush_latency.add(perf_counter() - start)
+            self.saved_counts[task_type] += len(batch)
+
+            batches[task_type] = []
+
+        if self.last_error:
+            self.write_log("数据库写入恢复")
+            self.last_error = ""
+
+        return True
+
+    def get_stats(self) -> dict:
+        """
+        Get queue depth, dropped count, spool backlog (in bytes), saved count
+        and time spent on every flush (in seconds).
+        """
+        return {
+            "depth": self.queue.qsize(),
+            "peak_depth": self.peak_depth,
+            "queue_size": self.queue_size,
+            "dropped": self.dropped_count,
+            "spooled": self.spooled_count,
+            "backlog": self.spool.get_backlog(),
+            "saved": dict(self.saved_counts),
+            "flush": self.flush_latency.to_dict(),
+            "errors": self.error_count,
+            "last_error": self.last_error,
+            "truncated_bytes": self.spool.truncated_bytes,
+            "corrupted": self.spool.corrupted_count,
+        }
 
     def close(self):
         """"""
         self.active = False
+        self.stopped.set()
 
-        if self.thread.isAlive():
+        if self.thread.is_alive():
             self.thread.join()
 
+        self.spooled.set()
+        if self.ship_thread.is_alive():
+            self.ship_thread.join()
+
+        self.spool.close()
+
     def start(self):
         """"""
+        self.spool = RecordSpool(
+            get_folder_path("recorder_spool"),
+            fsync_policy=self.fsync_policy,
+            fsync_interval=self.fsync_interval
+        )
+        self.spool.open()
+
+        if self.spool.truncated_bytes:
+            self.write_log(f"记录缓存文件末尾不完整，已截断{self.spool.truncated_bytes}字节")
+
         self.active = True
         self.thread.start()
+        self.ship_thread.start()
 
     def add_bar_recording(self, vt_symbol: str):
         """"""
@@ -244,12 +447,27 @@ class RecorderEngine(BaseEngine):
     def record_tick(self, tick: TickData):
         """"""
         task = ("tick", copy(tick))
-        self.queue.put(task)
+        self.put_task(task)
 
     def record_bar(self, bar: BarData):
         """"""
         task = ("bar", copy(bar))
-        self.queue.put(task)
+        self.put_task(task)
+
+    def put_task(self, task: tuple):
+        """
+        Put task into queue without blocking, drop it if queue is full.
+        """
+        try:
+            self.queue.put_nowait(task)
+        except Full:
+            self.dropped_count += 1
+
+            if (self.dropped_count - 1) % self.queue_size == 0:
+                self.write_log(
+                    f"记录队列已满（{self.queue_size}），"
+                    f"已丢弃{self.dropped_count}条数据"
+                )
 
     def get_bar_generator(self, vt_symbol: str):
         """"""
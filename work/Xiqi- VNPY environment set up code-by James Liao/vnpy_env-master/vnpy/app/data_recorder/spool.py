@@ -0,0 +1,319 @@
+"""
+Append-only local spool of recorded data, which is written before data
+is saved into database.
+
+Spool is a folder of segment files named by sequence number:
+
+    {folder}/000000000001.spool
+    {folder}/000000000002.spool
+    {folder}/checkpoint.json
+
+Every record in segment is a header of payload length and CRC32,
+followed by payload bytes. A new segment is started when size of current
+one reaches segment_size. Position (segment, offset) of the first record
+not yet saved into database is kept in checkpoint file, and segments
+before it are deleted.
+
+After crash, incomplete or corrupted record at the end of last segment is
+truncated, and reading restarts from checkpoint. A new segment is started
+every time spool is opened. Records after checkpoint
+may have already been saved into database, so they must be saved with
+upsert semantics.
+"""
+
+import json
+import os
+import struct
+import zlib
+from enum import Enum
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+from typing import List, Optional, Tuple
+
+from vnpy.trader.utility import save_text_atomic
+
+
+HEADER = struct.Struct("<II")       # payload length, crc32 of payload
+SUFFIX = ".spool"
+CHECKPOINT_NAME = "checkpoint.json"
+
+# Position in spool: (segment number, offset in segment)
+Position = Tuple[int, int]
+
+
+class FsyncPolicy(Enum):
+    """
+    When data appended is flushed from OS cache onto disk.
+    """
+    ALWAYS = "always"           # after every append
+    INTERVAL = "interval"       # at most once per fsync_interval
+    NEVER = "never"             # left to OS
+
+
+def parse_records(buf: bytes) -> Tuple[List[bytes], int, bool]:
+    """
+    Parse records from buffer.
+
+    Return payloads parsed, size of bytes used by them, and whether parsing
+    stopped at corrupted record (instead of end of buffer).
+    """
+    payloads = []
+    pos = 0
+    end = len(buf)
+
+    while pos + HEADER.size <= end:
+        length, crc = HEADER.unpack_from(buf, pos)
+
+        start = pos + HEADER.size
+        if start + length > end:
+            break
+
+        payload = buf[start:start + length]
+        if zlib.crc32(payload) != crc:
+            return payloads, pos, True
+
+        payloads.append(payload)
+        pos = start + length
+
+    return payloads, pos, False
+
+
+class RecordSpool:
+    """
+    Segmented append-only spool with one writer and one reader thread.
+    """
+
+    def __init__(
+        self,
+        folder: Path,
+        segment_size: int = 64 * 1024 * 1024,
+        fsync_policy: FsyncPolicy = FsyncPolicy.INTERVAL,
+        fsync_interval: float = 1.0
+    ):
+        """"""
+        self.folder: Path = Path(folder)
+        self.segment_size: int = segment_size
+        self.fsync_policy: FsyncPolicy = fsync_policy
+        self.fsync_interval: float = fsync_interval
+
+        self.lock: Lock = Lock()        # protect segment switching
+
+        self.file = None
+        self.segment: int = 0
+        self.offset: int = 0
+
+        self.synced: bool = True
+        self.last_sync: float = 0
+
+        self.checkpoint: Position = (1, 0)
+        self.truncated_bytes: int = 0
+        self.corrupted_count: int = 0
+
+    def open(self) -> None:
+        """
+        Load checkpoint and start a new segment for appending. Incomplete
+        record at end of last segment left by crash is truncated.
+        """
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+        self.checkpoint = self.load_checkpoint()
+
+        segments = self.list_segments()
+        if segments:
+            self.segment = segments[-1]
+        else:
+            self.segment = self.checkpoint[0]
+
+        path = self.get_segment_path(self.segment)
+        if path.exists():
+            with open(path, mode="rb") as f:
+                buf = f.read()
+
+            _, valid_size, _ = parse_records(buf)
+            self.truncated_bytes += len(buf) - valid_size
+
+            if valid_size < len(buf):
+                with open(path, mode="r+b") as f:
+                    f.truncate(valid_size)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        # Data not synced may be lost by OS crash, so that checkpoint may
+        # point beyond end of last segment. Records appended there would
+        # be skipped by reader, so appending always starts a new segment.
+        self.segment = max(self.segment, self.checkpoint[0]) + 1
+        self.file = open(self.get_segment_path(self.segment), mode="ab")
+        self.offset = 0
+
+    def close(self) -> None:
+        """"""
+        if not self.file:
+            return
+
+        self.sync()
+        self.file.close()
+        self.file = None
+
+    def append(self, payloads: List[bytes]) -> None:
+        """
+        Append records to the end of spool.
+        """
+        if not payloads:
+            return
+
+        buf = bytearray()
+        for payload in payloads:
+            buf += HEADER.pack(len(payload), zlib.crc32(payload))
+            buf += payload
+
+        self.file.write(buf)
+        self.file.flush()           # make data visible to reader
+        self.offset += len(buf)
+        self.synced = False
+
+        if self.fsync_policy == FsyncPolicy.ALWAYS:
+            self.sync()
+        else:
+            self.check_sync()
+
+        if self.offset >= self.segment_size:
+            self.roll()
+
+    def check_sync(self) -> None:
+        """
+        Sync with interval policy, which should also be called periodically
+        when nothing appended.
+        """
+        if (
+            self.fsync_policy == FsyncPolicy.INTERVAL
+            and not self.synced
+            and monotonic() - self.last_sync >= self.fsync_interval
+        ):
+            self.sync()
+
+    def sync(self) -> None:
+        """"""
+        if self.synced:
+            return
+
+        os.fsync(self.file.fileno())
+        self.synced = True
+        self.last_sync = monotonic()
+
+    def roll(self) -> None:
+        """
+        Close current segment and start a new one.
+        """
+        self.sync()
+
+        with self.lock:
+            self.file.close()
+            self.segment += 1
+            self.offset = 0
+            self.file = open(self.get_segment_path(self.segment), mode="ab")
+
+    def read(
+        self,
+        position: Position,
+        max_size: int = 4 * 1024 * 1024
+    ) -> Tuple[List[bytes], Position]:
+        """
+        Read records from position, return payloads and position after them.
+        """
+        segment, offset = position
+
+        while True:
+            with self.lock:
+                # Segment is complete if writer has moved to later one
+                completed = segment < self.segment
+
+            path = self.get_segment_path(segment)
+            if not path.exists():
+                if completed:
+                    segment, offset = segment + 1, 0
+                    continue
+                return [], (segment, offset)
+
+            with open(path, mode="rb") as f:
+                f.seek(offset)
+                buf = f.read(max_size)
+
+            payloads, size, corrupted = parse_records(buf)
+
+            # Skip the rest of segment after corrupted record
+            if corrupted:
+                self.corrupted_count += 1
+                if completed:
+                    return payloads, (segment + 1, 0)
+
+            if payloads or not completed:
+                return payloads, (segment, offset + size)
+
+            # Reached end of a completed segment
+            segment, offset = segment + 1, 0
+
+    def commit(self, position: Position) -> None:
+        """
+        Save checkpoint after data before position is saved into database,
+        and delete segments no longer needed.
+        """
+        self.checkpoint = position
+
+        data = {"segment": position[0], "offset": position[1]}
+        save_text_atomic(self.folder.joinpath(CHECKPOINT_NAME), json.dumps(data))
+
+        for segment in self.list_segments():
+            if segment >= position[0]:
+                break
+            self.get_segment_path(segment).unlink()
+
+    def load_checkpoint(self) -> Position:
+        """"""
+        path = self.folder.joinpath(CHECKPOINT_NAME)
+
+        if path.exists():
+            with open(path, mode="r", encoding="UTF-8") as f:
+                data = json.load(f)
+            return data["segment"], data["offset"]
+
+        segments = self.list_segments()
+        if segments:
+            return segments[0], 0
+
+        return 1, 0
+
+    def get_backlog(self, position: Optional[Position] = None) -> int:
+        """
+        Get size in bytes of data after position (checkpoint by default).
+        """
+        if not position:
+            position = self.checkpoint
+        segment, offset = position
+
+        with self.lock:
+            current_segment = self.segment
+            current_offset = self.offset
+
+        if segment == current_segment:
+            return max(current_offset - offset, 0)
+
+        size = -offset
+        for n in self.list_segments():
+            if segment <= n < current_segment:
+                try:
+                    size += self.get_segment_path(n).stat().st_size
+                except FileNotFoundError:       # deleted after commit
+                    continue
+        return max(size + current_offset, 0)
+
+    def list_segments(self) -> List[int]:
+        """"""
+        return sorted(
+            int(path.stem) for path in self.folder.glob(f"*{SUFFIX}")
+            if path.stem.isdigit()
+        )
+
+    def get_segment_path(self, segment: int) -> Path:
+        """"""
+        return self.folder.joinpath(f"{segment:012d}{SUFFIX}")
@@ -1,6 +1,8 @@
 from collections import defaultdict
 from datetime import date, datetime, timedelta
-from typing import Dict, List, Set, Tuple, Callable, TypeVar
+from enum import Enum
+from itertools import chain
+from typing import Dict, Iterator, List, Tuple, Callable, Type, TypeVar
 from functools import lru_cache
 import traceback
 
@@ -12,7 +14,8 @@ from pandas import DataFrame
 from vnpy.trader.constant import Direction, Offset, Interval, Status
 from vnpy.trader.database import database_manager
 from vnpy.trader.object import OrderData, TradeData, BarData
-from vnpy.trader.utility import round_to, extract_vt_symbol
+from vnpy.trader.optimize import OptimizationMixin
+from vnpy.trader.utility import round_to, extract_vt_symbol, BarArrays
 
 from .template import StrategyTemplate
 
@@ -27,7 +30,16 @@ INTERVAL_DELTA_MAP = {
 }
 multi_type =  TypeVar('multi_type', float, Callable)
 
-class BacktestingEngine:
+
+class BarFillPolicy(Enum):
+    """
+    How to handle datetime when some symbol has no bar.
+    """
+    SKIP = "skip"       # symbol is not included in bars
+    FFILL = "ffill"     # flat bar with close price of last bar of symbol
+
+
+class BacktestingEngine(OptimizationMixin):
     """"""
 
     gateway_name = "BACKTESTING"
@@ -45,14 +57,21 @@ class BacktestingEngine:
 
         self.capital: float = 1_000_000
 
+        self.strategy_class: Type[StrategyTemplate] = None
         self.strategy: StrategyTemplate = None
         self.bars: Dict[str, BarData] = {}
         self.datetime: datetime = None
 
         self.interval: Interval = None
         self.days: int = 0
-        self.history_data: Dict[Tuple, BarData] = {}
-        self.dts: Set[datetime] = set()
+        self.fill_policy: BarFillPolicy = BarFillPolicy.SKIP
+
+        # Bars of every symbol are stored as arrays, and timeline is the
+        # sorted union of datetime of all symbols. Position of each bar on
+        # timeline is saved in timeline_ixs.
+        self.history_arrays: Dict[str, BarArrays] = {}
+        self.timeline: np.ndarray = np.empty(0, dtype="datetime64[us]")
+        self.timeline_ixs: Dict[str, np.ndarray] = {}
 
         self.limit_order_count = 0
         self.limit_orders = {}
@@ -63,7 +82,8 @@ class BacktestingEngine:
 
         self.logs = []
 
-        self.daily_results = {}
+        self.daily_recorder = PortfolioDailyRecorder([])
+        self.contract_arrays: Dict[str, np.ndarray] = {}
         self.daily_df = None
 
     def clear_data(self) -> None:
@@ -82,7 +102,8 @@ class BacktestingEngine:
         self.trades.clear()
 
         self.logs.clear()
-        self.daily_results.clear()
+        self.daily_recorder = PortfolioDailyRecorder(self.vt_symbols)
+        self.contract_arrays = {}
         self.daily_df = None
 
     def set_parameters(
@@ -96,7 +117,8 @@ class BacktestingEngine:
         priceticks: Dict[str, multi_type],
         capital: int = 0,
         end: datetime = None,
-        collection_name:Dict[str, str] = None
+        collection_name:Dict[str, str] = None,
+        fill_policy: BarFillPolicy = BarFillPolicy.SKIP
     ) -> None:
         """"""
         self.vt_symbols = vt_symbols
@@ -111,9 +133,13 @@ class BacktestingEngine:
         self.end = end
         self.capital = capital
         self.collection_name = collection_name
+        self.fill_policy = fill_policy
+
+        self.daily_recorder = PortfolioDailyRecorder(vt_symbols)
 
     def add_strategy(self, strategy_class: type, setting: dict) -> None:
         """"""
+        self.strategy_class = strategy_class
         self.strategy = strategy_class(
             self, strategy_class.__name__, self.vt_symbols, setting
         )
@@ -130,8 +156,7 @@ class BacktestingEngine:
             return
 
         # Clear previously loaded history data
-        self.history_data.clear()
-        self.dts.clear()
+        self.history_arrays.clear()
 
         # Load 30 days of data each time and allow for progress update
         progress_delta = timedelta(days=30)
@@ -143,22 +168,18 @@ class BacktestingEngine:
             end = self.start + progress_delta
             progress = 0
 
-            data_count = 0
+            arrays_list = []
             while start < self.end:
                 end = min(end, self.end)  # Make sure end time stays within set range
 
-                data = load_bar_data(
+                arrays = load_bar_arrays(
                     vt_symbol,
                     self.interval,
                     start,
                     end,
                     self.collection_name[vt_symbol]
                 )
-
-                for bar in data:
-                    self.dts.add(bar.datetime)
-                    self.history_data[(bar.datetime, vt_symbol)] = bar
-                    data_count += 1
+                arrays_list.append(arrays)
 
                 progress += progress_delta / total_delta
                 progress = min(progress, 1)
@@ -168,30 +189,157 @@ class BacktestingEngine:
                 start = end + interval_delta
                 end += (progress_delta + interval_delta)
 
+            arrays = BarArrays.concatenate(arrays_list)
+            if arrays:
+                self.history_arrays[vt_symbol] = arrays
+                data_count = len(arrays)
+            else:
+                data_count = 0
+
             self.output(f"{vt_symbol}历史数据加载完成，数据量：{data_count}")
 
+        self.build_timeline()
+
         self.output("所有历史数据加载完成")
 
+    def build_timeline(self) -> None:
+        """
+        Join datetime of all symbols into one timeline, and output number
+        of missing bars of every symbol once instead of at every datetime.
+        """
+        datetimes = [arrays.datetime for arrays in self.history_arrays.values()]
+        if datetimes:
+            self.timeline = np.unique(np.concatenate(datetimes))
+        else:
+            self.timeline = np.empty(0, dtype="datetime64[us]")
+
+        self.timeline_ixs.clear()
+
+        for vt_symbol in self.vt_symbols:
+            arrays = self.history_arrays.get(vt_symbol, None)
+            if arrays:
+                ixs = np.searchsorted(self.timeline, arrays.datetime)
+                self.timeline_ixs[vt_symbol] = ixs
+                missing_count = len(self.timeline) - len(np.unique(ixs))
+            else:
+                missing_count = len(self.timeline)
+
+            if missing_count:
+                self.output(
+                    f"{vt_symbol}数据缺失：{missing_count}个时间点，"
+                    f"处理方式：{self.fill_policy.value}"
+                )
+
+    def iter_history(
+        self,
+        chunk_size: int = 10000
+    ) -> Iterator[Tuple[datetime, Dict[str, BarData]]]:
+        """
+        Generate datetime and bars of every point on timeline.
+
+        BarData objects are created chunk by chunk from arrays, so only
+        about chunk_size bars exist in memory at the same time, no matter
+        how many symbols are in portfolio.
+        """
+        tz = None
+        for arrays in self.history_arrays.values():
+            tz = arrays.tzinfo
+            break
+
+        step_count = max(chunk_size // max(len(self.history_arrays), 1), 1)
+
+        for chunk_start in range(0, len(self.timeline), step_count):
+            chunk_end = min(chunk_start + step_count, len(self.timeline))
+
+            dts = self.timeline[chunk_start:chunk_end].tolist()
+            if tz:
+                dts = [dt.replace(tzinfo=tz) for dt in dts]
+
+            chunk_bars = [{} for dt in dts]
+
+            for vt_symbol in self.vt_symbols:
+                arrays = self.history_arrays.get(vt_symbol, None)
+                if not arrays:
+                    continue
+                ixs = self.timeline_ixs[vt_symbol]
+
+                # Bars within chunk
+                left = np.searchsorted(ixs, chunk_start)
+                right = np.searchsorted(ixs, chunk_end)
+                steps = (ixs[left:right] - chunk_start).tolist()
+
+                if self.fill_policy == BarFillPolicy.FFILL:
+                    self.fill_bars(
+                        vt_symbol, arrays, ixs, chunk_start, chunk_end, dts, chunk_bars
+                    )
+
+                for step, bar in zip(steps, arrays.iter_bars(left, right)):
+                    chunk_bars[step][vt_symbol] = bar
+
+            yield from zip(dts, chunk_bars)
+
+    def fill_bars(
+        self,
+        vt_symbol: str,
+        arrays: BarArrays,
+        ixs: np.ndarray,
+        chunk_start: int,
+        chunk_end: int,
+        dts: List[datetime],
+        chunk_bars: List[Dict[str, BarData]]
+    ) -> None:
+        """
+        Create flat bars with last close price at points without bar.
+        """
+        steps = np.arange(chunk_start, chunk_end)
+        rows = np.searchsorted(ixs, steps, side="right") - 1
+
+        missing = rows >= 0
+        missing[missing] = ixs[rows[missing]] != steps[missing]
+        if not missing.any():
+            return
+
+        symbol, exchange = extract_vt_symbol(vt_symbol)
+        fill_steps = (steps[missing] - chunk_start).tolist()
+        fill_rows = rows[missing]
+
+        for step, close_price, open_interest in zip(
+            fill_steps,
+            arrays.close_price[fill_rows].tolist(),
+            arrays.open_interest[fill_rows].tolist()
+        ):
+            chunk_bars[step][vt_symbol] = BarData(
+                symbol=symbol,
+                exchange=exchange,
+                datetime=dts[step],
+                interval=self.interval,
+                open_price=close_price,
+                high_price=close_price,
+                low_price=close_price,
+                close_price=close_price,
+                open_interest=open_interest,
+                gateway_name=arrays.gateway_name
+            )
+
     def run_backtesting(self) -> None:
         """"""
         self.strategy.on_init()
 
-        # Generate sorted datetime list
-        dts = list(self.dts)
-        dts.sort()
+        history = self.iter_history()
 
         # Use the first [days] of history data for initializing strategy
         day_count = 0
-        ix = 0
+        rest = []
 
-        for ix, dt in enumerate(dts):
+        for dt, bars in history:
             if self.datetime and dt.day != self.datetime.day:
                 day_count += 1
                 if day_count >= self.days:
+                    rest.append((dt, bars))
                     break
 
             try:
-                self.new_bars(dt)
+                self.new_bars(dt, bars)
             except Exception:
                 self.output("触发异常，回测终止")
                 self.output(traceback.format_exc())
@@ -205,9 +353,9 @@ class BacktestingEngine:
         self.output("开始回放历史数据")
 
         # Use the rest of history data for running backtesting
-        for dt in dts[ix:]:
+        for dt, bars in chain(rest, history):
             try:
-                self.new_bars(dt)
+                self.new_bars(dt, bars)
             except Exception:
                 self.output("触发异常，回测终止")
                 self.output(traceback.format_exc())
@@ -215,50 +363,77 @@ class BacktestingEngine:
 
         self.output("历史数据回放结束")
 
-    def calculate_result(self) -> None:
-        """"""
+    def calculate_result(self, include_trades: bool = False) -> None:
+        """
+        Calculate daily pnl of all symbols and days at once with values
+        recorded during replay. Trade list of every day is only added into
+        result DataFrame with include_trades.
+        """
         self.output("开始计算逐日盯市盈亏")
 
         if not self.trades:
             self.output("成交记录为空，无法计算")
             return
 
-        # Add trade data into daily reuslt.
-        for trade in self.trades.values():
-            d = trade.datetime.date()
-            daily_result = self.daily_results[d]
-            daily_result.add_trade(trade)
-
-        # Calculate daily result by iteration.
-        pre_closes = {}
-        start_poses = {}
-
-        for daily_result in self.daily_results.values():
-            daily_result.calculate_pnl(
-                pre_closes,
-                start_poses,
-                self.sizes,
-                self.rates,
-                self.slippages,
-            )
+        # Every array is of shape (days, symbols)
+        dates, data = self.daily_recorder.get_arrays()
+
+        # Use close price of last day if symbol has no bar in the day
+        close_price = DataFrame(data["close_price"]).ffill().fillna(0).to_numpy()
+        pos_change = data["pos_change"]
+        trade_cost = data["trade_cost"]
+
+        # If no pre_close provided (on the first day of symbol),
+        # use value 1 to avoid zero division error
+        pre_close = np.vstack((np.zeros_like(close_price[:1]), close_price[:-1]))
+        pre_close[pre_close == 0] = 1
 
-            pre_closes = daily_result.close_prices
-            start_poses = daily_result.end_poses
+        end_pos = pos_change.cumsum(axis=0)
+        start_pos = np.vstack((np.zeros_like(end_pos[:1]), end_pos[:-1]))
 
-        # Generate dataframe
-        results = defaultdict(list)
+        sizes = np.array([self.sizes[vt_symbol] for vt_symbol in self.vt_symbols])
+
+        holding_pnl = start_pos * (close_price - pre_close) * sizes
+        trading_pnl = (pos_change * close_price - trade_cost) * sizes
+
+        # Net pnl takes account of commission and slippage cost
+        total_pnl = trading_pnl + holding_pnl
+        net_pnl = total_pnl - data["commission"] - data["slippage"]
+
+        self.contract_arrays = {
+            "close_price": close_price,
+            "pre_close": pre_close,
+            "trade_count": data["trade_count"].astype(int),
+            "start_pos": start_pos,
+            "end_pos": end_pos,
+            "turnover": data["turnover"],
+            "commission": data["commission"],
+            "slippage": data["slippage"],
+            "trading_pnl": trading_pnl,
+            "holding_pnl": holding_pnl,
+            "total_pnl": total_pnl,
+            "net_pnl": net_pnl,
+        }
 
-        for daily_result in self.daily_results.values():
-            fields = [
-                "date", "trade_count", "turnover",
-                "commission", "slippage", "trading_pnl",
-                "holding_pnl", "total_pnl", "net_pnl"
-            ]
-            for key in fields:
-                value = getattr(daily_result, key)
-                results[key].append(value)
+        # Generate dataframe with sum of all symbols
+        results = {"date": dates}
 
-        self.daily_df = DataFrame.from_dict(results).set_index("date")
+        fields = [
+            "trade_count", "turnover",
+            "commission", "slippage", "trading_pnl",
+            "holding_pnl", "total_pnl", "net_pnl"
+        ]
+        for key in fields:
+            results[key] = self.contract_arrays[key].sum(axis=1)
+
+        if include_trades:
+            daily_trades = defaultdict(list)
+            for trade in self.trades.values():
+                daily_trades[trade.datetime.date()].append(trade)
+
+            results["trades"] = [daily_trades[d] for d in dates]
+
+        self.daily_df = DataFrame(results).set_index("date")
 
         self.output("逐日盯市盈亏计算完成")
         return self.daily_df
@@ -430,6 +605,35 @@ class BacktestingEngine:
         self.output("策略统计指标计算完成")
         return statistics
 
+    def get_optimization_parameters(self) -> dict:
+        """"""
+        parameters = {
+            "vt_symbols": self.vt_symbols,
+            "interval": self.interval,
+            "start": self.start,
+            "rates": self.rates,
+            "slippages": self.slippages,
+            "sizes": self.sizes,
+            "priceticks": self.priceticks,
+            "capital": self.capital,
+            "end": self.end,
+            "collection_name": self.collection_name,
+            "fill_policy": self.fill_policy,
+        }
+        return parameters
+
+    def get_optimization_data(self) -> Dict[str, BarArrays]:
+        """"""
+        if not self.history_arrays:
+            self.load_data()
+
+        return self.history_arrays
+
+    def set_optimization_data(self, data: Dict[str, BarArrays]) -> None:
+        """"""
+        self.history_arrays = data
+        self.build_timeline()
+
     def show_chart(self, df: DataFrame = None) -> None:
         """"""
         # Check DataFrame input exterior
@@ -464,29 +668,63 @@ class BacktestingEngine:
         """"""
         d = dt.date()
 
-        close_prices = {}
         for bar in bars.values():
-            close_prices[bar.vt_symbol] = bar.close_price
+            self.daily_recorder.update_close(d, bar.vt_symbol, bar.close_price)
+
+    def update_daily_trade(self, trade: TradeData) -> None:
+        """
+        Accumulate trade into statistics of its symbol and day.
+        """
+        vt_symbol = trade.vt_symbol
+        d = trade.datetime.date()
 
-        daily_result = self.daily_results.get(d, None)
+        size = self.sizes[vt_symbol]
+        rate = self.rates[vt_symbol]
+        slippage = self.slippages[vt_symbol]
 
-        if daily_result:
-            daily_result.update_close_prices(close_prices)
+        if trade.direction == Direction.LONG:
+            pos_change = trade.volume
         else:
-            self.daily_results[d] = PortfolioDailyResult(d, close_prices)
+            pos_change = -trade.volume
 
-    def new_bars(self, dt: datetime) -> None:
+        turnover = trade.volume * size * trade.price
+
+        # Close price of last day, which is 0 on the first day of symbol
+        pre_close = self.daily_recorder.get_pre_close(d, vt_symbol)
+
+        if isinstance(slippage, Callable):
+            slippage_cost = trade.volume * size * slippage(pre_close or 1)
+        else:
+            slippage_cost = trade.volume * size * slippage
+
+        if isinstance(rate, Callable):
+            end_pos = self.daily_recorder.get_pos(vt_symbol) + pos_change
+            commission = rate(
+                *vt_symbol.split('.'),
+                pre_close,
+                size,
+                trade.volume,
+                direction=end_pos
+            )
+        else:
+            commission = turnover * rate
+
+        # Trading pnl of the day is calculated after replay as
+        # (pos_change * close_price - trade_cost) * size
+        self.daily_recorder.add_trade(
+            d,
+            vt_symbol,
+            pos_change,
+            pos_change * trade.price,
+            turnover,
+            commission,
+            slippage_cost
+        )
+
+    def new_bars(self, dt: datetime, bars: Dict[str, BarData]) -> None:
         """"""
         self.datetime = dt
-
-        self.bars.clear()
-        for vt_symbol in self.vt_symbols:
-            bar = self.history_data.get((dt, vt_symbol), None)
-            if bar:
-                self.bars[vt_symbol] = bar
-            else:
-                dt_str = dt.strftime("%Y-%m-%d %H:%M:%S")
-                self.output(f"数据缺失：{dt_str} {vt_symbol}")
+        self.bars = bars
 
         self.cross_limit_order()
         self.strategy.on_bars(self.bars)
@@ -498,7 +736,9 @@ class BacktestingEngine:
         Cross limit order with last bar/tick data.
         """
         for order in list(self.active_limit_orders.values()):
-            bar = self.bars[order.vt_symbol]
+            bar = self.bars.get(order.vt_symbol, None)
+            if not bar:
+                continue
 
             long_cross_price = bar.low_price
             short_cross_price = bar.high_price
@@ -556,6 +796,7 @@ class BacktestingEngine:
 
             self.strategy.update_trade(trade)
             self.trades[trade.vt_tradeid] = trade
+            self.update_daily_trade(trade)
 
     def load_bars(
         self,
@@ -659,9 +900,147 @@ class BacktestingEngine:
 
     def get_all_daily_results(self) -> List["PortfolioDailyResult"]:
         """
-        Return all daily result data.
+        Return all daily result data calculated by calculate_result.
         """
-        return list(self.daily_results.values())
+        if self.daily_df is None:
+            return []
+
+        results = []
+
+        for ix, d in enumerate(self.daily_df.index):
+            close_prices = dict(zip(
+                self.vt_symbols,
+                self.contract_arrays["close_price"][ix].tolist()
+            ))
+            daily_result = PortfolioDailyResult(d, close_prices)
+
+            for jx, vt_symbol in enumerate(self.vt_symbols):
+                contract_result = daily_result.contract_results[vt_symbol]
+                for key, values in self.contract_arrays.items():
+                    setattr(contract_result, key, values[ix, jx].item())
+
+                daily_result.pre_closes[vt_symbol] = contract_result.pre_close
+                daily_result.start_poses[vt_symbol] = contract_result.start_pos
+                daily_result.end_poses[vt_symbol] = contract_result.end_pos
+
+            for key, value in self.daily_df.loc[d].items():
+                setattr(daily_result, key, value)
+
+            results.append(daily_result)
+
+        return results
+
+
+class PortfolioDailyRecorder:
+    """
+    Close price and trade statistics of every symbol and day recorded
+    during replay, stored as one row of arrays (indexed by symbol) per day.
+
+    Days must be recorded in time order, so that close price of last day
+    and position of every symbol are known when trade happens.
+    """
+
+    fields: List[str] = [
+        "close_price",
+        "trade_count",
+        "pos_change",
+        "trade_cost",
+        "turnover",
+        "commission",
+        "slippage",
+    ]
+
+    def __init__(self, vt_symbols: List[str]):
+        """"""
+        self.columns: Dict[str, int] = {
+            vt_symbol: ix for ix, vt_symbol in enumerate(vt_symbols)
+        }
+
+        self.dates: List[date] = []
+        self.indexes: Dict[date, int] = {}
+        self.data: Dict[str, List[np.ndarray]] = {name: [] for name in self.fields}
+
+        # Close prices of last day and current positions
+        self.pre_closes: np.ndarray = np.zeros(len(vt_symbols))
+        self.closes: np.ndarray = np.zeros(len(vt_symbols))
+        self.positions: np.ndarray = np.zeros(len(vt_symbols))
+
+    def get_index(self, d: date) -> int:
+        """
+        Get index of the day, add a new day if not exists.
+        """
+        ix = self.indexes.get(d, None)
+
+        if ix is None:
+            ix = len(self.dates)
+            self.indexes[d] = ix
+            self.dates.append(d)
+
+            for name, rows in self.data.items():
+                if name == "close_price":
+                    rows.append(np.full(len(self.columns), np.nan))
+                else:
+                    rows.append(np.zeros(len(self.columns)))
+
+            self.pre_closes = self.closes.copy()
+
+        return ix
+
+    def update_close(self, d: date, vt_symbol: str, price: float) -> None:
+        """"""
+        jx = self.columns[vt_symbol]
+        self.data["close_price"][self.get_index(d)][jx] = price
+        self.closes[jx] = price
+
+    def add_trade(
+        self,
+        d: date,
+        vt_symbol: str,
+        pos_change: float,
+        trade_cost: float,
+        turnover: float,
+        commission: float,
+        slippage: float
+    ) -> None:
+        """"""
+        ix = self.get_index(d)
+        jx = self.columns[vt_symbol]
+        data = self.data
+
+        data["trade_count"][ix][jx] += 1
+        data["pos_change"][ix][jx] += pos_change
+        data["trade_cost"][ix][jx] += trade_cost
+        data["turnover"][ix][jx] += turnover
+        data["commission"][ix][jx] += commission
+        data["slippage"][ix][jx] += slippage
+
+        self.positions[jx] += pos_change
+
+    def get_pre_close(self, d: date, vt_symbol: str) -> float:
+        """"""
+        self.get_index(d)
+        return self.pre_closes[self.columns[vt_symbol]].item()
+
+    def get_pos(self, vt_symbol: str) -> float:
+        """"""
+        return self.positions[self.columns[vt_symbol]].item()
+
+    def get_arrays(self) -> Tuple[List[date], Dict[str, np.ndarray]]:
+        """
+        Get dates and values of all days as 2D arrays of shape
+        (days, symbols) in date order.
+        """
+        order = sorted(range(len(self.dates)), key=self.dates.__getitem__)
+        dates = [self.dates[ix] for ix in order]
+
+        arrays = {}
+        for name, rows in self.data.items():
+            if rows:
+                arrays[name] = np.vstack(rows)[order]
+            else:
+                arrays[name] = np.zeros((0, len(self.columns)))
+
+        return dates, arrays
 
 
 class ContractDailyResult:
@@ -818,16 +1197,16 @@ class PortfolioDailyResult:
 
 
 @lru_cache(maxsize=999)
-def load_bar_data(
+def load_bar_arrays(
     vt_symbol: str,
     interval: Interval,
     start: datetime,
     end: datetime,
-    collection_name:str=None
+    collection_name: str = None
 ):
     """"""
     symbol, exchange = extract_vt_symbol(vt_symbol)
 
-    return database_manager.load_bar_data(
+    return database_manager.load_bar_arrays(
         symbol, exchange, interval, start, end, collection_name
     )
@@ -38,9 +38,10 @@ from vnpy.trader.constant import (
     Offset
 )
 from vnpy.trader.utility import load_json, save_json, extract_vt_symbol, round_to
-from vnpy.trader.database import database_manager
 from vnpy.trader.rqdata import rqdata_client
 from vnpy.trader.converter import OffsetConverter
+from vnpy.trader.persistence import JsonDataStore
+from vnpy.trader.history import HistoryService
 
 from .base import (
     APP_NAME,
@@ -61,6 +62,7 @@ class StrategyEngine(BaseEngine):
         super().__init__(main_engine, event_engine, APP_NAME)
 
         self.strategy_data: Dict[str, Dict] = {}
+        self.data_store: JsonDataStore = JsonDataStore(self.data_filename)
 
         self.classes: Dict[str, Type[StrategyTemplate]] = {}
         self.strategies: Dict[str, StrategyTemplate] = {}
@@ -74,6 +76,8 @@ class StrategyEngine(BaseEngine):
 
         self.offset_converter: OffsetConverter = OffsetConverter(self.main_engine)
 
+        self.history_service: HistoryService = HistoryService(self.main_engine)
+
     def init_engine(self):
         """
         """
@@ -87,6 +91,7 @@ class StrategyEngine(BaseEngine):
     def close(self):
         """"""
         self.stop_all_strategies()
+        self.data_store.close()
 
     def register_event(self):
         """"""
@@ -267,37 +272,15 @@ class StrategyEngine(BaseEngine):
             self.call_strategy_func(strategy, strategy.on_bars, bars)
 
     def load_bar(self, vt_symbol: str, days: int, interval: Interval) -> List[BarData]:
-        """"""
+        """
+        Download data missing in database from gateway or RQData, and then
+        load all from database.
+        """
         symbol, exchange = extract_vt_symbol(vt_symbol)
         end = datetime.now(get_localzone())
         start = end - timedelta(days)
-        contract: ContractData = self.main_engine.get_contract(vt_symbol)
-        data = []
-
-        # Query bars from gateway if available
-        if contract and contract.history_data:
-            req = HistoryRequest(
-                symbol=symbol,
-                exchange=exchange,
-                interval=interval,
-                start=start,
-                end=end
-            )
-            data = self.main_engine.query_history(req, contract.gateway_name)
-        # Try to query bars from RQData, if not found, load from database.
-        else:
-            data = self.query_bar_from_rq(symbol, exchange, interval, start, end)
-
-        if not data:
-            data = database_manager.load_bar_data(
-                symbol=symbol,
-                exchange=exchange,
-                interval=interval,
-                start=start,
-                end=end,
-            )
 
-        return data
+        return self.history_service.load_bar_data(symbol, exchange, interval, start, end)
 
     def call_strategy_func(
         self, strategy: StrategyTemplate, func: Callable, params: Any = None
@@ -509,18 +492,19 @@ class StrategyEngine(BaseEngine):
         """
         Load strategy data from json file.
         """
-        self.strategy_data = load_json(self.data_filename)
+        self.strategy_data = self.data_store.load()
 
     def sync_strategy_data(self, strategy: StrategyTemplate):
         """
-        Sync strategy data into json file.
+        Sync strategy data into json file, which is saved by background
+        writer of data store.
         """
         data = strategy.get_variables()
         data.pop("inited")      # Strategy status (inited, trading) should not be synced.
         data.pop("trading")
 
         self.strategy_data[strategy.strategy_name] = data
-        save_json(self.data_filename, self.strategy_data)
+        self.data_store.update(strategy.strategy_name, data)
 
     def get_all_strategy_class_names(self):
         """
@@ -550,9 +534,33 @@ class StrategyEngine(BaseEngine):
     def init_all_strategies(self):
         """
         """
+        # Update history data of all symbols concurrently first
+        self.init_executor.submit(self.update_history_data)
+
         for strategy_name in self.strategies.keys():
             self.init_strategy(strategy_name)
 
+    def update_history_data(self):
+        """
+        Download history data after newest bar in database for symbols
+        of strategies not inited.
+        """
+        vt_symbols = [
+            vt_symbol
+            for strategy in self.strategies.values() if not strategy.inited
+            for vt_symbol in strategy.vt_symbols
+        ]
+
+        # Exception is not raised from future of init executor, so log it here
+        try:
+            count = self.history_service.update_symbols(vt_symbols)
+        except Exception:
+            msg = f"历史数据更新失败，触发异常：\n{traceback.format_exc()}"
+            self.write_log(msg)
+            return
+
+        self.write_log(f"历史数据更新完成，共下载{count}条数据")
+
     def start_all_strategies(self):
         """
         """
@@ -1,6 +1,7 @@
 from pathlib import Path
 from vnpy.trader.app import BaseApp
-from .engine import RiskManagerEngine, APP_NAME
+from .engine import RiskManagerEngine, APP_NAME, EVENT_RISK_STATS
+from .rules import RiskRule, RateScope, SlidingWindowRule, TokenBucketRule
 
 
 class RiskManagerApp(BaseApp):
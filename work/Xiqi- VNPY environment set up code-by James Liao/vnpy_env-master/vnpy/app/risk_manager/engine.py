@@ -1,16 +1,31 @@
 """"""
 
-from collections import defaultdict
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence
+
 from vnpy.trader.object import OrderRequest, LogData
 from vnpy.event import Event, EventEngine, EVENT_TIMER
+from vnpy.event.stats import LatencyHistogram
 from vnpy.trader.engine import BaseEngine, MainEngine
 from vnpy.trader.event import EVENT_TRADE, EVENT_ORDER, EVENT_LOG
-from vnpy.trader.constant import Status
 from vnpy.trader.utility import load_json, save_json
 
+from .rules import (
+    RiskRule,
+    RateScope,
+    OrderSizeRule,
+    TradeLimitRule,
+    SlidingWindowRule,
+    ActiveOrderRule,
+    OrderCancelRule,
+    NotionalRule
+)
+
 
 APP_NAME = "RiskManager"
 
+EVENT_RISK_STATS = "eRiskStats"
+
 
 class RiskManagerEngine(BaseEngine):
     """"""
@@ -22,41 +37,139 @@ class RiskManagerEngine(BaseEngine):
 
         self.active = False
 
-        self.order_flow_count = 0
         self.order_flow_limit = 50
-
         self.order_flow_clear = 1
-        self.order_flow_timer = 0
+        self.account_flow_limit = 0
+        self.symbol_flow_limit = 0
+        self.strategy_flow_limit = 0
 
         self.order_size_limit = 100
-
-        self.trade_count = 0
         self.trade_limit = 1000
-
         self.order_cancel_limit = 500
-        self.order_cancel_counts = defaultdict(int)
-
         self.active_order_limit = 50
 
+        self.order_notional_limit = 0
+        self.position_notional_limit = 0
+
+        self.rules: List[RiskRule] = []
+        self.init_rules()
+
+        # Latency added by risk check to every order, published with
+        # EVENT_RISK_STATS every stats_interval seconds
+        self.check_latency = LatencyHistogram()
+        self.reject_count = 0
+        self.stats_interval = 10
+        self.stats_timer = 0
+        self.stats_count = 0
+
         self.load_setting()
         self.register_event()
         self.patch_send_order()
 
+    def init_rules(self):
+        """
+        Create built-in rules, cheaper ones are checked first.
+        """
+        self.order_size_rule = OrderSizeRule(self, self.order_size_limit)
+        self.trade_limit_rule = TradeLimitRule(self, self.trade_limit)
+        self.order_cancel_rule = OrderCancelRule(self, self.order_cancel_limit)
+        self.active_order_rule = ActiveOrderRule(self, self.active_order_limit)
+
+        self.flow_rules: Dict[str, SlidingWindowRule] = {}
+        for scope in [
+            RateScope.GLOBAL,
+            RateScope.ACCOUNT,
+            RateScope.SYMBOL,
+            RateScope.STRATEGY
+        ]:
+            self.flow_rules[scope] = SlidingWindowRule(self, scope, 0, 1)
+
+        self.notional_rule = NotionalRule(
+            self, self.order_notional_limit, self.position_notional_limit
+        )
+
+        self.rules = [
+            self.order_size_rule,
+            self.trade_limit_rule,
+            self.flow_rules[RateScope.GLOBAL],
+            self.active_order_rule,
+            self.order_cancel_rule,
+            self.flow_rules[RateScope.ACCOUNT],
+            self.flow_rules[RateScope.SYMBOL],
+            self.flow_rules[RateScope.STRATEGY],
+            self.notional_rule,
+        ]
+        self.apply_setting()
+
+    def add_rule(self, rule: RiskRule):
+        """
+        Add a custom rule at the end of rule pipeline.
+        """
+        self.rules.append(rule)
+
+    def remove_rule(self, name: str):
+        """"""
+        self.rules = [rule for rule in self.rules if rule.name != name]
+
+    def get_rule(self, name: str) -> Optional[RiskRule]:
+        """"""
+        for rule in self.rules:
+            if rule.name == name:
+                return rule
+        return None
+
     def patch_send_order(self):
         """
-        Patch send order function of MainEngine.
+        Patch send order functions of MainEngine.
         """
         self._send_order = self.main_engine.send_order
+        self._send_orders = self.main_engine.send_orders
         self.main_engine.send_order = self.send_order
+        self.main_engine.send_orders = self.send_orders
 
     def send_order(self, req: OrderRequest, gateway_name: str):
         """"""
+        start = perf_counter()
         result = self.check_risk(req, gateway_name)
+        self.check_latency.add(perf_counter() - start)
+
         if not result:
+            self.reject_count += 1
             return ""
 
         return self._send_order(req, gateway_name)
 
+    def send_orders(self, reqs: Sequence[OrderRequest], gateway_name: str):
+        """
+        Check every order in batch and only send accepted ones.
+        """
+        accepted = []
+
+        for rule in self.rules:
+            rule.on_batch_start()
+
+        try:
+            for ix, req in enumerate(reqs):
+                start = perf_counter()
+                result = self.check_risk(req, gateway_name)
+                self.check_latency.add(perf_counter() - start)
+
+                if result:
+                    accepted.append(ix)
+                else:
+                    self.reject_count += 1
+        finally:
+            for rule in self.rules:
+                rule.on_batch_end()
+
+        vt_orderids = ["" for req in reqs]
+        if accepted:
+            sent = self._send_orders([reqs[ix] for ix in accepted], gateway_name)
+            for ix, vt_orderid in zip(accepted, sent):
+                vt_orderids[ix] = vt_orderid
+
+        return vt_orderids
+
     def update_setting(self, setting: dict):
         """"""
         self.active = setting["active"]
@@ -67,21 +180,58 @@ class RiskManagerEngine(BaseEngine):
         self.active_order_limit = setting["active_order_limit"]
         self.order_cancel_limit = setting["order_cancel_limit"]
 
+        # Settings added later may not exist in saved file
+        self.account_flow_limit = setting.get("account_flow_limit", 0)
+        self.symbol_flow_limit = setting.get("symbol_flow_limit", 0)
+        self.strategy_flow_limit = setting.get("strategy_flow_limit", 0)
+        self.order_notional_limit = setting.get("order_notional_limit", 0)
+        self.position_notional_limit = setting.get("position_notional_limit", 0)
+
+        self.apply_setting()
+
         if self.active:
             self.write_log("交易风控功能启动")
         else:
             self.write_log("交易风控功能停止")
 
+    def apply_setting(self):
+        """
+        Update parameters of built-in rules.
+        """
+        self.order_size_rule.limit = self.order_size_limit
+        self.trade_limit_rule.limit = self.trade_limit
+        self.order_cancel_rule.limit = self.order_cancel_limit
+        self.active_order_rule.limit = self.active_order_limit
+
+        flow_limits = {
+            RateScope.GLOBAL: self.order_flow_limit,
+            RateScope.ACCOUNT: self.account_flow_limit,
+            RateScope.SYMBOL: self.symbol_flow_limit,
+            RateScope.STRATEGY: self.strategy_flow_limit,
+        }
+        for scope, limit in flow_limits.items():
+            rule = self.flow_rules[scope]
+            rule.limit = limit
+            rule.window = self.order_flow_clear
+
+        self.notional_rule.order_limit = self.order_notional_limit
+        self.notional_rule.position_limit = self.position_notional_limit
+
     def get_setting(self):
         """"""
         setting = {
             "active": self.active,
             "order_flow_limit": self.order_flow_limit,
             "order_flow_clear": self.order_flow_clear,
+            "account_flow_limit": self.account_flow_limit,
+            "symbol_flow_limit": self.symbol_flow_limit,
+            "strategy_flow_limit": self.strategy_flow_limit,
             "order_size_limit": self.order_size_limit,
             "trade_limit": self.trade_limit,
             "active_order_limit": self.active_order_limit,
             "order_cancel_limit": self.order_cancel_limit,
+            "order_notional_limit": self.order_notional_limit,
+            "position_notional_limit": self.position_notional_limit,
         }
         return setting
 
@@ -107,22 +257,41 @@ class RiskManagerEngine(BaseEngine):
     def process_order_event(self, event: Event):
         """"""
         order = event.data
-        if order.status != Status.CANCELLED:
-            return
-        self.order_cancel_counts[order.symbol] += 1
+        for rule in self.rules:
+            rule.on_order(order)
 
     def process_trade_event(self, event: Event):
         """"""
         trade = event.data
-        self.trade_count += trade.volume
+        for rule in self.rules:
+            rule.on_trade(trade)
 
     def process_timer_event(self, event: Event):
         """"""
-        self.order_flow_timer += 1
+        self.stats_timer += 1
+
+        if self.stats_timer >= self.stats_interval:
+            self.stats_timer = 0
+
+            # Only publish when new orders checked
+            if self.check_latency.count != self.stats_count:
+                self.stats_count = self.check_latency.count
+                self.put_stats_event()
 
-        if self.order_flow_timer >= self.order_flow_clear:
-            self.order_flow_count = 0
-            self.order_flow_timer = 0
+    def get_stats(self) -> dict:
+        """
+        Get statistics of risk check latency (in seconds), of the whole
+        pipeline and every rule.
+        """
+        stats = self.check_latency.to_dict()
+        stats["rejected"] = self.reject_count
+        stats["rules"] = {rule.name: rule.get_stats() for rule in self.rules}
+        return stats
+
+    def put_stats_event(self):
+        """"""
+        event = Event(type=EVENT_RISK_STATS, data=self.get_stats())
+        self.event_engine.put(event)
 
     def write_log(self, msg: str):
         """"""
@@ -135,41 +304,18 @@ class RiskManagerEngine(BaseEngine):
         if not self.active:
             return True
 
-        # Check order volume
-        if req.volume <= 0:
-            self.write_log("委托数量必须大于0")
-            return False
-
-        if req.volume > self.order_size_limit:
-            self.write_log(
-                f"单笔委托数量{req.volume}，超过限制{self.order_size_limit}")
-            return False
-
-        # Check trade volume
-        if self.trade_count >= self.trade_limit:
-            self.write_log(
-                f"今日总成交合约数量{self.trade_count}，超过限制{self.trade_limit}")
-            return False
-
-        # Check flow count
-        if self.order_flow_count >= self.order_flow_limit:
-            self.write_log(
-                f"委托流数量{self.order_flow_count}，超过限制每{self.order_flow_clear}秒{self.order_flow_limit}次")
-            return False
-
-        # Check all active orders
-        active_order_count = len(self.main_engine.get_all_active_orders())
-        if active_order_count >= self.active_order_limit:
-            self.write_log(
-                f"当前活动委托次数{active_order_count}，超过限制{self.active_order_limit}")
-            return False
-
-        # Check order cancel counts
-        if req.symbol in self.order_cancel_counts and self.order_cancel_counts[req.symbol] >= self.order_cancel_limit:
-            self.write_log(
-                f"当日{req.symbol}撤单次数{self.order_cancel_counts[req.symbol]}，超过限制{self.order_cancel_limit}")
-            return False
-
-        # Add flow count if pass all checks
-        self.order_flow_count += 1
+        for rule in self.rules:
+            start = perf_counter()
+            msg = rule.check(req, gateway_name)
+            rule.latency.add(perf_counter() - start)
+
+            if msg:
+                rule.reject_count += 1
+                self.write_log(msg)
+                return False
+
+        # Update state of rules if pass all checks
+        for rule in self.rules:
+            rule.on_accepted(req, gateway_name)
+
         return True
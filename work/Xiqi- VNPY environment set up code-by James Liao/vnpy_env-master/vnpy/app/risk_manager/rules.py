@@ -0,0 +1,441 @@
+"""
+Pre-trade risk rules evaluated by RiskManagerEngine.
+
+Every rule checks an order request and returns the reason of rejection,
+or an empty string if the order is allowed. State of a rule is updated
+in on_accepted after the order passed all rules, so that orders rejected
+by later rules do not consume quota of earlier ones.
+
+Rules are called in the thread sending orders (usually the event thread),
+so check functions must finish in constant time without any I/O or lock.
+"""
+
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from time import monotonic
+from typing import TYPE_CHECKING, Deque, Dict, List
+
+from vnpy.event.stats import LatencyHistogram
+from vnpy.trader.constant import Direction, Status
+from vnpy.trader.object import OrderData, OrderRequest, TradeData
+
+if TYPE_CHECKING:
+    from .engine import RiskManagerEngine
+
+
+class RateScope:
+    """
+    Scopes of order rate limit, which decide how orders are counted.
+    """
+    GLOBAL = "global"
+    ACCOUNT = "account"             # by gateway name
+    SYMBOL = "symbol"               # by vt_symbol
+    STRATEGY = "strategy"           # by order reference
+
+    NAMES: Dict[str, str] = {
+        GLOBAL: "委托流",
+        ACCOUNT: "账户委托流",
+        SYMBOL: "合约委托流",
+        STRATEGY: "策略委托流",
+    }
+
+
+def get_scope_key(scope: str, req: OrderRequest, gateway_name: str) -> str:
+    """
+    Get key of order counter in the scope.
+    """
+    if scope == RateScope.ACCOUNT:
+        return gateway_name
+    elif scope == RateScope.SYMBOL:
+        return req.vt_symbol
+    elif scope == RateScope.STRATEGY:
+        return req.reference
+    return ""
+
+
+class RiskRule(ABC):
+    """
+    Base class of pre-trade risk rules.
+    """
+
+    name: str = ""
+
+    def __init__(self, risk_engine: "RiskManagerEngine"):
+        """"""
+        self.risk_engine = risk_engine
+        self.main_engine = risk_engine.main_engine
+
+        self.latency: LatencyHistogram = LatencyHistogram()
+        self.reject_count: int = 0
+
+    @abstractmethod
+    def check(self, req: OrderRequest, gateway_name: str) -> str:
+        """
+        Return reason of rejection, or empty string if order is allowed.
+        """
+        pass
+
+    def on_accepted(self, req: OrderRequest, gateway_name: str) -> None:
+        """
+        Callback when order passed all rules.
+        """
+        pass
+
+    def on_batch_start(self) -> None:
+        """
+        Callback before orders of a batch are checked.
+        """
+        pass
+
+    def on_batch_end(self) -> None:
+        """
+        Callback after orders of a batch are sent.
+        """
+        pass
+
+    def on_order(self, order: OrderData) -> None:
+        """"""
+        pass
+
+    def on_trade(self, trade: TradeData) -> None:
+        """"""
+        pass
+
+    def get_stats(self) -> dict:
+        """
+        Get check latency (in seconds) and reject count of the rule.
+        """
+        stats = self.latency.to_dict()
+        stats["rejected"] = self.reject_count
+        return stats
+
+
+class OrderSizeRule(RiskRule):
+    """
+    Limit volume of every single order.
+    """
+
+    name = "order_size"
+
+    def __init__(self, risk_engine: "RiskManagerEngine", limit: float):
+        """"""
+        super().__init__(risk_engine)
+
+        self.limit: float = limit
+
+    def check(self, req: OrderRequest, gateway_name: str) -> str:
+        """"""
+        if req.volume <= 0:
+            return "委托数量必须大于0"
+
+        if req.volume > self.limit:
+            return f"单笔委托数量{req.volume}，超过限制{self.limit}"
+
+        return ""
+
+
+class TradeLimitRule(RiskRule):
+    """
+    Limit total traded volume of the day.
+    """
+
+    name = "trade_limit"
+
+    def __init__(self, risk_engine: "RiskManagerEngine", limit: float):
+        """"""
+        super().__init__(risk_engine)
+
+        self.limit: float = limit
+        self.trade_count: float = 0
+
+    def check(self, req: OrderRequest, gateway_name: str) -> str:
+        """"""
+        if self.trade_count >= self.limit:
+            return f"今日总成交合约数量{self.trade_count}，超过限制{self.limit}"
+        return ""
+
+    def on_trade(self, trade: TradeData) -> None:
+        """"""
+        self.trade_count += trade.volume
+
+
+class SlidingWindowRule(RiskRule):
+    """
+    Allow at most limit orders within any window of seconds for every key
+    of the scope. Send time of accepted orders is kept in a deque, which
+    never grows longer than limit.
+    """
+
+    def __init__(
+        self,
+        risk_engine: "RiskManagerEngine",
+        scope: str,
+        limit: int,
+        window: float
+    ):
+        """"""
+        super().__init__(risk_engine)
+
+        self.name = f"{scope}_flow"
+        self.scope: str = scope
+        self.limit: int = limit
+        self.window: float = window
+
+        self.records: Dict[str, Deque[float]] = defaultdict(deque)
+
+    def check(self, req: OrderRequest, gateway_name: str) -> str:
+        """"""
+        if self.limit <= 0:
+            return ""
+
+        key = get_scope_key(self.scope, req, gateway_name)
+        records = self.records[key]
+
+        # Remove records out of window
+        expiry = monotonic() - self.window
+        while records and records[0] <= expiry:
+            records.popleft()
+
+        if len(records) >= self.limit:
+            name = RateScope.NAMES[self.scope]
+            if key:
+                name = f"{key}{name}"
+
+            return (
+                f"{name}数量{len(records)}，超过限制"
+                f"每{self.window}秒{self.limit}次"
+            )
+
+        return ""
+
+    def on_accepted(self, req: OrderRequest, gateway_name: str) -> None:
+        """"""
+        if self.limit <= 0:
+            return
+
+        key = get_scope_key(self.scope, req, gateway_name)
+        records = self.records[key]
+        records.append(monotonic())
+
+        # Limit may be reduced after setting updated
+        while len(records) > self.limit:
+            records.popleft()
+
+
+class TokenBucketRule(RiskRule):
+    """
+    Limit average order rate of every key of the scope with token bucket,
+    which refills rate tokens per second up to capacity (max burst size).
+    """
+
+    def __init__(
+        self,
+        risk_engine: "RiskManagerEngine",
+        scope: str,
+        rate: float,
+        capacity: float
+    ):
+        """"""
+        super().__init__(risk_engine)
+
+        self.name = f"{scope}_bucket"
+        self.scope: str = scope
+        self.rate: float = rate
+        self.capacity: float = capacity
+
+        # key: [tokens, last refill time]
+        self.buckets: Dict[str, List[float]] = {}
+
+    def refill(self, key: str) -> List[float]:
+        """"""
+        now = monotonic()
+
+        bucket = self.buckets.get(key, None)
+        if not bucket:
+            bucket = [self.capacity, now]
+            self.buckets[key] = bucket
+        else:
+            tokens = bucket[0] + (now - bucket[1]) * self.rate
+            bucket[0] = min(tokens, self.capacity)
+            bucket[1] = now
+
+        return bucket
+
+    def check(self, req: OrderRequest, gateway_name: str) -> str:
+        """"""
+        if self.rate <= 0:
+            return ""
+
+        key = get_scope_key(self.scope, req, gateway_name)
+        bucket = self.refill(key)
+
+        if bucket[0] < 1:
+            name = RateScope.NAMES[self.scope]
+            if key:
+                name = f"{key}{name}"
+
+            return (
+                f"{name}速率超过限制每秒{self.rate}次"
+                f"（突发上限{self.capacity}次）"
+            )
+
+        return ""
+
+    def on_accepted(self, req: OrderRequest, gateway_name: str) -> None:
+        """"""
+        if self.rate <= 0:
+            return
+
+        key = get_scope_key(self.scope, req, gateway_name)
+        self.buckets[key][0] -= 1
+
+
+class ActiveOrderRule(RiskRule):
+    """
+    Limit number of all active orders, counted by OmsEngine index.
+
+    Orders accepted earlier in the same batch are not in OmsEngine yet,
+    so they are counted separately.
+    """
+
+    name = "active_order"
+
+    def __init__(self, risk_engine: "RiskManagerEngine", limit: int):
+        """"""
+        super().__init__(risk_engine)
+
+        self.limit: int = limit
+
+        self.in_batch: bool = False
+        self.batch_count: int = 0
+
+    def check(self, req: OrderRequest, gateway_name: str) -> str:
+        """"""
+        active_order_count = self.main_engine.get_active_order_count() + self.batch_count
+        if active_order_count >= self.limit:
+            return f"当前活动委托次数{active_order_count}，超过限制{self.limit}"
+        return ""
+
+    def on_accepted(self, req: OrderRequest, gateway_name: str) -> None:
+        """"""
+        if self.in_batch:
+            self.batch_count += 1
+
+    def on_batch_start(self) -> None:
+        """"""
+        self.in_batch = True
+        self.batch_count = 0
+
+    def on_batch_end(self) -> None:
+        """"""
+        self.in_batch = False
+        self.batch_count = 0
+
+
+class OrderCancelRule(RiskRule):
+    """
+    Limit cancel count of every symbol in the day.
+    """
+
+    name = "order_cancel"
+
+    def __init__(self, risk_engine: "RiskManagerEngine", limit: int):
+        """"""
+        super().__init__(risk_engine)
+
+        self.limit: int = limit
+        self.cancel_counts: Dict[str, int] = defaultdict(int)
+
+    def check(self, req: OrderRequest, gateway_name: str) -> str:
+        """"""
+        cancel_count = self.cancel_counts.get(req.symbol, 0)
+        if cancel_count >= self.limit:
+            return f"当日{req.symbol}撤单次数{cancel_count}，超过限制{self.limit}"
+        return ""
+
+    def on_order(self, order: OrderData) -> None:
+        """"""
+        if order.status == Status.CANCELLED:
+            self.cancel_counts[order.symbol] += 1
+
+
+class NotionalRule(RiskRule):
+    """
+    Limit notional value of every single order, and notional exposure of
+    net position of every symbol after the order is traded. Position is
+    read from OmsEngine, and orders reducing exposure are always allowed.
+
+    Limit value of 0 means no limit.
+    """
+
+    name = "notional"
+
+    def __init__(
+        self,
+        risk_engine: "RiskManagerEngine",
+        order_limit: float,
+        position_limit: float
+    ):
+        """"""
+        super().__init__(risk_engine)
+
+        self.order_limit: float = order_limit
+        self.position_limit: float = position_limit
+
+    def check(self, req: OrderRequest, gateway_name: str) -> str:
+        """"""
+        if not self.order_limit and not self.position_limit:
+            return ""
+
+        # Use last price for market order
+        price = req.price
+        if not price:
+            tick = self.main_engine.get_tick(req.vt_symbol)
+            if not tick:
+                return ""
+            price = tick.last_price
+
+        contract = self.main_engine.get_contract(req.vt_symbol)
+        if contract:
+            size = contract.size
+        else:
+            size = 1
+
+        if self.order_limit:
+            notional = price * req.volume * size
+            if notional > self.order_limit:
+                return f"单笔委托金额{notional:.2f}，超过限制{self.order_limit}"
+
+        if self.position_limit:
+            pos = self.get_net_position(req.vt_symbol)
+
+            if req.direction == Direction.LONG:
+                new_pos = pos + req.volume
+            else:
+                new_pos = pos - req.volume
+
+            if abs(new_pos) > abs(pos):
+                exposure = abs(new_pos) * price * size
+                if exposure > self.position_limit:
+                    return (
+                        f"{req.vt_symbol}持仓金额{exposure:.2f}，"
+                        f"超过限制{self.position_limit}"
+                    )
+
+        return ""
+
+    def get_net_position(self, vt_symbol: str) -> float:
+        """"""
+        pos = 0
+
+        for direction in (Direction.NET, Direction.LONG, Direction.SHORT):
+            position = self.main_engine.get_position(f"{vt_symbol}.{direction.value}")
+            if not position:
+                continue
+
+            if direction == Direction.SHORT:
+                pos -= position.volume
+            else:
+                pos += position.volume
+
+        return pos
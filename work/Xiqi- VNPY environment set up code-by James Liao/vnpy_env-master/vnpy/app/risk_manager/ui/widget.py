@@ -31,6 +31,14 @@ class RiskManager(QtWidgets.QDialog):
         self.trade_limit_spin = RiskManagerSpinBox()
         self.active_limit_spin = RiskManagerSpinBox()
         self.cancel_limit_spin = RiskManagerSpinBox()
+        self.account_flow_spin = RiskManagerSpinBox()
+        self.symbol_flow_spin = RiskManagerSpinBox()
+        self.strategy_flow_spin = RiskManagerSpinBox()
+        self.order_notional_spin = RiskManagerSpinBox()
+        self.position_notional_spin = RiskManagerSpinBox()
+
+        self.order_notional_spin.setMaximum(1000000000)
+        self.position_notional_spin.setMaximum(1000000000)
 
         save_button = QtWidgets.QPushButton("保存")
         save_button.clicked.connect(self.save_setting)
@@ -44,6 +52,11 @@ class RiskManager(QtWidgets.QDialog):
         form.addRow("总成交上限（笔）", self.trade_limit_spin)
         form.addRow("活动委托上限（笔）", self.active_limit_spin)
         form.addRow("合约撤单上限（笔）", self.cancel_limit_spin)
+        form.addRow("账户委托流控上限（笔）", self.account_flow_spin)
+        form.addRow("合约委托流控上限（笔）", self.symbol_flow_spin)
+        form.addRow("策略委托流控上限（笔）", self.strategy_flow_spin)
+        form.addRow("单笔委托金额上限", self.order_notional_spin)
+        form.addRow("合约持仓金额上限", self.position_notional_spin)
         form.addRow(save_button)
 
         self.setLayout(form)
@@ -68,6 +81,11 @@ class RiskManager(QtWidgets.QDialog):
             "trade_limit": self.trade_limit_spin.value(),
             "active_order_limit": self.active_limit_spin.value(),
             "order_cancel_limit": self.cancel_limit_spin.value(),
+            "account_flow_limit": self.account_flow_spin.value(),
+            "symbol_flow_limit": self.symbol_flow_spin.value(),
+            "strategy_flow_limit": self.strategy_flow_spin.value(),
+            "order_notional_limit": self.order_notional_spin.value(),
+            "position_notional_limit": self.position_notional_spin.value(),
         }
 
         self.rm_engine.update_setting(setting)
@@ -89,6 +107,11 @@ class RiskManager(QtWidgets.QDialog):
         self.trade_limit_spin.setValue(setting["trade_limit"])
         self.active_limit_spin.setValue(setting["active_order_limit"])
         self.cancel_limit_spin.setValue(setting["order_cancel_limit"])
+        self.account_flow_spin.setValue(setting["account_flow_limit"])
+        self.symbol_flow_spin.setValue(setting["symbol_flow_limit"])
+        self.strategy_flow_spin.setValue(setting["strategy_flow_limit"])
+        self.order_notional_spin.setValue(setting["order_notional_limit"])
+        self.position_notional_spin.setValue(setting["position_notional_limit"])
 
     def exec_(self):
         """"""
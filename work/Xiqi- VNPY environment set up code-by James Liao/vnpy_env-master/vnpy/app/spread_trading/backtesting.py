@@ -10,14 +10,17 @@ from pandas import DataFrame
 from vnpy.trader.constant import (Direction, Offset, Exchange,
                                   Interval, Status)
 from vnpy.trader.object import TradeData, BarData, TickData
+from vnpy.trader.optimize import OptimizationMixin
 
 from .template import SpreadStrategyTemplate, SpreadAlgoTemplate
-from .base import SpreadData, BacktestingMode, load_bar_data, load_tick_data
+from .base import (
+    SpreadData, BacktestingMode, LegFillPolicy, load_bar_data, load_tick_data
+)
 
 sns.set_style("whitegrid")
 
 
-class BacktestingEngine:
+class BacktestingEngine(OptimizationMixin):
     """"""
 
     gateway_name = "BACKTESTING"
@@ -34,6 +37,7 @@ class BacktestingEngine:
         self.pricetick = 0
         self.capital = 1_000_000
         self.mode = BacktestingMode.BAR
+        self.fill_policy = LegFillPolicy.DROP
 
         self.strategy_class: Type[SpreadStrategyTemplate] = None
         self.strategy: SpreadStrategyTemplate = None
@@ -82,6 +86,7 @@ class BacktestingEngine:
 
         self.logs.clear()
         self.daily_results.clear()
+        self.daily_df = None
 
     def set_parameters(
         self,
@@ -94,7 +99,8 @@ class BacktestingEngine:
         pricetick: float,
         capital: int = 0,
         end: datetime = None,
-        mode: BacktestingMode = BacktestingMode.BAR
+        mode: BacktestingMode = BacktestingMode.BAR,
+        fill_policy: LegFillPolicy = LegFillPolicy.DROP
     ):
         """"""
         self.spread = spread
@@ -107,6 +113,7 @@ class BacktestingEngine:
         self.capital = capital
         self.end = end
         self.mode = mode
+        self.fill_policy = fill_policy
 
     def add_strategy(self, strategy_class: type, setting: dict):
         """"""
@@ -136,10 +143,11 @@ class BacktestingEngine:
                 self.interval,
                 self.start,
                 self.end,
-                self.pricetick
+                self.pricetick,
+                self.fill_policy
             )
         else:
-            self.history_datas = load_tick_data(
+            self.history_data = load_tick_data(
                 self.spread,
                 self.start,
                 self.end
@@ -283,8 +291,12 @@ class BacktestingEngine:
             max_drawdown = df["drawdown"].min()
             max_ddpercent = df["ddpercent"].min()
             max_drawdown_end = df["drawdown"].idxmin()
-            max_drawdown_start = df["balance"][:max_drawdown_end].argmax()
-            max_drawdown_duration = (max_drawdown_end - max_drawdown_start).days
+
+            if isinstance(max_drawdown_end, date):
+                max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
+                max_drawdown_duration = (max_drawdown_end - max_drawdown_start).days
+            else:
+                max_drawdown_duration = 0
 
             total_net_pnl = df["net_pnl"].sum()
             daily_net_pnl = total_net_pnl / total_days
@@ -380,6 +392,34 @@ class BacktestingEngine:
 
         return statistics
 
+    def get_optimization_parameters(self) -> dict:
+        """"""
+        parameters = {
+            "spread": self.spread,
+            "interval": self.interval,
+            "start": self.start,
+            "rate": self.rate,
+            "slippage": self.slippage,
+            "size": self.size,
+            "pricetick": self.pricetick,
+            "capital": self.capital,
+            "end": self.end,
+            "mode": self.mode,
+            "fill_policy": self.fill_policy,
+        }
+        return parameters
+
+    def get_optimization_data(self) -> list:
+        """"""
+        if not self.history_data:
+            self.load_data()
+
+        return self.history_data
+
+    def set_optimization_data(self, data: list) -> None:
+        """"""
+        self.history_data = data
+
     def show_chart(self, df: DataFrame = None):
         """"""
         # Check DataFrame input exterior
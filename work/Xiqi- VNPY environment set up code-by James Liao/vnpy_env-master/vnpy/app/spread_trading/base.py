@@ -1,13 +1,17 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from datetime import datetime
 from enum import Enum
-from functools import lru_cache
+from functools import lru_cache, reduce
+
+import numpy as np
 
 from vnpy.trader.object import (
     TickData, PositionData, TradeData, ContractData, BarData
 )
 from vnpy.trader.constant import Direction, Offset, Exchange, Interval
-from vnpy.trader.utility import floor_to, ceil_to, round_to, extract_vt_symbol
+from vnpy.trader.utility import (
+    floor_to, ceil_to, round_to, round_to_array, extract_vt_symbol, BarArrays
+)
 from vnpy.trader.database import database_manager
 
 
@@ -371,65 +375,127 @@ class BacktestingMode(Enum):
     TICK = 2
 
 
-@lru_cache(maxsize=999)
+class LegFillPolicy(Enum):
+    """
+    How to handle datetime when some leg has no bar.
+    """
+    DROP = "drop"       # skip the datetime
+    FFILL = "ffill"     # use close price of last bar of the leg
+
+
 def load_bar_data(
     spread: SpreadData,
     interval: Interval,
     start: datetime,
     end: datetime,
-    pricetick: float = 0
+    pricetick: float = 0,
+    fill_policy: LegFillPolicy = LegFillPolicy.DROP
 ):
     """"""
-    # Load bar data of each spread leg
-    leg_bars: Dict[str, Dict] = {}
+    legs = tuple(
+        (vt_symbol, spread.price_multipliers[vt_symbol])
+        for vt_symbol in spread.legs.keys()
+    )
 
-    for vt_symbol in spread.legs.keys():
-        symbol, exchange = extract_vt_symbol(vt_symbol)
+    spread_arrays, spread_values = load_spread_arrays(
+        spread.name, legs, interval, start, end, pricetick, fill_policy
+    )
 
-        bar_data: List[BarData] = database_manager.load_bar_data(
-            symbol, exchange, interval, start, end
-        )
+    spread_bars: List[BarData] = []
 
-        bars: Dict[datetime, BarData] = {bar.datetime: bar for bar in bar_data}
-        leg_bars[vt_symbol] = bars
+    for spread_bar, spread_value in zip(
+        spread_arrays.iter_bars(), spread_values.tolist()
+    ):
+        spread_bar.value = spread_value
+        spread_bars.append(spread_bar)
 
-    # Calculate spread bar data
-    spread_bars: List[BarData] = []
+    return spread_bars
 
-    for dt in bars.keys():
-        spread_price = 0
-        spread_value = 0
-        spread_available = True
 
-        for leg in spread.legs.values():
-            leg_bar = leg_bars[leg.vt_symbol].get(dt, None)
+@lru_cache(maxsize=999)
+def load_spread_arrays(
+    name: str,
+    legs: Tuple[Tuple[str, float], ...],
+    interval: Interval,
+    start: datetime,
+    end: datetime,
+    pricetick: float = 0,
+    fill_policy: LegFillPolicy = LegFillPolicy.DROP
+) -> Tuple[BarArrays, np.ndarray]:
+    """
+    Load bar data of every leg as arrays, align them on datetime and
+    calculate spread price and value in bulk.
+
+    Legs are given as (vt_symbol, price_multiplier) pairs, so that result
+    is cached for spreads with the same legs, no matter whether they are
+    the same SpreadData object.
+    """
+    leg_arrays: List[BarArrays] = []
+
+    for vt_symbol, _ in legs:
+        symbol, exchange = extract_vt_symbol(vt_symbol)
 
-            if leg_bar:
-                price_multiplier = spread.price_multipliers[leg.vt_symbol]
-                spread_price += price_multiplier * leg_bar.close_price
-                spread_value += abs(price_multiplier) * leg_bar.close_price
-            else:
-                spread_available = False
-
-        if spread_available:
-            if pricetick:
-                spread_price = round_to(spread_price, pricetick)
-
-            spread_bar = BarData(
-                symbol=spread.name,
-                exchange=exchange.LOCAL,
-                datetime=dt,
-                interval=interval,
-                open_price=spread_price,
-                high_price=spread_price,
-                low_price=spread_price,
-                close_price=spread_price,
-                gateway_name="SPREAD",
-            )
-            spread_bar.value = spread_value
-            spread_bars.append(spread_bar)
+        arrays = database_manager.load_bar_arrays(
+            symbol, exchange, interval, start, end
+        )
+        leg_arrays.append(arrays)
+
+    # Join datetime of all legs
+    leg_datetimes = [arrays.datetime for arrays in leg_arrays]
+
+    if fill_policy == LegFillPolicy.FFILL:
+        dt = reduce(np.union1d, leg_datetimes)
+    else:
+        dt = reduce(np.intersect1d, leg_datetimes)
+
+    # Find index of bar at or before each datetime in every leg
+    spread_price = np.zeros(len(dt))
+    spread_value = np.zeros(len(dt))
+    available = np.ones(len(dt), dtype=bool)
+
+    for (_, price_multiplier), arrays in zip(legs, leg_arrays):
+        if not len(arrays):
+            available[:] = False
+            continue
+
+        ix = np.searchsorted(arrays.datetime, dt, side="right") - 1
+        available &= ix >= 0
+
+        close_price = arrays.close_price[np.maximum(ix, 0)]
+        spread_price += price_multiplier * close_price
+        spread_value += abs(price_multiplier) * close_price
+
+    dt = dt[available]
+    spread_price = spread_price[available]
+    spread_value = spread_value[available]
+
+    if pricetick:
+        spread_price = round_to_array(spread_price, pricetick)
+
+    tz = None
+    for arrays in leg_arrays:
+        if len(arrays):
+            tz = arrays.tzinfo
+            break
+
+    zeros = np.zeros(len(dt))
+
+    spread_arrays = BarArrays(
+        name,
+        Exchange.LOCAL,
+        interval,
+        datetime=dt,
+        open_price=spread_price,
+        high_price=spread_price,
+        low_price=spread_price,
+        close_price=spread_price,
+        volume=zeros,
+        open_interest=zeros,
+        tzinfo=tz,
+        gateway_name="SPREAD"
+    )
 
-    return spread_bars
+    return spread_arrays, spread_value
 
 
 @lru_cache(maxsize=999)
@@ -1,43 +1,133 @@
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Tuple
 from datetime import datetime
 
+import numpy as np
+
 from vnpy.trader.object import BarData
 
 from .base import to_int
 
 
+class SegmentTree:
+    """
+    Segment tree on numpy array for range max/min query in O(log n).
+
+    Leaves are stored from index capacity of the array, and node i is the
+    result of its children 2i and 2i+1. Unused leaves are filled with
+    identity value of the function.
+    """
+
+    def __init__(self, func: Callable, identity: float, capacity: int = 1024):
+        """"""
+        self.func: Callable = func              # np.maximum or np.minimum
+        self.identity: float = identity
+
+        self.capacity: int = capacity
+        self.tree: np.ndarray = np.full(capacity * 2, identity)
+
+    def build(self, values: np.ndarray) -> None:
+        """
+        Rebuild the whole tree with values, level by level.
+        """
+        capacity = 1
+        while capacity < len(values):
+            capacity *= 2
+        self.capacity = max(capacity, self.capacity)
+
+        self.tree = np.full(self.capacity * 2, self.identity)
+        self.tree[self.capacity:self.capacity + len(values)] = values
+
+        start = self.capacity // 2
+        while start:
+            self.tree[start:start * 2] = self.func(
+                self.tree[start * 2:start * 4:2],
+                self.tree[start * 2 + 1:start * 4:2]
+            )
+            start //= 2
+
+    def update(self, ix: int, value: float) -> None:
+        """
+        Set value of one leaf and update its ancestors only.
+        """
+        if ix >= self.capacity:
+            values = self.tree[self.capacity:self.capacity * 2]
+            self.capacity *= 2
+            self.build(values)
+
+        tree = self.tree
+        func = self.func
+
+        i = ix + self.capacity
+        tree[i] = value
+        i //= 2
+
+        while i:
+            tree[i] = func(tree[i * 2], tree[i * 2 + 1])
+            i //= 2
+
+    def query(self, min_ix: int, max_ix: int) -> float:
+        """
+        Get result within [min_ix, max_ix].
+        """
+        tree = self.tree
+        func = self.func
+
+        result = self.identity
+        left = min_ix + self.capacity
+        right = max_ix + self.capacity + 1
+
+        while left < right:
+            if left & 1:
+                result = func(result, tree[left])
+                left += 1
+            if right & 1:
+                right -= 1
+                result = func(result, tree[right])
+            left //= 2
+            right //= 2
+
+        return float(result)
+
+
 class BarManager:
     """"""
 
     def __init__(self):
         """"""
-        self._bars: Dict[datetime, BarData] = {}
+        self._bars: List[BarData] = []
+        self._datetimes: List[datetime] = []
         self._datetime_index_map: Dict[datetime, int] = {}
-        self._index_datetime_map: Dict[int, datetime] = {}
 
-        self._price_ranges: Dict[Tuple[int, int], Tuple[float, float]] = {}
-        self._volume_ranges: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        self._high_tree: SegmentTree = SegmentTree(np.maximum, -np.inf)
+        self._low_tree: SegmentTree = SegmentTree(np.minimum, np.inf)
+        self._volume_tree: SegmentTree = SegmentTree(np.maximum, -np.inf)
 
     def update_history(self, history: List[BarData]) -> None:
         """
         Update a list of bar data.
         """
         # Put all new bars into dict
+        bars = dict(zip(self._datetimes, self._bars))
         for bar in history:
-            self._bars[bar.datetime] = bar
+            bars[bar.datetime] = bar
 
-        # Sort bars dict according to bar.datetime
-        self._bars = dict(sorted(self._bars.items(), key=lambda tp: tp[0]))
+        # Sort bars according to bar.datetime
+        bars = dict(sorted(bars.items(), key=lambda tp: tp[0]))
 
         # Update map relationiship
-        ix_list = range(len(self._bars))
-        dt_list = self._bars.keys()
+        self._bars = list(bars.values())
+        self._datetimes = list(bars.keys())
+        self._datetime_index_map = {dt: ix for ix, dt in enumerate(self._datetimes)}
 
-        self._datetime_index_map = dict(zip(dt_list, ix_list))
-        self._index_datetime_map = dict(zip(ix_list, dt_list))
+        # Rebuild range trees with columns of all bars
+        count = len(self._bars)
+        highs = np.fromiter((bar.high_price for bar in self._bars), float, count)
+        lows = np.fromiter((bar.low_price for bar in self._bars), float, count)
+        volumes = np.fromiter((bar.volume for bar in self._bars), float, count)
 
-        # Clear data range cache
-        self._clear_cache()
+        self._high_tree.build(highs)
+        self._low_tree.build(lows)
+        self._volume_tree.build(volumes)
 
     def update_bar(self, bar: BarData) -> None:
         """
@@ -45,14 +135,18 @@ class BarManager:
         """
         dt = bar.datetime
 
-        if dt not in self._datetime_index_map:
+        ix = self._datetime_index_map.get(dt, None)
+        if ix is None:
             ix = len(self._bars)
             self._datetime_index_map[dt] = ix
-            self._index_datetime_map[ix] = dt
-
-        self._bars[dt] = bar
+            self._datetimes.append(dt)
+            self._bars.append(bar)
+        else:
+            self._bars[ix] = bar
 
-        self._clear_cache()
+        self._high_tree.update(ix, bar.high_price)
+        self._low_tree.update(ix, bar.low_price)
+        self._volume_tree.update(ix, bar.volume)
 
     def get_count(self) -> int:
         """
@@ -71,100 +165,74 @@ class BarManager:
         Get datetime with index.
         """
         ix = to_int(ix)
-        return self._index_datetime_map.get(ix, None)
+        if 0 <= ix < len(self._datetimes):
+            return self._datetimes[ix]
+        return None
 
     def get_bar(self, ix: float) -> BarData:
         """
         Get bar data with index.
         """
         ix = to_int(ix)
-        dt = self._index_datetime_map.get(ix, None)
-        if not dt:
-            return None
-
-        return self._bars[dt]
+        if 0 <= ix < len(self._bars):
+            return self._bars[ix]
+        return None
 
     def get_all_bars(self) -> List[BarData]:
         """
         Get all bar data.
         """
-        return list(self._bars.values())
+        return list(self._bars)
 
     def get_price_range(self, min_ix: float = None, max_ix: float = None) -> Tuple[float, float]:
         """
         Get price range to show within given index range.
         """
-        if not self._bars:
+        index_range = self._get_index_range(min_ix, max_ix)
+        if not index_range:
             return 0, 1
 
-        if not min_ix:
-            min_ix = 0
-            max_ix = len(self._bars) - 1
-        else:
-            min_ix = to_int(min_ix)
-            max_ix = to_int(max_ix)
-            max_ix = min(max_ix, self.get_count())
-
-        buf = self._price_ranges.get((min_ix, max_ix), None)
-        if buf:
-            return buf
-
-        bar_list = list(self._bars.values())[min_ix:max_ix + 1]
-        first_bar = bar_list[0]
-        max_price = first_bar.high_price
-        min_price = first_bar.low_price
-
-        for bar in bar_list[1:]:
-            max_price = max(max_price, bar.high_price)
-            min_price = min(min_price, bar.low_price)
-
-        self._price_ranges[(min_ix, max_ix)] = (min_price, max_price)
+        min_price = self._low_tree.query(*index_range)
+        max_price = self._high_tree.query(*index_range)
         return min_price, max_price
 
     def get_volume_range(self, min_ix: float = None, max_ix: float = None) -> Tuple[float, float]:
         """
         Get volume range to show within given index range.
         """
-        if not self._bars:
+        index_range = self._get_index_range(min_ix, max_ix)
+        if not index_range:
             return 0, 1
 
-        if not min_ix:
-            min_ix = 0
-            max_ix = len(self._bars) - 1
-        else:
-            min_ix = to_int(min_ix)
-            max_ix = to_int(max_ix)
-            max_ix = min(max_ix, self.get_count())
-
-        buf = self._volume_ranges.get((min_ix, max_ix), None)
-        if buf:
-            return buf
+        max_volume = self._volume_tree.query(*index_range)
+        return 0, max_volume
 
-        bar_list = list(self._bars.values())[min_ix:max_ix + 1]
-
-        first_bar = bar_list[0]
-        max_volume = first_bar.volume
-        min_volume = 0
+    def _get_index_range(self, min_ix: float = None, max_ix: float = None) -> Tuple[int, int]:
+        """
+        Get index range of bars within given range, all bars if not given.
+        """
+        count = len(self._bars)
 
-        for bar in bar_list[1:]:
-            max_volume = max(max_volume, bar.volume)
+        if min_ix is None:
+            min_ix = 0
+            max_ix = count - 1
+        else:
+            min_ix = max(to_int(min_ix), 0)
+            max_ix = min(to_int(max_ix), count - 1)
 
-        self._volume_ranges[(min_ix, max_ix)] = (min_volume, max_volume)
-        return min_volume, max_volume
+        if min_ix > max_ix:
+            return None
 
-    def _clear_cache(self) -> None:
-        """
-        Clear cached range data.
-        """
-        self._price_ranges.clear()
-        self._volume_ranges.clear()
+        return min_ix, max_ix
 
     def clear_all(self) -> None:
         """
         Clear all data in manager.
         """
         self._bars.clear()
+        self._datetimes.clear()
         self._datetime_index_map.clear()
-        self._index_datetime_map.clear()
 
-        self._clear_cache()
+        self._high_tree.build(np.array([]))
+        self._low_tree.build(np.array([]))
+        self._volume_tree.build(np.array([]))
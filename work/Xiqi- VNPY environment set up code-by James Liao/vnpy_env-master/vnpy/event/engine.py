@@ -2,13 +2,21 @@
 Event-driven framework of vn.py framework.
 """
 
-from collections import defaultdict
+from collections import defaultdict, deque
 from queue import Empty, Queue
-from threading import Thread
+from threading import Thread, Event as Signal, Lock, current_thread
 from time import sleep
-from typing import Any, Callable, List
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from .stats import EventStats, get_handler_name
 
 EVENT_TIMER = "eTimer"
+EVENT_STATS = "eStats"
+
+# Prefixes of event types (EVENT_ORDER and EVENT_TRADE in vnpy.trader.event)
+# which must never be conflated, since every single update matters.
+UNCONFLATABLE_PREFIXES: Tuple[str, ...] = ("eOrder.", "eTrade.")
 
 
 class Event:
@@ -27,6 +35,179 @@ class Event:
 # Defines handler function to be used in event engine.
 HandlerType = Callable[[Event], None]
 
+# Defines batch handler function which receives a list of events.
+BatchHandlerType = Callable[[List[Event]], None]
+
+
+class BatchQueue:
+    """
+    Event queue used in batch mode of event engine.
+
+    Events are appended to a deque without taking any lock, the consumer
+    is only woken up by a signal when it is waiting on an empty queue,
+    and all pending events are drained in one call of get_batch.
+    """
+
+    def __init__(self):
+        """"""
+        self._deque: deque = deque()
+        self._signal: Signal = Signal()
+
+    def put(self, event: Event) -> None:
+        """
+        Put an event object into queue.
+        """
+        self._deque.append(event)
+
+        if not self._signal.is_set():
+            self._signal.set()
+
+    def get_batch(self, timeout: float, size: int) -> List[Event]:
+        """
+        Get at most size events from queue. Wait for timeout seconds
+        if queue is empty. Return empty list if nothing received.
+        """
+        if not self._deque:
+            self._signal.wait(timeout)
+
+        # Signal must be cleared before draining, so that any event put
+        # after this point will either be drained or set signal again.
+        self._signal.clear()
+
+        events = []
+        popleft = self._deque.popleft
+
+        try:
+            while len(events) < size:
+                events.append(popleft())
+        except IndexError:
+            pass
+
+        return events
+
+    def qsize(self) -> int:
+        """
+        Return number of events pending in queue.
+        """
+        return len(self._deque)
+
+
+def get_vt_symbol(event: Event) -> str:
+    """
+    Default key function of conflated handler. Data without vt_symbol is
+    conflated by event type.
+    """
+    return getattr(event.data, "vt_symbol", event.type)
+
+
+class ConflatedHandler:
+    """
+    Deliver events to handler from a separate thread, keeping only the
+    latest pending event of each key.
+
+    If handler falls behind, an older event still waiting for delivery is
+    replaced by a newer one with the same key (e.g. tick of the same
+    vt_symbol), so the pending events are bounded by the number of keys.
+
+    Time spent by handler is recorded into stats (if set by event engine)
+    from the delivering thread, under the name of handler.
+    """
+
+    def __init__(self, handler: HandlerType, key: Callable[[Event], Any]):
+        """"""
+        self.handler: HandlerType = handler
+        self.key: Callable[[Event], Any] = key
+
+        self.pending: Dict[Any, Event] = {}
+        self.lock: Lock = Lock()
+        self.signal: Signal = Signal()
+
+        self.delivered: int = 0
+        self.dropped: int = 0
+        self.errors: int = 0
+
+        self.stats: Optional[EventStats] = None
+
+        self.active: bool = False
+        self.thread: Optional[Thread] = None
+
+    def __call__(self, event: Event) -> None:
+        """
+        Called by event engine to store event as pending. Event is
+        skipped if key function fails.
+        """
+        try:
+            key = self.key(event)
+        except Exception:
+            self.errors += 1
+            traceback.print_exc()
+            return
+
+        with self.lock:
+            if key in self.pending:
+                self.dropped += 1
+            self.pending[key] = event
+
+        if not self.signal.is_set():
+            self.signal.set()
+
+    def run(self) -> None:
+        """
+        Deliver pending events to handler.
+        """
+        while self.active:
+            if not self.pending:
+                self.signal.wait(1)
+            self.signal.clear()
+
+            with self.lock:
+                events = list(self.pending.values())
+                self.pending.clear()
+
+            # Keep delivering other events if handler fails
+            for event in events:
+                try:
+                    stats = self.stats
+                    if stats:
+                        stats.call(self.handler, event)
+                    else:
+                        self.handler(event)
+                except Exception:
+                    self.errors += 1
+                    traceback.print_exc()
+
+            self.delivered += len(events)
+
+    def start(self) -> None:
+        """"""
+        if self.active:
+            return
+
+        self.active = True
+        self.thread = Thread(target=self.run)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """"""
+        if not self.active:
+            return
+
+        self.active = False
+        self.signal.set()
+
+        # Cannot join when unregistered from inside its own handler
+        if current_thread() is not self.thread:
+            self.thread.join()
+
+    def to_dict(self) -> Dict[str, int]:
+        """"""
+        return {
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "pending": len(self.pending)
+        }
+
 
 class EventEngine:
     """
@@ -35,32 +216,151 @@ class EventEngine:
 
     It also generates timer event by every interval seconds,
     which can be used for timing purpose.
+
+    By default all events go through one queue and one worker thread.
+    Passing lanes creates extra dispatch lanes, each with its own queue
+    and worker thread. A lane is defined by a list of event type prefixes,
+    for example:
+
+        EventEngine(lanes={"trading": [EVENT_ORDER, EVENT_TRADE, EVENT_POSITION]})
+
+    keeps order/trade/position events from waiting behind a burst of ticks.
+    Every event type is routed to exactly one lane (longest prefix wins,
+    unmatched types use the default lane), so FIFO ordering within one
+    type is kept. Handlers registered for types in different lanes may be
+    called from different threads.
+
+    If batch_size is larger than 0, the engine runs in batch mode: every
+    worker drains up to batch_size pending events per wakeup from a
+    BatchQueue instead of getting events one by one from a Queue.
+
+    Latency and handler time instrumentation can be switched on with
+    enable_stats, see get_stats for the data collected.
+
+    Slow consumers of snapshot data like ticks can subscribe with
+    register_conflated to receive only the latest event of each key.
     """
 
-    def __init__(self, interval: int = 1):
+    def __init__(
+        self,
+        interval: int = 1,
+        lanes: Dict[str, Sequence[str]] = None,
+        batch_size: int = 0
+    ):
         """
         Timer event is generated every 1 second by default, if
         interval not specified.
         """
         self._interval: int = interval
-        self._queue: Queue = Queue()
+        self._batch_size: int = batch_size
+        self._queue: Union[Queue, BatchQueue] = self._new_queue()
         self._active: bool = False
-        self._thread: Thread = Thread(target=self._run)
+        self._thread: Thread = self._new_worker(self._queue)
         self._timer: Thread = Thread(target=self._run_timer)
         self._handlers: defaultdict = defaultdict(list)
         self._general_handlers: List = []
+        self._batch_handlers: defaultdict = defaultdict(list)
+
+        self._conflated: Dict[Tuple[str, HandlerType], ConflatedHandler] = {}
+
+        self._stats: Optional[EventStats] = None
+        self._stats_interval: int = 0
+        self._stats_count: int = 0
 
-    def _run(self) -> None:
+        self._lanes: Dict[str, Union[Queue, BatchQueue]] = {}
+        self._lane_threads: List[Thread] = []
+        self._lane_prefixes: List[Tuple[str, Union[Queue, BatchQueue]]] = []
+
+        if lanes:
+            for name, prefixes in lanes.items():
+                self.add_lane(name, prefixes)
+
+    def add_lane(self, name: str, prefixes: Sequence[str]) -> None:
+        """
+        Add a dispatch lane for event types starting with any of prefixes.
+        Lanes can only be added before the engine is started.
+        """
+        if self._active:
+            raise RuntimeError("Cannot add lane after event engine started")
+
+        if name in self._lanes:
+            raise ValueError(f"Lane already exists: {name}")
+
+        queue = self._new_queue()
+        self._lanes[name] = queue
+        self._lane_threads.append(self._new_worker(queue, name))
+
+        for prefix in prefixes:
+            self._lane_prefixes.append((prefix, queue))
+
+        # Longer prefix is matched first
+        self._lane_prefixes.sort(key=lambda x: len(x[0]), reverse=True)
+
+    def _new_queue(self) -> Union[Queue, BatchQueue]:
+        """
+        Create event queue according to dispatch mode.
+        """
+        if self._batch_size > 0:
+            return BatchQueue()
+        else:
+            return Queue()
+
+    def _new_worker(self, queue: Union[Queue, BatchQueue], name: str = "") -> Thread:
+        """
+        Create worker thread processing events from queue.
+        """
+        if self._batch_size > 0:
+            target = self._run_batch
+        else:
+            target = self._run
+
+        if name:
+            return Thread(target=target, args=(queue,), name=f"EventEngine-{name}")
+        else:
+            return Thread(target=target, args=(queue,))
+
+    def _route(self, type: str) -> Union[Queue, BatchQueue]:
+        """
+        Find the queue of lane which event type belongs to.
+
+        Prefixes are scanned on every call instead of caching result by
+        event type, since types like eOrder.<vt_orderid> are unbounded.
+        """
+        for prefix, lane_queue in self._lane_prefixes:
+            if type.startswith(prefix):
+                return lane_queue
+
+        return self._queue
+
+    def _run(self, queue: Queue) -> None:
         """
         Get event from queue and then process it.
         """
         while self._active:
             try:
-                event = self._queue.get(block=True, timeout=1)
+                event = queue.get(block=True, timeout=1)
                 self._process(event)
+
+                if self._batch_handlers:
+                    self._process_batch([event])
             except Empty:
                 pass
 
+    def _run_batch(self, queue: BatchQueue) -> None:
+        """
+        Drain pending events from queue and then process them.
+        """
+        while self._active:
+            events = queue.get_batch(1, self._batch_size)
+            if not events:
+                continue
+
+            for event in events:
+                self._process(event)
+
+            if self._batch_handlers:
+                self._process_batch(events)
+
     def _process(self, event: Event) -> None:
         """
         First ditribute event to those handlers registered listening
@@ -69,11 +369,58 @@ class EventEngine:
         Then distrubute event to those general handlers which listens
         to all types.
         """
-        if event.type in self._handlers:
-            [handler(event) for handler in self._handlers[event.type]]
+        if self._stats:
+            self._process_with_stats(event)
+            return
+
+        handlers = self._handlers.get(event.type, None)
+        if handlers:
+            for handler in handlers:
+                handler(event)
+
+        if self._general_handlers:
+            for handler in self._general_handlers:
+                handler(event)
+
+    def _process_with_stats(self, event: Event) -> None:
+        """
+        Same as _process, but queue latency and time spent by every
+        handler are recorded.
+        """
+        stats = self._stats
+        stats.on_dispatch(event)
+
+        handlers = self._handlers.get(event.type, None)
+        if handlers:
+            for handler in handlers:
+                # Conflated handler records time of delivery itself
+                if isinstance(handler, ConflatedHandler):
+                    handler(event)
+                else:
+                    stats.call(handler, event)
 
         if self._general_handlers:
-            [handler(event) for handler in self._general_handlers]
+            for handler in self._general_handlers:
+                stats.call(handler, event)
+
+    def _process_batch(self, events: List[Event]) -> None:
+        """
+        Group events by type (keeping FIFO order) and distribute each
+        group to those batch handlers registered listening to this type.
+        """
+        groups = defaultdict(list)
+        for event in events:
+            if event.type in self._batch_handlers:
+                groups[event.type].append(event)
+
+        stats = self._stats
+
+        for type, group in groups.items():
+            for handler in self._batch_handlers[type]:
+                if stats:
+                    stats.call(handler, group)
+                else:
+                    handler(group)
 
     def _run_timer(self) -> None:
         """
@@ -84,6 +431,13 @@ class EventEngine:
             event = Event(EVENT_TIMER)
             self.put(event)
 
+            if self._stats and self._stats_interval:
+                self._stats_count += 1
+
+                if self._stats_count >= self._stats_interval:
+                    self._stats_count = 0
+                    self.put(Event(EVENT_STATS, self.get_stats()))
+
     def start(self) -> None:
         """
         Start event engine to process events and generate timer events.
@@ -92,6 +446,12 @@ class EventEngine:
         self._thread.start()
         self._timer.start()
 
+        for thread in self._lane_threads:
+            thread.start()
+
+        for conflated in list(self._conflated.values()):
+            conflated.start()
+
     def stop(self) -> None:
         """
         Stop event engine.
@@ -100,11 +460,23 @@ class EventEngine:
         self._timer.join()
         self._thread.join()
 
+        for thread in self._lane_threads:
+            thread.join()
+
+        for conflated in list(self._conflated.values()):
+            conflated.stop()
+
     def put(self, event: Event) -> None:
         """
         Put an event object into event queue.
         """
-        self._queue.put(event)
+        if self._stats:
+            self._stats.on_put(event)
+
+        if self._lane_prefixes:
+            self._route(event.type).put(event)
+        else:
+            self._queue.put(event)
 
     def register(self, type: str, handler: HandlerType) -> None:
         """
@@ -127,6 +499,67 @@ class EventEngine:
         if not handler_list:
             self._handlers.pop(type)
 
+    def register_batch(self, type: str, handler: BatchHandlerType) -> None:
+        """
+        Register a new batch handler function for a specific event type.
+        The handler receives all events of this type drained in one wakeup
+        (a list with single event if the engine is not in batch mode),
+        after ordinary handlers have processed them.
+        """
+        handler_list = self._batch_handlers[type]
+        if handler not in handler_list:
+            handler_list.append(handler)
+
+    def unregister_batch(self, type: str, handler: BatchHandlerType) -> None:
+        """
+        Unregister an existing batch handler function from event engine.
+        """
+        handler_list = self._batch_handlers[type]
+
+        if handler in handler_list:
+            handler_list.remove(handler)
+
+        if not handler_list:
+            self._batch_handlers.pop(type)
+
+    def register_conflated(
+        self,
+        type: str,
+        handler: HandlerType,
+        key: Callable[[Event], Any] = get_vt_symbol
+    ) -> None:
+        """
+        Register a handler function for a specific event type, which is
+        called from its own thread and only receives the latest event of
+        each key (vt_symbol of event data by default) when falling behind.
+
+        Order and trade events cannot be conflated.
+        """
+        if type.startswith(UNCONFLATABLE_PREFIXES):
+            raise ValueError(f"Event type cannot be conflated: {type}")
+
+        if (type, handler) in self._conflated:
+            return
+
+        conflated = ConflatedHandler(handler, key)
+        conflated.stats = self._stats
+        self._conflated[(type, handler)] = conflated
+        self.register(type, conflated)
+
+        if self._active:
+            conflated.start()
+
+    def unregister_conflated(self, type: str, handler: HandlerType) -> None:
+        """
+        Unregister an existing conflated handler function.
+        """
+        conflated = self._conflated.pop((type, handler), None)
+        if not conflated:
+            return
+
+        self.unregister(type, conflated)
+        conflated.stop()
+
     def register_general(self, handler: HandlerType) -> None:
         """
         Register a new handler function for all event types. Every
@@ -141,3 +574,60 @@ class EventEngine:
         """
         if handler in self._general_handlers:
             self._general_handlers.remove(handler)
+
+    def enable_stats(self, interval: int = 0) -> None:
+        """
+        Start recording latency and handler time statistics.
+
+        If interval is larger than 0, an EVENT_STATS event containing
+        the result of get_stats is generated every interval timer events.
+        """
+        if not self._stats:
+            self._stats = EventStats()
+
+        for conflated in list(self._conflated.values()):
+            conflated.stats = self._stats
+
+        self._stats_interval = interval
+        self._stats_count = 0
+
+    def disable_stats(self) -> None:
+        """
+        Stop recording statistics and drop those already recorded.
+        """
+        self._stats = None
+
+        for conflated in list(self._conflated.values()):
+            conflated.stats = None
+
+    def get_stats(self) -> dict:
+        """
+        Get a snapshot of statistics, which contains:
+
+        * queues: number of events pending in each lane
+        * types: pending depth, count and mean/p50/p99/max queue latency
+          (in seconds) of each event type
+        * handlers: call count, total and max time (in seconds) spent by
+          each handler
+        * conflated: delivered, dropped and pending count of each
+          conflated handler
+
+        Only queues and conflated are available if statistics is not enabled.
+        """
+        queues = {"default": self._queue.qsize()}
+        for name, queue in self._lanes.items():
+            queues[name] = queue.qsize()
+
+        if self._stats:
+            data = self._stats.to_dict()
+        else:
+            data = {"types": {}, "handlers": {}}
+
+        conflated = {}
+        for (type, handler), conflated_handler in list(self._conflated.items()):
+            name = f"{type}:{get_handler_name(handler)}"
+            conflated[name] = conflated_handler.to_dict()
+
+        data["queues"] = queues
+        data["conflated"] = conflated
+        return data
@@ -0,0 +1,181 @@
+"""
+Latency and throughput statistics of event engine.
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+
+# Bucket boundaries (in seconds) of latency histogram, growing by 2^(1/4)
+# from 1 microsecond to about 100 seconds.
+LATENCY_BOUNDARIES: List[float] = [1e-6 * 2 ** (i / 4) for i in range(107)]
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed histogram recording latency values, which provides
+    approximate percentiles (within 19% error) at constant cost.
+    """
+
+    def __init__(self):
+        """"""
+        self.buckets: List[int] = [0] * (len(LATENCY_BOUNDARIES) + 1)
+        self.count: int = 0
+        self.total: float = 0
+        self.max: float = 0
+
+    def add(self, value: float) -> None:
+        """
+        Record a new latency value.
+        """
+        self.buckets[bisect_right(LATENCY_BOUNDARIES, value)] += 1
+        self.count += 1
+        self.total += value
+
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> float:
+        """
+        Return upper bound of bucket which contains the percentile.
+        """
+        if not self.count:
+            return 0
+
+        target = self.count * percent / 100
+        accumulated = 0
+
+        for ix, n in enumerate(self.buckets):
+            accumulated += n
+            if accumulated >= target:
+                if ix < len(LATENCY_BOUNDARIES):
+                    return min(LATENCY_BOUNDARIES[ix], self.max)
+                else:
+                    return self.max
+
+        return self.max
+
+    def to_dict(self) -> Dict[str, float]:
+        """"""
+        if self.count:
+            mean = self.total / self.count
+        else:
+            mean = 0
+
+        return {
+            "count": self.count,
+            "mean": mean,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class HandlerStats:
+    """
+    Call count and time spent of a handler function.
+    """
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        """"""
+        self.count: int = 0
+        self.total: float = 0
+        self.max: float = 0
+
+    def add(self, cost: float) -> None:
+        """"""
+        self.count += 1
+        self.total += cost
+
+        if cost > self.max:
+            self.max = cost
+
+    def to_dict(self) -> Dict[str, float]:
+        """"""
+        return {"count": self.count, "total": self.total, "max": self.max}
+
+
+def get_handler_name(handler: Callable) -> str:
+    """
+    Get readable name of a handler, e.g. "CtaEngine.process_tick_event".
+    """
+    name = getattr(handler, "__qualname__", None)
+    if not name:
+        name = repr(handler)
+    return name
+
+
+class EventStats:
+    """
+    Statistics collected by event engine when instrumentation is enabled:
+
+    * number of events of each type pending in queue
+    * enqueue-to-dispatch latency histogram of each type
+    * call count and cumulative time of each handler
+
+    Counters are updated without locking, so values may be slightly off
+    when several dispatch lanes are running.
+    """
+
+    def __init__(self):
+        """"""
+        self.depths: Dict[str, int] = defaultdict(int)
+        self.latencies: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.handlers: Dict[Callable, HandlerStats] = defaultdict(HandlerStats)
+
+    def on_put(self, event: Any) -> None:
+        """
+        Mark enqueue time of event.
+        """
+        event.put_time = perf_counter()
+        self.depths[event.type] += 1
+
+    def on_dispatch(self, event: Any) -> None:
+        """
+        Record queue latency of event when it is taken out from queue.
+        """
+        put_time = getattr(event, "put_time", None)
+        if put_time is None:
+            return
+
+        if self.depths[event.type] > 0:
+            self.depths[event.type] -= 1
+
+        self.latencies[event.type].add(perf_counter() - put_time)
+
+    def call(self, handler: Callable, arg: Any) -> None:
+        """
+        Call handler with arg and record time spent.
+        """
+        start = perf_counter()
+        try:
+            handler(arg)
+        finally:
+            self.handlers[handler].add(perf_counter() - start)
+
+    def to_dict(self) -> Dict[str, dict]:
+        """
+        Generate a snapshot of all statistics.
+        """
+        types = {}
+        for type in set(self.depths) | set(self.latencies):
+            histogram = self.latencies.get(type, None) or LatencyHistogram()
+            data = histogram.to_dict()
+            data["depth"] = self.depths.get(type, 0)
+            types[type] = data
+
+        handlers = {}
+        for handler, stats in list(self.handlers.items()):
+            name = get_handler_name(handler)
+
+            # Different handlers may share the same name
+            if name in handlers:
+                name = f"{name}[{id(handler):x}]"
+
+            handlers[name] = stats.to_dict()
+
+        return {"types": types, "handlers": handlers}
@@ -9,6 +9,7 @@ from vnpy.trader.setting import SETTINGS
 if TYPE_CHECKING:
     from vnpy.trader.constant import Interval, Exchange  # noqa
     from vnpy.trader.object import BarData, TickData  # noqa
+    from vnpy.trader.utility import BarArrays  # noqa
 
 
 DB_TZ = timezone(SETTINGS["database.timezone"])
@@ -19,6 +20,7 @@ class Driver(Enum):
     MYSQL = "mysql"
     POSTGRESQL = "postgresql"
     MONGODB = "mongodb"
+    NUMPY = "numpy"
 
 
 class BaseDatabaseManager(ABC):
@@ -35,6 +37,29 @@ class BaseDatabaseManager(ABC):
     ) -> Sequence["BarData"]:
         pass
 
+    def load_bar_arrays(
+        self,
+        symbol: str,
+        exchange: "Exchange",
+        interval: "Interval",
+        start: datetime,
+        end: datetime,
+        collection_name: str = None
+    ) -> "BarArrays":
+        """
+        Load bar data as numpy arrays. Databases storing data in columns
+        should override this to skip creating BarData objects.
+        """
+        from vnpy.trader.utility import BarArrays
+
+        if collection_name is None:
+            bars = self.load_bar_data(symbol, exchange, interval, start, end)
+        else:
+            bars = self.load_bar_data(
+                symbol, exchange, interval, start, end, collection_name
+            )
+        return BarArrays.from_bars(bars, symbol, exchange, interval)
+
     @abstractmethod
     def load_tick_data(
         self,
@@ -54,6 +79,22 @@ class BaseDatabaseManager(ABC):
     ):
         pass
 
+    def save_bar_arrays(
+        self,
+        arrays: "BarArrays",
+        collection_name: str = None
+    ):
+        """
+        Save bar data stored in arrays. Databases storing data in columns
+        should override this to skip creating BarData objects.
+        """
+        bars = list(arrays.iter_bars())
+
+        if collection_name is None:
+            self.save_bar_data(bars)
+        else:
+            self.save_bar_data(bars, collection_name)
+
     @abstractmethod
     def save_tick_data(
         self,
@@ -0,0 +1,596 @@
+"""
+Columnar database stored as local numpy files.
+
+Data is partitioned by symbol, exchange, interval and day, every
+partition is saved as one .npy file of structured array:
+
+    {root}/[collection_name/]bar/{exchange}/{symbol}/{interval}/{YYYYMMDD}.npy
+    {root}/[collection_name/]tick/{exchange}/{symbol}/{YYYYMMDD}.npy
+
+Every method accepts collection_name to work on the partition of the
+collection instead of the default one.
+
+Rows saved after the last datetime of an existing partition (e.g. ticks
+recorded in real time) are appended as raw records into a chunk file of
+the day ({YYYYMMDD}.chunk) instead of rewriting the whole partition. Chunk
+is merged with the partition when loaded, and compacted into it when data
+of a later day is saved or when an out-of-order save rewrites the day.
+
+Datetime is saved as wall clock time of database timezone like SQL
+databases. Loading a range only reads partitions of days within the range,
+and bar data can be loaded as arrays directly without creating any
+BarData object.
+"""
+
+import os
+import shutil
+from datetime import datetime, tzinfo
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from vnpy.trader.constant import Exchange, Interval
+from vnpy.trader.object import BarData, TickData
+from vnpy.trader.utility import BarArrays, get_file_path
+
+from .database import BaseDatabaseManager, Driver, DB_TZ
+
+
+BAR_FIELDS: List[str] = BarArrays.fields
+
+TICK_FIELDS: List[str] = [
+    "volume",
+    "open_interest",
+    "last_price",
+    "last_volume",
+    "limit_up",
+    "limit_down",
+    "open_price",
+    "high_price",
+    "low_price",
+    "pre_close",
+] + [
+    f"{side}_{name}_{level}"
+    for side in ("bid", "ask")
+    for name in ("price", "volume")
+    for level in range(1, 6)
+]
+
+BAR_DTYPE = np.dtype(
+    [("datetime", "datetime64[us]")]
+    + [(name, "f8") for name in BAR_FIELDS]
+)
+
+TICK_DTYPE = np.dtype(
+    [("datetime", "datetime64[us]"), ("name", "U32")]
+    + [(name, "f8") for name in TICK_FIELDS]
+)
+
+
+def init(_: Driver, settings: dict):
+    root = get_file_path(settings["database"])
+    root.mkdir(parents=True, exist_ok=True)
+    return NumpyManager(root)
+
+
+def to_db_datetime(dt: datetime) -> np.datetime64:
+    """
+    Convert datetime into wall clock time of database timezone.
+    """
+    if dt.tzinfo:
+        dt = dt.astimezone(DB_TZ).replace(tzinfo=None)
+    return np.datetime64(dt, "us")
+
+
+def to_db_datetimes(dts: np.ndarray, tz: tzinfo = None) -> np.ndarray:
+    """
+    Convert wall clock time array of timezone into database timezone.
+    """
+    if not tz or getattr(tz, "zone", None) == DB_TZ.zone:
+        return dts
+
+    index = pd.DatetimeIndex(dts).tz_localize(getattr(tz, "zone", tz))
+    return index.tz_convert(DB_TZ.zone).tz_localize(None).to_numpy("datetime64[us]")
+
+
+def get_partition_name(dt: np.datetime64) -> str:
+    """
+    Get partition file name of the day, e.g. "20200106.npy".
+    """
+    return str(dt.astype("datetime64[D]")).replace("-", "") + ".npy"
+
+
+def get_chunk_path(path: Path) -> Path:
+    """
+    Get path of append-only chunk file of partition.
+    """
+    return path.with_suffix(".chunk")
+
+
+def count_rows(path: Path) -> int:
+    """
+    Read number of rows from header of .npy file without loading it.
+    """
+    with open(path, mode="rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, _ = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, _ = np.lib.format.read_array_header_2_0(f)
+    return shape[0]
+
+
+def count_chunk_rows(path: Path, dtype: np.dtype) -> int:
+    """
+    Get number of complete records in chunk file, 0 if not exists.
+    """
+    if not path.exists():
+        return 0
+    return path.stat().st_size // dtype.itemsize
+
+
+def load_partition(path: Path, dtype: np.dtype) -> np.ndarray:
+    """
+    Load partition file merged with its chunk file.
+    """
+    data = np.load(path)
+
+    chunk_path = get_chunk_path(path)
+    count = count_chunk_rows(chunk_path, dtype)
+    if not count:
+        return data
+
+    chunk = np.fromfile(chunk_path, dtype=dtype, count=count)
+
+    # Skip rows already compacted into partition, in case the chunk was
+    # not removed after compaction.
+    if len(data):
+        ix = np.searchsorted(chunk["datetime"], data["datetime"][-1], side="right")
+        chunk = chunk[ix:]
+
+    return np.concatenate([data, chunk])
+
+
+def get_last_datetime(path: Path, dtype: np.dtype) -> Optional[np.datetime64]:
+    """
+    Get the last datetime of partition (with its chunk) without loading
+    all of it.
+    """
+    chunk_path = get_chunk_path(path)
+    count = count_chunk_rows(chunk_path, dtype)
+    if count:
+        with open(chunk_path, mode="rb") as f:
+            f.seek((count - 1) * dtype.itemsize)
+            record = np.frombuffer(f.read(dtype.itemsize), dtype=dtype)
+        return record["datetime"][0]
+
+    data = np.load(path, mmap_mode="r")
+    if not len(data):
+        return None
+    return data["datetime"][-1]
+
+
+class NumpyManager(BaseDatabaseManager):
+
+    def __init__(self, root: Path):
+        """"""
+        self.root: Path = Path(root)
+        self.lock: Lock = Lock()
+
+    def get_bar_folder(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        collection_name: str = None
+    ) -> Path:
+        """"""
+        return self.get_root(collection_name).joinpath(
+            "bar", exchange.value, symbol, interval.value
+        )
+
+    def get_tick_folder(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        collection_name: str = None
+    ) -> Path:
+        """"""
+        return self.get_root(collection_name).joinpath(
+            "tick", exchange.value, symbol
+        )
+
+    def get_root(self, collection_name: str = None) -> Path:
+        """"""
+        if collection_name:
+            return self.root.joinpath(collection_name)
+        return self.root
+
+    @staticmethod
+    def list_partitions(folder: Path) -> List[str]:
+        """
+        Get file names of all partitions in time order.
+        """
+        if not folder.exists():
+            return []
+
+        return sorted(f for f in os.listdir(folder) if f.endswith(".npy"))
+
+    @staticmethod
+    def count_partition_rows(path: Path, dtype: np.dtype) -> int:
+        """
+        Get number of rows in partition file and its chunk file.
+        """
+        return count_rows(path) + count_chunk_rows(get_chunk_path(path), dtype)
+
+    def load_partitions(
+        self,
+        folder: Path,
+        start: datetime,
+        end: datetime,
+        dtype: np.dtype
+    ) -> np.ndarray:
+        """
+        Load data within [start, end] from partitions of folder.
+        """
+        start = to_db_datetime(start)
+        end = to_db_datetime(end)
+
+        first = get_partition_name(start)
+        last = get_partition_name(end)
+
+        buf = [
+            load_partition(folder.joinpath(name), dtype)
+            for name in self.list_partitions(folder)
+            if first <= name <= last
+        ]
+        if not buf:
+            return np.empty(0, dtype=dtype)
+
+        data = np.concatenate(buf)
+
+        # Trim the first and last day
+        dt = data["datetime"]
+        left = np.searchsorted(dt, start, side="left")
+        right = np.searchsorted(dt, end, side="right")
+        return data[left:right]
+
+    def save_partitions(self, folder: Path, data: np.ndarray) -> None:
+        """
+        Merge data into partitions of folder. Data saved later overrides
+        existing one with the same datetime.
+
+        Data of a day sorted after the last datetime of existing partition
+        is appended into chunk file, otherwise the partition is rewritten.
+        """
+        folder.mkdir(parents=True, exist_ok=True)
+
+        days = data["datetime"].astype("datetime64[D]")
+        unique_days = np.unique(days)
+
+        for day in unique_days:
+            path = folder.joinpath(get_partition_name(day))
+            partition = data[days == day]
+
+            if path.exists() and self.is_appendable(path, partition):
+                self.append_partition(path, partition)
+            else:
+                self.write_partition(path, partition)
+
+        # Chunks of days before the last one saved are no longer appended
+        last_day = Path(get_partition_name(unique_days[-1])).stem
+        for name in os.listdir(folder):
+            path = folder.joinpath(name)
+            if path.suffix == ".chunk" and path.stem < last_day:
+                self.write_partition(
+                    path.with_suffix(".npy"), np.empty(0, dtype=data.dtype)
+                )
+
+    @staticmethod
+    def is_appendable(path: Path, partition: np.ndarray) -> bool:
+        """
+        Check if data of partition is in strictly ascending order and all
+        after the last datetime of existing partition.
+        """
+        dt = partition["datetime"]
+        if len(dt) > 1 and not (dt[1:] > dt[:-1]).all():
+            return False
+
+        last = get_last_datetime(path, partition.dtype)
+        return last is None or dt[0] > last
+
+    @staticmethod
+    def append_partition(path: Path, partition: np.ndarray) -> None:
+        """
+        Append data as raw records into chunk file of partition.
+        """
+        chunk_path = get_chunk_path(path)
+
+        with open(chunk_path, mode="ab") as f:
+            # Drop incomplete record left by interrupted append
+            size = f.tell()
+            remainder = size % partition.dtype.itemsize
+            if remainder:
+                f.truncate(size - remainder)
+                f.seek(size - remainder)
+
+            f.write(partition.tobytes())
+
+    @staticmethod
+    def write_partition(path: Path, partition: np.ndarray) -> None:
+        """
+        Merge data with existing partition and its chunk, and rewrite the
+        whole partition file.
+        """
+        if path.exists():
+            partition = np.concatenate([load_partition(path, partition.dtype), partition])
+
+        # Keep the last saved one of duplicated datetime, np.unique
+        # returns index of first occurrence in reversed order.
+        partition = partition[::-1]
+        _, ix = np.unique(partition["datetime"], return_index=True)
+        partition = partition[ix]
+
+        # Write into temp file and then replace, so that readers never
+        # see partially written partition.
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, mode="wb") as f:
+            np.save(f, partition)
+        os.replace(temp_path, path)
+
+        chunk_path = get_chunk_path(path)
+        if chunk_path.exists():
+            chunk_path.unlink()
+
+    def load_bar_arrays(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime,
+        collection_name: str = None
+    ) -> BarArrays:
+        """
+        Load bar data as numpy arrays.
+        """
+        folder = self.get_bar_folder(symbol, exchange, interval, collection_name)
+        data = self.load_partitions(folder, start, end, BAR_DTYPE)
+
+        columns = {name: np.ascontiguousarray(data[name]) for name in BAR_FIELDS}
+
+        return BarArrays(
+            symbol,
+            exchange,
+            interval,
+            datetime=np.ascontiguousarray(data["datetime"]),
+            tzinfo=DB_TZ,
+            gateway_name="DB",
+            **columns
+        )
+
+    def load_bar_data(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime,
+        collection_name: str = None
+    ) -> Sequence[BarData]:
+        arrays = self.load_bar_arrays(
+            symbol, exchange, interval, start, end, collection_name
+        )
+        return list(arrays.iter_bars())
+
+    def load_tick_data(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        start: datetime,
+        end: datetime,
+        collection_name: str = None
+    ) -> Sequence[TickData]:
+        folder = self.get_tick_folder(symbol, exchange, collection_name)
+        data = self.load_partitions(folder, start, end, TICK_DTYPE)
+        return self.to_ticks(symbol, exchange, data)
+
+    def save_bar_data(self, datas: Sequence[BarData], collection_name: str = None):
+        groups: Dict[tuple, List[BarData]] = {}
+        for bar in datas:
+            key = (bar.symbol, bar.exchange, bar.interval)
+            groups.setdefault(key, []).append(bar)
+
+        with self.lock:
+            for (symbol, exchange, interval), bars in groups.items():
+                data = np.empty(len(bars), dtype=BAR_DTYPE)
+                data["datetime"] = [to_db_datetime(bar.datetime) for bar in bars]
+                for name in BAR_FIELDS:
+                    data[name] = [getattr(bar, name) for bar in bars]
+
+                folder = self.get_bar_folder(symbol, exchange, interval, collection_name)
+                self.save_partitions(folder, data)
+
+    def save_bar_arrays(self, arrays: BarArrays, collection_name: str = None):
+        """
+        Save bar data stored in arrays without creating BarData objects.
+        """
+        if not len(arrays):
+            return
+
+        data = np.empty(len(arrays), dtype=BAR_DTYPE)
+        data["datetime"] = to_db_datetimes(arrays.datetime, arrays.tzinfo)
+        for name in BAR_FIELDS:
+            data[name] = getattr(arrays, name)
+
+        folder = self.get_bar_folder(
+            arrays.symbol, arrays.exchange, arrays.interval, collection_name
+        )
+
+        with self.lock:
+            self.save_partitions(folder, data)
+
+    def save_tick_data(self, datas: Sequence[TickData], collection_name: str = None):
+        groups: Dict[tuple, List[TickData]] = {}
+        for tick in datas:
+            key = (tick.symbol, tick.exchange)
+            groups.setdefault(key, []).append(tick)
+
+        with self.lock:
+            for (symbol, exchange), ticks in groups.items():
+                data = np.empty(len(ticks), dtype=TICK_DTYPE)
+                data["datetime"] = [to_db_datetime(tick.datetime) for tick in ticks]
+                data["name"] = [tick.name for tick in ticks]
+                for name in TICK_FIELDS:
+                    data[name] = [getattr(tick, name) for tick in ticks]
+
+                folder = self.get_tick_folder(symbol, exchange, collection_name)
+                self.save_partitions(folder, data)
+
+    def get_newest_bar_data(
+        self,
+        symbol: str,
+        exchange: "Exchange",
+        interval: "Interval",
+        collection_name: str = None
+    ) -> Optional["BarData"]:
+        folder = self.get_bar_folder(symbol, exchange, interval, collection_name)
+        partitions = self.list_partitions(folder)
+        if not partitions:
+            return None
+
+        data = load_partition(folder.joinpath(partitions[-1]), BAR_DTYPE)
+        return self.to_bars(symbol, exchange, interval, data[-1:])[0]
+
+    def get_oldest_bar_data(
+        self,
+        symbol: str,
+        exchange: "Exchange",
+        interval: "Interval",
+        collection_name: str = None
+    ) -> Optional["BarData"]:
+        folder = self.get_bar_folder(symbol, exchange, interval, collection_name)
+        partitions = self.list_partitions(folder)
+        if not partitions:
+            return None
+
+        data = np.load(folder.joinpath(partitions[0]))
+        return self.to_bars(symbol, exchange, interval, data[:1])[0]
+
+    def get_newest_tick_data(
+        self,
+        symbol: str,
+        exchange: "Exchange",
+        collection_name: str = None
+    ) -> Optional["TickData"]:
+        folder = self.get_tick_folder(symbol, exchange, collection_name)
+        partitions = self.list_partitions(folder)
+        if not partitions:
+            return None
+
+        data = load_partition(folder.joinpath(partitions[-1]), TICK_DTYPE)
+        return self.to_ticks(symbol, exchange, data[-1:])[0]
+
+    def get_bar_data_statistics(self, collection_name: str = None) -> List[Dict]:
+        """"""
+        result = []
+
+        bar_root = self.get_root(collection_name).joinpath("bar")
+        if not bar_root.exists():
+            return result
+
+        for exchange_folder in sorted(bar_root.iterdir()):
+            for symbol_folder in sorted(exchange_folder.iterdir()):
+                for interval_folder in sorted(symbol_folder.iterdir()):
+                    count = sum(
+                        self.count_partition_rows(interval_folder.joinpath(name), BAR_DTYPE)
+                        for name in self.list_partitions(interval_folder)
+                    )
+                    if not count:
+                        continue
+
+                    result.append({
+                        "symbol": symbol_folder.name,
+                        "exchange": exchange_folder.name,
+                        "interval": interval_folder.name,
+                        "count": count
+                    })
+
+        return result
+
+    def delete_bar_data(
+        self,
+        symbol: str,
+        exchange: "Exchange",
+        interval: "Interval",
+        collection_name: str = None
+    ) -> int:
+        """
+        Delete all bar data with given symbol + exchange + interval.
+        """
+        folder = self.get_bar_folder(symbol, exchange, interval, collection_name)
+
+        with self.lock:
+            count = sum(
+                self.count_partition_rows(folder.joinpath(name), BAR_DTYPE)
+                for name in self.list_partitions(folder)
+            )
+            if folder.exists():
+                shutil.rmtree(folder)
+
+        return count
+
+    def clean(self, symbol: str, collection_name: str = None):
+        with self.lock:
+            for exchange_folder in self.get_root(collection_name).glob("*/*"):
+                folder = exchange_folder.joinpath(symbol)
+                if exchange_folder.parent.name in ("bar", "tick") and folder.exists():
+                    shutil.rmtree(folder)
+
+    @staticmethod
+    def to_bars(
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        data: np.ndarray
+    ) -> List[BarData]:
+        """
+        Generate BarData objects from structured array.
+        """
+        columns = {name: data[name] for name in BAR_FIELDS}
+        arrays = BarArrays(
+            symbol,
+            exchange,
+            interval,
+            datetime=data["datetime"],
+            tzinfo=DB_TZ,
+            gateway_name="DB",
+            **columns
+        )
+        return list(arrays.iter_bars())
+
+    @staticmethod
+    def to_ticks(symbol: str, exchange: Exchange, data: np.ndarray) -> List[TickData]:
+        """
+        Generate TickData objects from structured array.
+        """
+        columns = [data[name].tolist() for name in TICK_FIELDS]
+
+        ticks = []
+        for dt, name, *values in zip(
+            data["datetime"].tolist(), data["name"].tolist(), *columns
+        ):
+            tick = TickData(
+                symbol=symbol,
+                exchange=exchange,
+                datetime=dt.replace(tzinfo=DB_TZ),
+                name=name,
+                gateway_name="DB",
+                **dict(zip(TICK_FIELDS, values))
+            )
+            ticks.append(tick)
+
+        return ticks
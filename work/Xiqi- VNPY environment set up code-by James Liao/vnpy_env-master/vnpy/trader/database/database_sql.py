@@ -1,6 +1,9 @@
 """"""
+import sqlite3
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from typing import List, Dict, Optional, Sequence, Type
+from io import StringIO
+from typing import Any, List, Dict, Optional, Sequence, Type
 
 from peewee import (
     AutoField,
@@ -12,6 +15,7 @@ from peewee import (
     MySQLDatabase,
     PostgresqlDatabase,
     SqliteDatabase,
+    Field,
     chunked,
     fn
 )
@@ -57,6 +61,188 @@ def init_postgresql(settings: dict):
     return db
 
 
+# Rows written by one INSERT statement in bulk saving
+DEFAULT_CHUNK_SIZE = 1000
+
+# Max number of parameters in one SQLite statement
+if sqlite3.sqlite_version_info >= (3, 32, 0):
+    SQLITE_MAX_VARIABLES = 32766
+else:
+    SQLITE_MAX_VARIABLES = 999
+
+
+@contextmanager
+def sqlite_bulk_mode(db: Database):
+    """
+    Switch SQLite into WAL journal with NORMAL synchronous during bulk
+    import, which avoids syncing to disk on every transaction while still
+    keeping database file consistent. Settings are restored afterwards.
+    """
+    journal_mode = db.execute_sql("PRAGMA journal_mode").fetchone()[0]
+    synchronous = db.execute_sql("PRAGMA synchronous").fetchone()[0]
+
+    db.execute_sql("PRAGMA journal_mode=WAL")
+    db.execute_sql("PRAGMA synchronous=NORMAL")
+    try:
+        yield
+    finally:
+        db.execute_sql(f"PRAGMA synchronous={synchronous}")
+        db.execute_sql(f"PRAGMA journal_mode={journal_mode}")
+
+
+def quote(db: Database, name: str) -> str:
+    """
+    Quote table or column name for database.
+    """
+    return db.quote[0] + name + db.quote[-1]
+
+
+def to_copy_value(value: Any) -> str:
+    """
+    Convert value into PostgreSQL COPY text format.
+    """
+    if value is None:
+        return "\\N"
+    elif isinstance(value, str):
+        return (
+            value.replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+    else:
+        return str(value)
+
+
+def copy_upsert(
+    db: Database,
+    model: Type[Model],
+    fields: List[Field],
+    rows: List[dict],
+    conflict_target: Sequence[Field]
+) -> None:
+    """
+    Upsert rows into PostgreSQL with COPY into a temporary staging table
+    and then merging staging table into model table.
+
+    Should be called within a transaction.
+    """
+    table = quote(db, model._meta.table_name)
+    staging = quote(db, f"{model._meta.table_name}_staging")
+    columns = ", ".join(quote(db, field.column_name) for field in fields)
+    targets = ", ".join(quote(db, field.column_name) for field in conflict_target)
+    updates = ", ".join(
+        f"{quote(db, field.column_name)} = EXCLUDED.{quote(db, field.column_name)}"
+        for field in fields
+    )
+
+    buf = StringIO()
+    for row in rows:
+        values = [to_copy_value(field.db_value(row[field.name])) for field in fields]
+        buf.write("\t".join(values) + "\n")
+    buf.seek(0)
+
+    db.execute_sql(
+        f"CREATE TEMP TABLE IF NOT EXISTS {staging} "
+        f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+    )
+    cursor = db.cursor()
+    cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN", buf)
+    db.execute_sql(
+        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} "
+        f"ON CONFLICT ({targets}) DO UPDATE SET {updates}"
+    )
+    db.execute_sql(f"TRUNCATE {staging}")
+
+
+def bulk_upsert(
+    db: Database,
+    driver: Driver,
+    model: Type[Model],
+    dicts: List[dict],
+    conflict_target: Sequence[Field],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    use_copy: bool = False
+) -> None:
+    """
+    Save rows with multi-row INSERT statements, update if exists.
+
+    * PostgreSQL: INSERT ... ON CONFLICT DO UPDATE, or COPY into staging
+      table with use_copy
+    * MySQL/SQLite: REPLACE INTO, SQLite is switched into bulk mode when
+      saving more than one chunk
+
+    Statements are generated directly instead of with peewee query
+    builder, which costs much more time than database itself.
+    """
+    if not dicts:
+        return
+
+    fields = [
+        field for field in model._meta.sorted_fields
+        if not field.primary_key
+    ]
+    names = [field.name for field in fields]
+
+    # Rows of one statement must have the same columns, and PostgreSQL
+    # can not update the same row twice in one statement, so only the
+    # last row of duplicated keys is kept.
+    keys = [field.name for field in conflict_target]
+    rows = {}
+    for d in dicts:
+        row = {name: d.get(name, None) for name in names}
+        rows[tuple(row[key] for key in keys)] = row
+    rows = list(rows.values())
+
+    if driver is Driver.SQLITE:
+        chunk_size = min(chunk_size, SQLITE_MAX_VARIABLES // len(fields))
+
+    # Journal mode can not be changed within transaction of caller
+    if (
+        driver is Driver.SQLITE
+        and len(rows) > chunk_size
+        and not db.in_transaction()
+    ):
+        bulk_mode = sqlite_bulk_mode(db)
+    else:
+        bulk_mode = nullcontext()
+
+    with bulk_mode, db.atomic():
+        if driver is Driver.POSTGRESQL and use_copy:
+            copy_upsert(db, model, fields, rows, conflict_target)
+            return
+
+        table = quote(db, model._meta.table_name)
+        columns = ", ".join(quote(db, field.column_name) for field in fields)
+
+        if driver is Driver.POSTGRESQL:
+            prefix = f"INSERT INTO {table} ({columns}) VALUES "
+
+            targets = ", ".join(quote(db, field.column_name) for field in conflict_target)
+            updates = ", ".join(
+                f"{quote(db, field.column_name)} = EXCLUDED.{quote(db, field.column_name)}"
+                for field in fields
+            )
+            suffix = f" ON CONFLICT ({targets}) DO UPDATE SET {updates}"
+        elif driver is Driver.SQLITE:
+            prefix = f"INSERT OR REPLACE INTO {table} ({columns}) VALUES "
+            suffix = ""
+        else:
+            prefix = f"REPLACE INTO {table} ({columns}) VALUES "
+            suffix = ""
+
+        placeholder = "(" + ", ".join([db.param] * len(fields)) + ")"
+
+        for c in chunked(rows, chunk_size):
+            params = [
+                field.db_value(row[field.name])
+                for row in c
+                for field in fields
+            ]
+            sql = prefix + ", ".join([placeholder] * len(c)) + suffix
+            db.execute_sql(sql, params)
+
+
 class ModelBase(Model):
 
     def to_dict(self):
@@ -133,27 +319,29 @@ def init_models(db: Database, driver: Driver):
             return bar
 
         @staticmethod
-        def save_all(objs: List["DbBarData"]):
+        def save_all(
+            objs: List["DbBarData"],
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            use_copy: bool = False
+        ):
             """
             save a list of objects, update if exists.
             """
             dicts = [i.to_dict() for i in objs]
-            with db.atomic():
-                if driver is Driver.POSTGRESQL:
-                    for bar in dicts:
-                        DbBarData.insert(bar).on_conflict(
-                            update=bar,
-                            conflict_target=(
-                                DbBarData.symbol,
-                                DbBarData.exchange,
-                                DbBarData.interval,
-                                DbBarData.datetime,
-                            ),
-                        ).execute()
-                else:
-                    for c in chunked(dicts, 50):
-                        DbBarData.insert_many(
-                            c).on_conflict_replace().execute()
+            bulk_upsert(
+                db,
+                driver,
+                DbBarData,
+                dicts,
+                (
+                    DbBarData.symbol,
+                    DbBarData.exchange,
+                    DbBarData.interval,
+                    DbBarData.datetime,
+                ),
+                chunk_size,
+                use_copy
+            )
 
     class DbTickData(ModelBase):
         """
@@ -314,22 +502,25 @@ def init_models(db: Database, driver: Driver):
             return tick
 
         @staticmethod
-        def save_all(objs: List["DbTickData"]):
+        def save_all(
+            objs: List["DbTickData"],
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            use_copy: bool = False
+        ):
             dicts = [i.to_dict() for i in objs]
-            with db.atomic():
-                if driver is Driver.POSTGRESQL:
-                    for tick in dicts:
-                        DbTickData.insert(tick).on_conflict(
-                            update=tick,
-                            conflict_target=(
-                                DbTickData.symbol,
-                                DbTickData.exchange,
-                                DbTickData.datetime,
-                            ),
-                        ).execute()
-                else:
-                    for c in chunked(dicts, 50):
-                        DbTickData.insert_many(c).on_conflict_replace().execute()
+            bulk_upsert(
+                db,
+                driver,
+                DbTickData,
+                dicts,
+                (
+                    DbTickData.symbol,
+                    DbTickData.exchange,
+                    DbTickData.datetime,
+                ),
+                chunk_size,
+                use_copy
+            )
 
     db.connect()
     db.create_tables([DbBarData, DbTickData])
@@ -342,6 +533,10 @@ class SqlManager(BaseDatabaseManager):
         self.class_bar = class_bar
         self.class_tick = class_tick
 
+        # Bulk saving options, use_copy only works with PostgreSQL
+        self.chunk_size: int = DEFAULT_CHUNK_SIZE
+        self.use_copy: bool = False
+
     def load_bar_data(
         self,
         symbol: str,
@@ -383,11 +578,11 @@ class SqlManager(BaseDatabaseManager):
 
     def save_bar_data(self, datas: Sequence[BarData]):
         ds = [self.class_bar.from_bar(i) for i in datas]
-        self.class_bar.save_all(ds)
+        self.class_bar.save_all(ds, self.chunk_size, self.use_copy)
 
     def save_tick_data(self, datas: Sequence[TickData]):
         ds = [self.class_tick.from_tick(i) for i in datas]
-        self.class_tick.save_all(ds)
+        self.class_tick.save_all(ds, self.chunk_size, self.use_copy)
 
     def get_newest_bar_data(
         self, symbol: str, exchange: "Exchange", interval: "Interval"
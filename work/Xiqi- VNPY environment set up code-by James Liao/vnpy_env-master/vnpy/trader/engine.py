@@ -6,6 +6,7 @@ from logging import Logger
 import smtplib
 import os
 from abc import ABC
+from collections import defaultdict
 from datetime import datetime
 from email.message import EmailMessage
 from queue import Empty, Queue
@@ -346,6 +347,14 @@ class OmsEngine(BaseEngine):
 
         self.active_orders: Dict[str, OrderData] = {}
 
+        # Active orders indexed by vt_symbol, gateway name and order
+        # reference (strategy name), so that they can be counted in O(1)
+        self.symbol_active_orders: Dict[str, Dict[str, OrderData]] = defaultdict(dict)
+        self.gateway_active_orders: Dict[str, Dict[str, OrderData]] = defaultdict(dict)
+        self.reference_active_orders: Dict[str, Dict[str, OrderData]] = defaultdict(dict)
+
+        self.order_references: Dict[str, str] = {}  # vt_orderid: reference
+
         self.add_function()
         self.register_event()
 
@@ -364,6 +373,15 @@ class OmsEngine(BaseEngine):
         self.main_engine.get_all_accounts = self.get_all_accounts
         self.main_engine.get_all_contracts = self.get_all_contracts
         self.main_engine.get_all_active_orders = self.get_all_active_orders
+        self.main_engine.get_active_order_count = self.get_active_order_count
+        self.main_engine.get_gateway_active_order_count = self.get_gateway_active_order_count
+        self.main_engine.get_reference_active_order_count = self.get_reference_active_order_count
+
+        # Patch send order functions to record order reference
+        self._send_order = self.main_engine.send_order
+        self._send_orders = self.main_engine.send_orders
+        self.main_engine.send_order = self.send_order
+        self.main_engine.send_orders = self.send_orders
 
     def register_event(self) -> None:
         """"""
@@ -386,10 +404,85 @@ class OmsEngine(BaseEngine):
 
         # If order is active, then update data in dict.
         if order.is_active():
-            self.active_orders[order.vt_orderid] = order
+            self.add_active_order(order)
         # Otherwise, pop inactive order from in dict
         elif order.vt_orderid in self.active_orders:
-            self.active_orders.pop(order.vt_orderid)
+            self.remove_active_order(order)
+
+    def add_active_order(self, order: OrderData) -> None:
+        """
+        Add or update active order in all indexes.
+        """
+        vt_orderid = order.vt_orderid
+
+        self.active_orders[vt_orderid] = order
+        self.symbol_active_orders[order.vt_symbol][vt_orderid] = order
+        self.gateway_active_orders[order.gateway_name][vt_orderid] = order
+
+        reference = self.order_references.get(vt_orderid, "")
+        if reference:
+            self.reference_active_orders[reference][vt_orderid] = order
+
+    def remove_active_order(self, order: OrderData) -> None:
+        """
+        Remove inactive order from all indexes.
+        """
+        vt_orderid = order.vt_orderid
+
+        self.active_orders.pop(vt_orderid)
+        self.remove_index(self.symbol_active_orders, order.vt_symbol, vt_orderid)
+        self.remove_index(self.gateway_active_orders, order.gateway_name, vt_orderid)
+
+        reference = self.order_references.pop(vt_orderid, "")
+        if reference:
+            self.remove_index(self.reference_active_orders, reference, vt_orderid)
+
+    @staticmethod
+    def remove_index(index: Dict[str, Dict[str, OrderData]], key: str, vt_orderid: str) -> None:
+        """"""
+        orders = index.get(key, None)
+        if orders is None:
+            return
+
+        orders.pop(vt_orderid, None)
+        if not orders:
+            index.pop(key)
+
+    def send_order(self, req: OrderRequest, gateway_name: str) -> str:
+        """
+        Send order with main engine and record order reference.
+        """
+        vt_orderid = self._send_order(req, gateway_name)
+
+        if vt_orderid and req.reference:
+            self.update_order_reference(vt_orderid, req.reference)
+
+        return vt_orderid
+
+    def send_orders(self, reqs: Sequence[OrderRequest], gateway_name: str) -> List[str]:
+        """
+        Send orders with main engine and record order references.
+        """
+        vt_orderids = self._send_orders(reqs, gateway_name)
+
+        for req, vt_orderid in zip(reqs, vt_orderids):
+            if vt_orderid and req.reference:
+                self.update_order_reference(vt_orderid, req.reference)
+
+        return vt_orderids
+
+    def update_order_reference(self, vt_orderid: str, reference: str) -> None:
+        """
+        Record reference of order. Order data may be received before
+        send order function returns, so the order is indexed here too.
+        """
+        order = self.active_orders.get(vt_orderid, None)
+
+        if order:
+            self.order_references[vt_orderid] = reference
+            self.reference_active_orders[reference][vt_orderid] = order
+        elif vt_orderid not in self.orders:
+            self.order_references[vt_orderid] = reference
 
     def process_trade_event(self, event: Event) -> None:
         """"""
@@ -492,12 +585,31 @@ class OmsEngine(BaseEngine):
         if not vt_symbol:
             return list(self.active_orders.values())
         else:
-            active_orders = [
-                order
-                for order in self.active_orders.values()
-                if order.vt_symbol == vt_symbol
-            ]
-            return active_orders
+            active_orders = self.symbol_active_orders.get(vt_symbol, {})
+            return list(active_orders.values())
+
+    def get_active_order_count(self, vt_symbol: str = "") -> int:
+        """
+        Get number of active orders by vt_symbol.
+
+        If vt_symbol is empty, return number of all active orders.
+        """
+        if not vt_symbol:
+            return len(self.active_orders)
+        else:
+            return len(self.symbol_active_orders.get(vt_symbol, {}))
+
+    def get_gateway_active_order_count(self, gateway_name: str) -> int:
+        """
+        Get number of active orders by gateway name.
+        """
+        return len(self.gateway_active_orders.get(gateway_name, {}))
+
+    def get_reference_active_order_count(self, reference: str) -> int:
+        """
+        Get number of active orders by order reference (strategy name).
+        """
+        return len(self.reference_active_orders.get(reference, {}))
 
 
 class EmailEngine(BaseEngine):
@@ -0,0 +1,297 @@
+"""
+History bar data service using local database as cache.
+
+Before loading bar data of a range, only the gaps not covered by local
+database are downloaded from gateway (if it provides history data) or
+RQData, and saved into database. Coverage of every symbol/exchange/interval
+is the range between its oldest and newest bar in database, extended by
+ranges already queried from remote in this session (e.g. non-trading
+hours without any bar), so the same empty gap is not queried again.
+
+Missing bars inside the coverage are not detected.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from threading import Lock
+import traceback
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from .constant import Exchange, Interval
+from .database import database_manager
+from .database.database import DB_TZ
+from .object import BarData, HistoryRequest
+from .rqdata import rqdata_client
+from .utility import extract_vt_symbol, generate_vt_symbol
+
+if TYPE_CHECKING:
+    from .engine import MainEngine
+
+
+INTERVAL_DELTA_MAP: Dict[Interval, timedelta] = {
+    Interval.MINUTE: timedelta(minutes=1),
+    Interval.HOUR: timedelta(hours=1),
+    Interval.DAILY: timedelta(days=1),
+}
+
+
+def to_db_time(dt: datetime) -> datetime:
+    """
+    Convert datetime into naive wall clock time of database timezone.
+    """
+    if dt.tzinfo:
+        dt = dt.astimezone(DB_TZ).replace(tzinfo=None)
+    return dt
+
+
+class HistoryService:
+    """
+    Download missing history bar data into database, and load from it.
+    """
+
+    def __init__(self, main_engine: "MainEngine" = None, max_workers: int = 8):
+        """"""
+        self.main_engine: "MainEngine" = main_engine
+        self.max_workers: int = max_workers
+
+        # (symbol, exchange, interval): (start, end) already queried from
+        # remote, in naive database time.
+        self.synced: Dict[Tuple[str, Exchange, Interval], Tuple[datetime, datetime]] = {}
+        self.lock: Lock = Lock()
+
+    def get_coverage(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval
+    ) -> Optional[Tuple[datetime, datetime]]:
+        """
+        Get range of data available locally in naive database time.
+        """
+        oldest_bar = database_manager.get_oldest_bar_data(symbol, exchange, interval)
+        newest_bar = database_manager.get_newest_bar_data(symbol, exchange, interval)
+
+        # Datetime of bar from database is wall clock time of database
+        if oldest_bar and newest_bar:
+            coverage = (
+                oldest_bar.datetime.replace(tzinfo=None),
+                newest_bar.datetime.replace(tzinfo=None)
+            )
+        else:
+            coverage = None
+
+        with self.lock:
+            synced = self.synced.get((symbol, exchange, interval), None)
+
+        if not synced:
+            return coverage
+        elif not coverage:
+            return synced
+        else:
+            return min(coverage[0], synced[0]), max(coverage[1], synced[1])
+
+    def get_gaps(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime
+    ) -> List[Tuple[datetime, datetime]]:
+        """
+        Get ranges not covered by local data for [start, end].
+
+        Gaps are extended to reach the coverage, even beyond [start, end],
+        so that coverage is always a continuous range after downloaded.
+        """
+        start = to_db_time(start)
+        end = to_db_time(end)
+
+        coverage = self.get_coverage(symbol, exchange, interval)
+        if not coverage:
+            return [(start, end)]
+
+        oldest, newest = coverage
+        delta = INTERVAL_DELTA_MAP.get(interval, timedelta(minutes=1))
+
+        gaps = []
+
+        if start < oldest:
+            gaps.append((start, oldest))
+
+        # Newest bar may be updated later, so it is downloaded again
+        if newest + delta <= end:
+            gaps.append((newest, end))
+
+        return gaps
+
+    def query_remote(self, req: HistoryRequest) -> Optional[List[BarData]]:
+        """
+        Query bar data from gateway if available, otherwise from RQData.
+        """
+        vt_symbol = generate_vt_symbol(req.symbol, req.exchange)
+
+        contract = None
+        if self.main_engine:
+            contract = self.main_engine.get_contract(vt_symbol)
+
+        if contract and contract.history_data:
+            return self.main_engine.query_history(req, contract.gateway_name)
+
+        if not rqdata_client.inited:
+            rqdata_client.init()
+
+        return rqdata_client.query_history(req)
+
+    def update(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime = None
+    ) -> int:
+        """
+        Download data of gaps within [start, end] and save into database.
+        Return number of bars downloaded.
+        """
+        if not end:
+            end = datetime.now(DB_TZ)
+
+        count = 0
+
+        for gap_start, gap_end in self.get_gaps(symbol, exchange, interval, start, end):
+            req = HistoryRequest(
+                symbol=symbol,
+                exchange=exchange,
+                interval=interval,
+                start=DB_TZ.localize(gap_start),
+                end=DB_TZ.localize(gap_end)
+            )
+
+            bars = self.query_remote(req)
+            if bars is None:        # data source not available
+                continue
+
+            if bars:
+                database_manager.save_bar_data(bars)
+                count += len(bars)
+
+            # Gaps always reach coverage, so the union is continuous
+            with self.lock:
+                key = (symbol, exchange, interval)
+                synced = self.synced.get(key, (gap_start, gap_end))
+                self.synced[key] = (min(synced[0], gap_start), max(synced[1], gap_end))
+
+        return count
+
+    def update_many(
+        self,
+        reqs: List[HistoryRequest],
+        callback: Callable[[int, int], Optional[bool]] = None
+    ) -> List[int]:
+        """
+        Update data of several requests concurrently, return number of bars
+        downloaded of each request. Callback is called with number of
+        requests finished and total number after every request, requests
+        not started yet are cancelled if it returns False.
+
+        A failed request is logged and counted as 0, without aborting the
+        others.
+        """
+        # Init client once before used by several threads
+        if not rqdata_client.inited:
+            rqdata_client.init()
+
+        counts = [0] * len(reqs)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(
+                    self.update,
+                    req.symbol,
+                    req.exchange,
+                    req.interval,
+                    req.start,
+                    req.end
+                ): ix
+                for ix, req in enumerate(reqs)
+            }
+
+            for finished, future in enumerate(as_completed(futures), 1):
+                if future.cancelled():
+                    continue
+
+                req = reqs[futures[future]]
+                try:
+                    counts[futures[future]] = future.result()
+                except Exception:
+                    msg = f"{req.vt_symbol}历史数据更新失败，触发异常：\n{traceback.format_exc()}"
+                    self.write_log(msg)
+
+                if callback and callback(finished, len(reqs)) is False:
+                    for f in futures:
+                        f.cancel()
+
+        return counts
+
+    def write_log(self, msg: str) -> None:
+        """
+        Write log with main engine, or print it if not available.
+        """
+        if self.main_engine:
+            self.main_engine.write_log(msg, "History")
+        else:
+            print(msg)
+
+    def update_symbols(self, vt_symbols: List[str], end: datetime = None) -> int:
+        """
+        Update data after newest bar of every symbol and interval with local
+        data concurrently, e.g. before strategies load data one by one.
+        Return number of bars downloaded.
+        """
+        if not end:
+            end = datetime.now(DB_TZ)
+
+        reqs = []
+
+        for vt_symbol in set(vt_symbols):
+            symbol, exchange = extract_vt_symbol(vt_symbol)
+
+            for interval in INTERVAL_DELTA_MAP.keys():
+                coverage = self.get_coverage(symbol, exchange, interval)
+                if not coverage:
+                    continue
+
+                req = HistoryRequest(
+                    symbol=symbol,
+                    exchange=exchange,
+                    interval=interval,
+                    start=DB_TZ.localize(coverage[1]),
+                    end=end
+                )
+                reqs.append(req)
+
+        return sum(self.update_many(reqs))
+
+    def load_bar_data(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime
+    ) -> List[BarData]:
+        """
+        Update missing data and load all data within [start, end] from
+        database.
+        """
+        self.update(symbol, exchange, interval, start, end)
+
+        return database_manager.load_bar_data(
+            symbol=symbol,
+            exchange=exchange,
+            interval=interval,
+            start=start,
+            end=end
+        )
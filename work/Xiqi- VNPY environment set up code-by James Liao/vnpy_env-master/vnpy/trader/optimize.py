@@ -0,0 +1,452 @@
+"""
+Parameter optimization shared by backtesting engines of apps.
+
+Backtesting is run in a process pool. The evaluate function (which must
+be defined at module level so that it can be pickled) receives a setting
+dict and returns statistics dict of backtesting. Data used by evaluate,
+e.g. history data loaded by engine, should be passed once to every worker
+process with initializer and initargs instead of with every setting.
+
+Backtesting engines of apps inherit OptimizationMixin, which creates a
+copy of engine in every worker with init_optimization and runs backtesting
+of settings with evaluate.
+"""
+
+import multiprocessing
+import random
+from abc import ABC, abstractmethod
+from itertools import product
+from time import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from deap import creator, base, tools, algorithms
+
+
+# Set deap algo
+creator.create("FitnessMax", base.Fitness, weights=(1.0,))
+creator.create("Individual", list, fitness=creator.FitnessMax)
+
+
+class OptimizationSetting:
+    """
+    Setting for runnning optimization.
+    """
+
+    def __init__(self):
+        """"""
+        self.params = {}
+        self.target_name = ""
+
+    def add_parameter(
+        self, name: str, start: float, end: float = None, step: float = None
+    ):
+        """"""
+        if not end and not step:
+            self.params[name] = [start]
+            return
+
+        if start >= end:
+            print("参数优化起始点必须小于终止点")
+            return
+
+        if step <= 0:
+            print("参数优化步进必须大于0")
+            return
+
+        value = start
+        value_list = []
+
+        while value <= end:
+            value_list.append(value)
+            value += step
+
+        self.params[name] = value_list
+
+    def set_target(self, target_name: str):
+        """"""
+        self.target_name = target_name
+
+    def generate_setting(self):
+        """"""
+        keys = self.params.keys()
+        values = self.params.values()
+        products = list(product(*values))
+
+        settings = []
+        for p in products:
+            setting = dict(zip(keys, p))
+            settings.append(setting)
+
+        return settings
+
+    def generate_setting_ga(self):
+        """"""
+        settings_ga = []
+        settings = self.generate_setting()
+        for d in settings:
+            param = [tuple(i) for i in d.items()]
+            settings_ga.append(param)
+        return settings_ga
+
+
+def check_optimization_setting(
+    optimization_setting: OptimizationSetting,
+    output: Callable = print
+) -> bool:
+    """"""
+    if not optimization_setting.generate_setting():
+        output("优化参数组合为空，请检查")
+        return False
+
+    if not optimization_setting.target_name:
+        output("优化目标未设置，请检查")
+        return False
+
+    return True
+
+
+def create_pool(
+    max_workers: int = None,
+    initializer: Callable = None,
+    initargs: tuple = ()
+):
+    """
+    Create process pool with spawn method (instead of fork on Linux).
+    """
+    if not max_workers:
+        max_workers = multiprocessing.cpu_count()
+
+    ctx = multiprocessing.get_context("spawn")
+    return ctx.Pool(max_workers, initializer, initargs)
+
+
+def run_bf_optimization(
+    evaluate: Callable[[dict], dict],
+    optimization_setting: OptimizationSetting,
+    max_workers: int = None,
+    initializer: Callable = None,
+    initargs: tuple = (),
+    output: Callable = print
+) -> List[Tuple[str, float, dict]]:
+    """
+    Run brute force (grid) optimization and return results sorted by
+    target value.
+    """
+    if not check_optimization_setting(optimization_setting, output):
+        return []
+
+    settings = optimization_setting.generate_setting()
+    target_name = optimization_setting.target_name
+
+    output(f"参数优化空间：{len(settings)}")
+
+    start = time()
+    results = []
+    output_step = max(len(settings) // 100, 1)
+
+    pool = create_pool(max_workers, initializer, initargs)
+
+    try:
+        for count, statistics in enumerate(pool.imap(evaluate, settings), 1):
+            setting = settings[count - 1]
+            results.append((str(setting), statistics[target_name], statistics))
+
+            if not count % output_step or count == len(settings):
+                cost = time() - start
+                eta = int(cost / count * (len(settings) - count))
+                output(f"优化进度：{count}/{len(settings)}，预计剩余{eta}秒")
+
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    results.sort(reverse=True, key=lambda result: result[1])
+
+    for value in results:
+        output(f"参数：{value[0]}, 目标：{value[1]}")
+
+    return results
+
+
+def run_ga_optimization(
+    evaluate: Callable[[dict], dict],
+    optimization_setting: OptimizationSetting,
+    population_size: int = 100,
+    ngen_size: int = 30,
+    max_workers: int = None,
+    initializer: Callable = None,
+    initargs: tuple = (),
+    output: Callable = print,
+    cache: Any = None
+) -> List[Tuple[dict, float, dict]]:
+    """
+    Run genetic algorithm optimization and return results on pareto front.
+
+    Individuals of every generation are evaluated in parallel, and every
+    setting is only evaluated once even if it appears again in later
+    generations.
+
+    Cache (if provided) keeps results across runs, with get(setting)
+    returning statistics or None, and put(setting_str, statistics) called
+    with every result as soon as it is calculated.
+    """
+    if not check_optimization_setting(optimization_setting, output):
+        return []
+
+    settings = optimization_setting.generate_setting_ga()
+    target_name = optimization_setting.target_name
+
+    # Define parameter generation function
+    def generate_parameter():
+        """"""
+        return random.choice(settings)
+
+    def mutate_individual(individual, indpb):
+        """"""
+        size = len(individual)
+        paramlist = generate_parameter()
+        for i in range(size):
+            if random.random() < indpb:
+                individual[i] = paramlist[i]
+        return individual,
+
+    pool = create_pool(max_workers, initializer, initargs)
+    evaluated: Dict[tuple, dict] = {}
+
+    def map_with_cache(func: Callable, individuals: Sequence[list]) -> List[tuple]:
+        """
+        Evaluate settings not calculated before in process pool.
+        """
+        keys = [tuple(individual) for individual in individuals]
+        new_keys = []
+
+        for key in dict.fromkeys(keys):
+            if key in evaluated:
+                continue
+
+            statistics = cache.get(dict(key)) if cache else None
+            if statistics:
+                evaluated[key] = statistics
+            else:
+                new_keys.append(key)
+
+        new_settings = [dict(key) for key in new_keys]
+        for key, statistics in zip(new_keys, pool.imap(func, new_settings)):
+            evaluated[key] = statistics
+
+            if cache:
+                cache.put(str(dict(key)), statistics)
+
+        return [(evaluated[key][target_name],) for key in keys]
+
+    # Set up genetic algorithem
+    toolbox = base.Toolbox()
+    toolbox.register("individual", tools.initIterate, creator.Individual, generate_parameter)
+    toolbox.register("population", tools.initRepeat, list, toolbox.individual)
+    toolbox.register("mate", tools.cxTwoPoint)
+    toolbox.register("mutate", mutate_individual, indpb=1)
+    toolbox.register("evaluate", evaluate)
+    toolbox.register("select", tools.selNSGA2)
+    toolbox.register("map", map_with_cache)
+
+    total_size = len(settings)
+    pop_size = population_size                      # number of individuals in each generation
+    lambda_ = pop_size                              # number of children to produce at each generation
+    mu = int(pop_size * 0.8)                        # number of individuals to select for the next generation
+
+    cxpb = 0.95         # probability that an offspring is produced by crossover
+    mutpb = 1 - cxpb    # probability that an offspring is produced by mutation
+    ngen = ngen_size    # number of generation
+
+    pop = toolbox.population(pop_size)
+    hof = tools.ParetoFront()               # end result of pareto front
+
+    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    np.set_printoptions(suppress=True)
+    stats.register("mean", np.mean, axis=0)
+    stats.register("std", np.std, axis=0)
+    stats.register("min", np.min, axis=0)
+    stats.register("max", np.max, axis=0)
+
+    # Run ga optimization
+    output(f"参数优化空间：{total_size}")
+    output(f"每代族群总数：{pop_size}")
+    output(f"优良筛选个数：{mu}")
+    output(f"迭代次数：{ngen}")
+    output(f"交叉概率：{cxpb:.0%}")
+    output(f"突变概率：{mutpb:.0%}")
+
+    start = time()
+
+    try:
+        algorithms.eaMuPlusLambda(
+            pop,
+            toolbox,
+            mu,
+            lambda_,
+            cxpb,
+            mutpb,
+            ngen,
+            stats,
+            halloffame=hof
+        )
+
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    cost = int(time() - start)
+    output(f"遗传算法优化完成，耗时{cost}秒，回测次数{len(evaluated)}")
+
+    # Return result list
+    results = []
+
+    for parameter_values in hof:
+        statistics = evaluated[tuple(parameter_values)]
+        setting = dict(parameter_values)
+        results.append((setting, statistics[target_name], statistics))
+
+    return results
+
+
+class OptimizationMixin(ABC):
+    """
+    Optimization with process pool for backtesting engines.
+
+    Engine provides keyword arguments of set_parameters and history data
+    loaded in main process, which are used to create engine of worker
+    process in init_optimization.
+    """
+
+    def run_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        output: bool = True,
+        max_workers: int = None
+    ) -> list:
+        """
+        Run grid optimization in process pool. History data is loaded
+        once here and sent to every worker process when it starts.
+        """
+        return run_bf_optimization(
+            evaluate,
+            optimization_setting,
+            max_workers=max_workers,
+            initializer=init_optimization,
+            initargs=self.get_optimization_args(),
+            output=self.get_optimization_output(output)
+        )
+
+    def run_ga_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        population_size: int = 100,
+        ngen_size: int = 30,
+        output: bool = True,
+        max_workers: int = None
+    ) -> list:
+        """
+        Run genetic algorithm optimization in process pool.
+        """
+        return run_ga_optimization(
+            evaluate,
+            optimization_setting,
+            population_size=population_size,
+            ngen_size=ngen_size,
+            max_workers=max_workers,
+            initializer=init_optimization,
+            initargs=self.get_optimization_args(),
+            output=self.get_optimization_output(output)
+        )
+
+    def get_optimization_args(self, data: Any = None) -> tuple:
+        """
+        Get arguments of init_optimization, history data is loaded if
+        not given.
+        """
+        if data is None:
+            data = self.get_optimization_data()
+
+        return (
+            self.get_optimization_engine_class(),
+            self.strategy_class,
+            self.get_optimization_parameters(),
+            data
+        )
+
+    def get_optimization_engine_class(self) -> type:
+        """
+        Get class of engine created in worker.
+        """
+        return self.__class__
+
+    def get_optimization_output(self, output: bool) -> Callable:
+        """"""
+        if output:
+            return self.output
+        return lambda msg: None
+
+    @abstractmethod
+    def get_optimization_parameters(self) -> dict:
+        """
+        Get keyword arguments of set_parameters for engine of worker.
+        """
+        pass
+
+    @abstractmethod
+    def get_optimization_data(self) -> Any:
+        """
+        Get history data loaded by main process for engine of worker.
+        """
+        pass
+
+    @abstractmethod
+    def set_optimization_data(self, data: Any) -> None:
+        """
+        Set history data into engine of worker.
+        """
+        pass
+
+
+# Engine of optimization worker process
+optimization_engine: OptimizationMixin = None
+
+
+def init_optimization(
+    engine_class: type,
+    strategy_class: type,
+    parameters: dict,
+    data: Any
+) -> None:
+    """
+    Initialize engine of optimization worker with history data loaded
+    by main process.
+    """
+    global optimization_engine
+
+    engine = engine_class()
+    engine.set_parameters(**parameters)
+    engine.strategy_class = strategy_class
+
+    # Suppress log of every backtesting
+    engine.output = lambda msg: None
+
+    engine.set_optimization_data(data)
+
+    optimization_engine = engine
+
+
+def evaluate(setting: dict) -> dict:
+    """
+    Run backtesting of setting in optimization worker.
+    """
+    engine = optimization_engine
+
+    engine.clear_data()
+    engine.add_strategy(engine.strategy_class, setting)
+    engine.run_backtesting()
+    engine.calculate_result()
+    return engine.calculate_statistics(output=False)
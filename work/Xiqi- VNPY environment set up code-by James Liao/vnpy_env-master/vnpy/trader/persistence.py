@@ -0,0 +1,212 @@
+"""
+Persistence of strategy data (variables) into json file in temp path.
+
+Updates are coalesced in memory and flushed by a background thread at most
+once per interval, so that the event thread never waits for disk I/O.
+Every update is encoded into json text immediately, so later changes of
+strategy variables do not affect data being saved.
+
+File is replaced atomically with a fully written temp file, so it is never
+left partially written after crash.
+"""
+
+import json
+from collections import defaultdict
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Any, Dict
+
+from vnpy.event.stats import LatencyHistogram
+
+from .utility import get_file_path, save_text_atomic
+
+
+class JsonDataStore:
+    """
+    Json file of data dict, which is saved with debounced, atomic writes.
+    """
+
+    def __init__(self, filename: str, interval: float = 1.0):
+        """"""
+        self.filename: str = filename
+        self.filepath = get_file_path(filename)
+        self.interval: float = interval
+
+        self.texts: Dict[str, str] = {}         # key: encoded value
+        self.pending: Dict[str, float] = {}     # key: time of first unsaved update
+
+        self.lock: Lock = Lock()                # protect texts and pending
+        self.write_lock: Lock = Lock()          # keep writes in order
+
+        self.active: bool = False
+        self.signal: Event = Event()
+        self.stopped: Event = Event()
+        self.thread: Thread = Thread(target=self.run, daemon=True)
+
+        self.update_count: int = 0
+        self.write_count: int = 0
+        self.error_count: int = 0
+        self.last_error: str = ""
+
+        # Time spent writing file, and time from update to saved of every key
+        self.write_latency: LatencyHistogram = LatencyHistogram()
+        self.key_latencies: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+
+    def load(self) -> Dict[str, Any]:
+        """
+        Load data saved last time and start background writer.
+
+        Complete temp file left by interrupted write is always newer than
+        the file, so it is used first.
+        """
+        temp_path = self.filepath.with_name(self.filepath.name + ".tmp")
+
+        data = None
+        recovered = False
+
+        for path in (temp_path, self.filepath):
+            if not path.exists():
+                continue
+
+            try:
+                with open(path, mode="r", encoding="UTF-8") as f:
+                    data = json.load(f)
+            except ValueError:
+                continue
+
+            recovered = path is temp_path
+            break
+
+        if data is None:
+            data = {}
+
+        with self.lock:
+            self.texts = {key: self.encode(value) for key, value in data.items()}
+            self.pending.clear()
+
+        if recovered or not self.filepath.exists():
+            self.save()
+
+        if not self.active:
+            self.active = True
+            self.thread.start()
+
+        return data
+
+    def update(self, key: str, value: Any) -> None:
+        """
+        Update value of key, which will be saved within interval.
+        """
+        text = self.encode(value)
+        now = perf_counter()
+
+        with self.lock:
+            self.texts[key] = text
+            self.pending.setdefault(key, now)
+            self.update_count += 1
+
+        self.signal.set()
+
+    def flush(self) -> None:
+        """
+        Save pending updates into file now.
+        """
+        with self.write_lock:
+            with self.lock:
+                if not self.pending:
+                    return
+                pending = self.pending
+                self.pending = {}
+
+            self.save(pending)
+
+    def save(self, pending: Dict[str, float] = None) -> None:
+        """"""
+        with self.lock:
+            text = self.compose()
+
+        start = perf_counter()
+
+        try:
+            save_text_atomic(self.filepath, text)
+        except OSError as e:
+            self.error_count += 1
+            self.last_error = str(e)
+
+            # Keep updates pending to retry later
+            if pending:
+                with self.lock:
+                    for key, update_time in pending.items():
+                        self.pending[key] = min(self.pending.get(key, update_time), update_time)
+                self.signal.set()
+            return
+
+        end = perf_counter()
+
+        self.write_count += 1
+        self.write_latency.add(end - start)
+
+        if pending:
+            for key, update_time in pending.items():
+                self.key_latencies[key].add(end - update_time)
+
+    def run(self) -> None:
+        """"""
+        while self.active:
+            self.signal.wait()
+            self.signal.clear()
+
+            # Wait for more updates coming within interval
+            self.stopped.wait(self.interval)
+            self.flush()
+
+    def close(self) -> None:
+        """
+        Stop background writer and save all pending updates.
+        """
+        if not self.active:
+            return
+
+        self.active = False
+        self.stopped.set()
+        self.signal.set()
+        self.thread.join()
+
+        self.flush()
+
+    def compose(self) -> str:
+        """
+        Generate text of whole file from encoded values, which is the same
+        as dumping the whole dict with indent.
+        """
+        if not self.texts:
+            return "{}"
+
+        items = [
+            f"    {self.encode(key)}: " + text.replace("\n", "\n    ")
+            for key, text in self.texts.items()
+        ]
+        return "{\n" + ",\n".join(items) + "\n}"
+
+    @staticmethod
+    def encode(value: Any) -> str:
+        """"""
+        return json.dumps(value, indent=4, ensure_ascii=False)
+
+    def get_stats(self) -> dict:
+        """
+        Get update and write count, write time and save latency (from update
+        to saved, in seconds) of every key.
+        """
+        return {
+            "updates": self.update_count,
+            "writes": self.write_count,
+            "errors": self.error_count,
+            "last_error": self.last_error,
+            "pending": len(self.pending),
+            "write": self.write_latency.to_dict(),
+            "keys": {
+                key: histogram.to_dict()
+                for key, histogram in list(self.key_latencies.items())
+            },
+        }
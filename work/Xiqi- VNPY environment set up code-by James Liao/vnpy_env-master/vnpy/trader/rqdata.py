@@ -41,6 +41,9 @@ class RqdataClient:
         self.inited: bool = False
         self.symbols: ndarray = None
 
+        # Connections for querying from several threads concurrently
+        self.pool_size: int = 4
+
     def init(self, username: str = "", password: str = "") -> bool:
         """"""
         if self.inited:
@@ -59,7 +62,7 @@ class RqdataClient:
                 self.password,
                 ("rqdatad-pro.ricequant.com", 16011),
                 use_pool=True,
-                max_pool_size=1
+                max_pool_size=self.pool_size
             )
 
             df = rqdata_all_instruments()
@@ -170,22 +173,37 @@ class RqdataClient:
 
         data: List[BarData] = []
 
-        if df is not None:
-            for ix, row in df.iterrows():
-                dt = row.name.to_pydatetime() - adjustment
-                dt = dt.replace(tzinfo=CHINA_TZ)
+        if df is not None and len(df):
+            # Convert columns into lists at once instead of iterating rows
+            dts = (df.index - adjustment).to_pydatetime()
+
+            if "open_interest" in df:
+                open_interests = df["open_interest"].tolist()
+            else:
+                open_interests = [0] * len(df)
+
+            columns = zip(
+                dts,
+                df["open"].tolist(),
+                df["high"].tolist(),
+                df["low"].tolist(),
+                df["close"].tolist(),
+                df["volume"].tolist(),
+                open_interests
+            )
 
+            for dt, open_price, high_price, low_price, close_price, volume, open_interest in columns:
                 bar = BarData(
                     symbol=symbol,
                     exchange=exchange,
                     interval=interval,
-                    datetime=dt,
-                    open_price=row["open"],
-                    high_price=row["high"],
-                    low_price=row["low"],
-                    close_price=row["close"],
-                    volume=row["volume"],
-                    open_interest=row.get("open_interest", 0),
+                    datetime=dt.replace(tzinfo=CHINA_TZ),
+                    open_price=open_price,
+                    high_price=high_price,
+                    low_price=low_price,
+                    close_price=close_price,
+                    volume=volume,
+                    open_interest=open_interest,
                     gateway_name="RQ"
                 )
 
@@ -29,7 +29,7 @@ SETTINGS: Dict[str, Any] = {
 
     "database.timezone": get_localzone().zone,
     "database.driver": "sqlite",                # see database.Driver
-    "database.database": "database.db",         # for sqlite, use this as filepath
+    "database.database": "database.db",         # for sqlite/numpy, use this as file/folder path
     "database.host": "localhost",
     "database.port": 3306,
     "database.user": "root",
@@ -4,11 +4,15 @@ General utility functions.
 
 import json
 import logging
+import os
+import pickle
 import sys
+from collections import deque
 from pathlib import Path
-from typing import Callable, Dict, Tuple, Union
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+from datetime import tzinfo
 from decimal import Decimal
-from math import floor, ceil
+from math import floor, ceil, sqrt
 
 import numpy as np
 import talib
@@ -108,13 +112,23 @@ def save_json(filename: str, data: dict) -> None:
     Save data into json file in temp path.
     """
     filepath = get_file_path(filename)
-    with open(filepath, mode="w+", encoding="UTF-8") as f:
-        json.dump(
-            data,
-            f,
-            indent=4,
-            ensure_ascii=False
-        )
+    text = json.dumps(data, indent=4, ensure_ascii=False)
+    save_text_atomic(filepath, text)
+
+
+def save_text_atomic(filepath: Path, text: str) -> None:
+    """
+    Write text into a temp file and then replace the target file with it,
+    so that the file is never left partially written after crash.
+    """
+    temp_path = filepath.with_name(filepath.name + ".tmp")
+
+    with open(temp_path, mode="w", encoding="UTF-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp_path, filepath)
 
 
 def round_to(value: float, target: float) -> float:
@@ -147,6 +161,31 @@ def ceil_to(value: float, target: float) -> float:
     return result
 
 
+def round_to_array(values: np.ndarray, target: float) -> np.ndarray:
+    """
+    Vectorized version of round_to, with the same result.
+
+    Float division differs from decimal division of round_to only by a
+    few ulps, which matters when quotient is close to half, so tick count
+    of these values is calculated with decimal again. Result of
+    multiplying tick count by target is computed as exact decimal
+    fraction.
+    """
+    values = np.asarray(values, dtype=float)
+    target = Decimal(str(target))
+    digits = max(0, -target.as_tuple().exponent)
+    scale = 10 ** digits
+
+    quotients = values / float(target)
+    ticks = np.round(quotients)
+
+    near_half = np.abs(np.abs(quotients - np.trunc(quotients)) - 0.5) < 1e-6
+    for ix in np.flatnonzero(near_half):
+        ticks[ix] = int(round(Decimal(str(float(values[ix]))) / target))
+
+    return ticks * int(target * scale) / scale
+
+
 def get_digits(value: float) -> int:
     """
     Get number of digits after decimal point.
@@ -804,6 +843,864 @@ class ArrayManager(object):
         return result[-1]
 
 
+def get_true_range(high_price: float, low_price: float, pre_close: float) -> float:
+    """
+    Get true range of bar with close price of previous bar.
+    """
+    return max(
+        high_price - low_price,
+        abs(high_price - pre_close),
+        abs(low_price - pre_close)
+    )
+
+
+class RingArrayManager(ArrayManager):
+    """
+    ArrayManager with the same interface, but:
+    1. bar data is kept in ring buffers, so update_bar costs O(1) instead
+    of shifting all arrays
+    2. latest values of sma/ema/std/atr/rsi/donchian (and boll/keltner
+    built on them) are updated incrementally on every bar after requested
+    for the first time, so getting them costs O(1) instead of running
+    talib over the whole window
+
+    Every value is written twice into a buffer of double size, then the
+    latest [size] values are always a contiguous view of the buffer.
+
+    EMA, ATR and RSI are kept equal to talib running over the window (as
+    ArrayManager does): the seed average of the first n values and the
+    exponentially weighted sum of the rest are both slided with the window.
+
+    Arrays (array=True) and other indicators are still calculated with
+    talib over the window.
+    """
+
+    def __init__(self, size: int = 100):
+        """"""
+        self.count: int = 0
+        self.size: int = size
+        self.inited: bool = False
+
+        # Rows of open, high, low, close, volume and open interest
+        self.buffer: np.ndarray = np.zeros((6, size * 2))
+        self.head: int = 0
+
+        # Indicator states of every window length
+        self.sma_sums: Dict[int, float] = {}
+        self.std_sums: Dict[int, List[float]] = {}
+        self.ema_states: Dict[int, List[float]] = {}
+        self.atr_states: Dict[int, List[float]] = {}
+        self.rsi_states: Dict[int, Tuple[List[float], List[float]]] = {}
+        self.donchian_queues: Dict[int, Tuple[deque, deque]] = {}
+
+    def update_bar(self, bar: BarData) -> None:
+        """
+        Update new bar data into array manager.
+        """
+        self.count += 1
+        if not self.inited and self.count >= self.size:
+            self.inited = True
+
+        pre_close = self.buffer[3, self.head + self.size - 1]
+        dropped_close = self.buffer[3, self.head]
+
+        values = (
+            bar.open_price,
+            bar.high_price,
+            bar.low_price,
+            bar.close_price,
+            bar.volume,
+            bar.open_interest
+        )
+        self.buffer[:, self.head] = values
+        self.buffer[:, self.head + self.size] = values
+        self.head = (self.head + 1) % self.size
+
+        self.update_indicators(bar, pre_close, dropped_close)
+
+    def update_indicators(
+        self,
+        bar: BarData,
+        pre_close: float,
+        dropped_close: float
+    ) -> None:
+        """
+        Update states of indicators requested before.
+        """
+        high = self.high_array
+        low = self.low_array
+        close = self.close_array
+        close_price = bar.close_price
+        high_price = bar.high_price
+        low_price = bar.low_price
+
+        # Sums are recalculated once every [size] bars to avoid error
+        # accumulation, which costs O(1) on average.
+        resync = not self.count % self.size
+
+        for n in self.sma_sums:
+            if resync:
+                self.sma_sums[n] = float(close[-n:].sum())
+            else:
+                self.sma_sums[n] += close_price - close[-n - 1]
+
+        for n, sums in self.std_sums.items():
+            if resync:
+                self.std_sums[n] = self.init_std(n)
+            else:
+                shift = sums[0]
+                old = close[-n - 1] - shift
+                new = close_price - shift
+                sums[1] += new - old
+                sums[2] += new * new - old * old
+
+        # EMA smooths close prices of the window
+        for n, state in self.ema_states.items():
+            if resync:
+                self.ema_states[n] = self.init_ema(n)
+            else:
+                self.slide_smoothing(
+                    state, n, 2 / (n + 1), self.size,
+                    dropped_close, close[n - 1], close_price
+                )
+
+        # ATR smooths true ranges of the window, starting from the second bar
+        if self.atr_states:
+            dropped_tr = get_true_range(high[0], low[0], dropped_close)
+            new_tr = get_true_range(high_price, low_price, pre_close)
+
+            for n, state in self.atr_states.items():
+                if resync:
+                    self.atr_states[n] = self.init_atr(n)
+                else:
+                    entered_tr = get_true_range(high[n], low[n], close[n - 1])
+                    self.slide_smoothing(
+                        state, n, 1 / n, self.size - 1,
+                        dropped_tr, entered_tr, new_tr
+                    )
+
+        # RSI smooths gains and losses of the window separately
+        if self.rsi_states:
+            dropped_diff = close[0] - dropped_close
+            new_diff = close_price - pre_close
+
+            for n, (gains, losses) in self.rsi_states.items():
+                if resync:
+                    self.rsi_states[n] = self.init_rsi(n)
+                else:
+                    entered_diff = close[n] - close[n - 1]
+                    self.slide_smoothing(
+                        gains, n, 1 / n, self.size - 1,
+                        max(dropped_diff, 0), max(entered_diff, 0), max(new_diff, 0)
+                    )
+                    self.slide_smoothing(
+                        losses, n, 1 / n, self.size - 1,
+                        max(-dropped_diff, 0), max(-entered_diff, 0), max(-new_diff, 0)
+                    )
+
+        for n, (highs, lows) in self.donchian_queues.items():
+            while highs and highs[-1][1] <= high_price:
+                highs.pop()
+            highs.append((self.count, high_price))
+            if highs[0][0] <= self.count - n:
+                highs.popleft()
+
+            while lows and lows[-1][1] >= low_price:
+                lows.pop()
+            lows.append((self.count, low_price))
+            if lows[0][0] <= self.count - n:
+                lows.popleft()
+
+    @property
+    def open_array(self) -> np.ndarray:
+        """"""
+        return self.buffer[0, self.head:self.head + self.size]
+
+    @property
+    def high_array(self) -> np.ndarray:
+        """"""
+        return self.buffer[1, self.head:self.head + self.size]
+
+    @property
+    def low_array(self) -> np.ndarray:
+        """"""
+        return self.buffer[2, self.head:self.head + self.size]
+
+    @property
+    def close_array(self) -> np.ndarray:
+        """"""
+        return self.buffer[3, self.head:self.head + self.size]
+
+    @property
+    def volume_array(self) -> np.ndarray:
+        """"""
+        return self.buffer[4, self.head:self.head + self.size]
+
+    @property
+    def open_interest_array(self) -> np.ndarray:
+        """"""
+        return self.buffer[5, self.head:self.head + self.size]
+
+    def sma(self, n: int, array: bool = False) -> Union[float, np.ndarray]:
+        """
+        Simple moving average.
+        """
+        if array or not 0 < n < self.size:
+            return super().sma(n, array)
+
+        if n not in self.sma_sums:
+            self.sma_sums[n] = float(self.close[-n:].sum())
+
+        return self.sma_sums[n] / n
+
+    def ema(self, n: int, array: bool = False) -> Union[float, np.ndarray]:
+        """
+        Exponential moving average.
+        """
+        if array or not 0 < n < self.size:
+            return super().ema(n, array)
+
+        if n not in self.ema_states:
+            self.ema_states[n] = self.init_ema(n)
+
+        return self.get_smoothed(self.ema_states[n], n, 2 / (n + 1), self.size)
+
+    def init_ema(self, n: int) -> List[float]:
+        """
+        Calculate smoothing state of close prices for EMA.
+        """
+        return self.init_smoothing(self.close.tolist(), n, 2 / (n + 1))
+
+    def init_smoothing(self, values: List[float], n: int, alpha: float) -> List[float]:
+        """
+        Calculate state of exponential smoothing over values in the same way
+        as talib, which is seeded with average of the first n values:
+        [sum of the first n values, weighted sum of the rest values].
+        """
+        decay = 1 - alpha
+        smoothed = 0
+
+        for value in values[n:]:
+            smoothed = smoothed * decay + alpha * value
+
+        return [sum(values[:n]), smoothed]
+
+    def slide_smoothing(
+        self,
+        state: List[float],
+        n: int,
+        alpha: float,
+        length: int,
+        dropped: float,
+        entered: float,
+        new: float
+    ) -> None:
+        """
+        Update smoothing state of values in window of length when the window
+        moves forward: dropped value leaves the seed, entered value (the
+        n-th one) moves from the weighted sum into the seed, and new value
+        is added into the weighted sum.
+        """
+        decay = 1 - alpha
+        state[0] += entered - dropped
+
+        smoothed = state[1] - alpha * decay ** (length - n - 1) * entered
+        state[1] = smoothed * decay + alpha * new
+
+    def get_smoothed(
+        self,
+        state: List[float],
+        n: int,
+        alpha: float,
+        length: int
+    ) -> float:
+        """
+        Get smoothed value from state of values in window of length.
+        """
+        return state[0] / n * (1 - alpha) ** (length - n) + state[1]
+
+    def init_std(self, n: int) -> List[float]:
+        """
+        Calculate sums of last n close prices for standard deviation.
+        Prices are shifted by the latest one to keep sum of squares small.
+        """
+        shift = float(self.close[-1])
+        data = self.close[-n:] - shift
+        return [shift, float(data.sum()), float((data * data).sum())]
+
+    def std(self, n: int, array: bool = False) -> Union[float, np.ndarray]:
+        """
+        Standard deviation.
+        """
+        if array or not 0 < n < self.size:
+            return super().std(n, array)
+
+        if n not in self.std_sums:
+            self.std_sums[n] = self.init_std(n)
+
+        _, total, square_total = self.std_sums[n]
+        mean = total / n
+        variance = square_total / n - mean * mean
+
+        # Same threshold as talib
+        if variance < 1e-8:
+            return 0
+        return sqrt(variance)
+
+    def atr(self, n: int, array: bool = False) -> Union[float, np.ndarray]:
+        """
+        ATR.
+        """
+        if array or not 0 < n < self.size:
+            return super().atr(n, array)
+
+        if n not in self.atr_states:
+            self.atr_states[n] = self.init_atr(n)
+
+        return self.get_smoothed(self.atr_states[n], n, 1 / n, self.size - 1)
+
+    def init_atr(self, n: int) -> List[float]:
+        """
+        Calculate smoothing state of true ranges for ATR.
+        """
+        high = self.high[1:]
+        low = self.low[1:]
+        pre_close = self.close[:-1]
+
+        tr = np.maximum(
+            high - low,
+            np.maximum(np.abs(high - pre_close), np.abs(low - pre_close))
+        )
+        return self.init_smoothing(tr.tolist(), n, 1 / n)
+
+    def rsi(self, n: int, array: bool = False) -> Union[float, np.ndarray]:
+        """
+        Relative strenght index.
+        """
+        if array or not 0 < n < self.size:
+            return super().rsi(n, array)
+
+        if n not in self.rsi_states:
+            self.rsi_states[n] = self.init_rsi(n)
+
+        gains, losses = self.rsi_states[n]
+        gain = self.get_smoothed(gains, n, 1 / n, self.size - 1)
+        loss = self.get_smoothed(losses, n, 1 / n, self.size - 1)
+        total = gain + loss
+
+        # Same threshold as talib
+        if -1e-8 < total < 1e-8:
+            return 0
+        return 100 * gain / total
+
+    def init_rsi(self, n: int) -> Tuple[List[float], List[float]]:
+        """
+        Calculate smoothing states of gains and losses for RSI.
+        """
+        diffs = np.diff(self.close)
+        gains = np.maximum(diffs, 0).tolist()
+        losses = np.maximum(-diffs, 0).tolist()
+
+        return (
+            self.init_smoothing(gains, n, 1 / n),
+            self.init_smoothing(losses, n, 1 / n)
+        )
+
+    def donchian(
+        self, n: int, array: bool = False
+    ) -> Union[
+        Tuple[np.ndarray, np.ndarray],
+        Tuple[float, float]
+    ]:
+        """
+        Donchian Channel.
+        """
+        if array or not 0 < n < self.size:
+            return super().donchian(n, array)
+
+        if n not in self.donchian_queues:
+            self.donchian_queues[n] = self.init_donchian(n)
+
+        highs, lows = self.donchian_queues[n]
+        return highs[0][1], lows[0][1]
+
+    def init_donchian(self, n: int) -> Tuple[deque, deque]:
+        """
+        Create monotonic queues of (count, price) for highest high and
+        lowest low of last n bars.
+        """
+        highs = deque()
+        lows = deque()
+
+        start = self.count - n + 1
+        data = zip(self.high[-n:].tolist(), self.low[-n:].tolist())
+
+        for ix, (high_price, low_price) in enumerate(data, start):
+            while highs and highs[-1][1] <= high_price:
+                highs.pop()
+            highs.append((ix, high_price))
+
+            while lows and lows[-1][1] >= low_price:
+                lows.pop()
+            lows.append((ix, low_price))
+
+        return highs, lows
+
+
+class BarArrays:
+    """
+    Columnar container of bar data of one symbol/exchange/interval:
+    datetime is stored as numpy datetime64 (wall clock time without
+    timezone) and prices/volumes as float64 arrays.
+
+    BarData objects are only created when requested with get_bar or
+    iter_bars.
+    """
+
+    fields: List[str] = [
+        "open_price",
+        "high_price",
+        "low_price",
+        "close_price",
+        "volume",
+        "open_interest",
+    ]
+
+    def __init__(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        datetime: np.ndarray,
+        open_price: np.ndarray,
+        high_price: np.ndarray,
+        low_price: np.ndarray,
+        close_price: np.ndarray,
+        volume: np.ndarray,
+        open_interest: np.ndarray,
+        tzinfo: tzinfo = None,
+        gateway_name: str = "DB"
+    ):
+        """"""
+        self.symbol: str = symbol
+        self.exchange: Exchange = exchange
+        self.interval: Interval = interval
+        self.tzinfo: tzinfo = tzinfo
+        self.gateway_name: str = gateway_name
+
+        self.datetime: np.ndarray = datetime
+        self.open_price: np.ndarray = open_price
+        self.high_price: np.ndarray = high_price
+        self.low_price: np.ndarray = low_price
+        self.close_price: np.ndarray = close_price
+        self.volume: np.ndarray = volume
+        self.open_interest: np.ndarray = open_interest
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.datetime)
+
+    @classmethod
+    def from_bars(
+        cls,
+        bars: Sequence[BarData],
+        symbol: str = "",
+        exchange: Exchange = None,
+        interval: Interval = None
+    ) -> "BarArrays":
+        """
+        Convert a list of bar data into arrays. All bars should have
+        the same symbol, exchange, interval and timezone.
+        """
+        if bars:
+            first = bars[0]
+            symbol = first.symbol
+            exchange = first.exchange
+            interval = first.interval
+            tz = first.datetime.tzinfo
+            gateway_name = first.gateway_name
+        else:
+            tz = None
+            gateway_name = "DB"
+
+        if tz:
+            dts = [bar.datetime.replace(tzinfo=None) for bar in bars]
+        else:
+            dts = [bar.datetime for bar in bars]
+
+        data = {"datetime": np.array(dts, dtype="datetime64[us]")}
+
+        for name in cls.fields:
+            data[name] = np.array(
+                [getattr(bar, name) for bar in bars], dtype=float
+            )
+
+        return cls(
+            symbol,
+            exchange,
+            interval,
+            tzinfo=tz,
+            gateway_name=gateway_name,
+            **data
+        )
+
+    @classmethod
+    def concatenate(cls, arrays_list: Sequence["BarArrays"]) -> "BarArrays":
+        """
+        Join arrays of several periods (in time order) into one.
+        """
+        arrays_list = [arrays for arrays in arrays_list if len(arrays)]
+        if not arrays_list:
+            return None
+
+        first = arrays_list[0]
+        data = {"datetime": np.concatenate([a.datetime for a in arrays_list])}
+
+        for name in cls.fields:
+            data[name] = np.concatenate([getattr(a, name) for a in arrays_list])
+
+        return cls(
+            first.symbol,
+            first.exchange,
+            first.interval,
+            tzinfo=first.tzinfo,
+            gateway_name=first.gateway_name,
+            **data
+        )
+
+    def save(self, path: Union[str, Path]) -> None:
+        """
+        Save arrays into folder as .npy files, which can be loaded with
+        memory mapping (e.g. shared by optimization processes).
+        """
+        folder = Path(path)
+        folder.mkdir(parents=True, exist_ok=True)
+
+        for name in ["datetime"] + self.fields:
+            np.save(folder.joinpath(f"{name}.npy"), getattr(self, name))
+
+        meta = {
+            "symbol": self.symbol,
+            "exchange": self.exchange,
+            "interval": self.interval,
+            "tzinfo": self.tzinfo,
+            "gateway_name": self.gateway_name,
+        }
+        with open(folder.joinpath("meta.pkl"), mode="wb") as f:
+            pickle.dump(meta, f)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "BarArrays":
+        """
+        Load arrays saved by save. With mmap, arrays are read-only views
+        of the files, so no data is copied into process memory.
+        """
+        folder = Path(path)
+
+        if mmap:
+            mmap_mode = "r"
+        else:
+            mmap_mode = None
+
+        data = {}
+        for name in ["datetime"] + cls.fields:
+            data[name] = np.load(folder.joinpath(f"{name}.npy"), mmap_mode=mmap_mode)
+
+        with open(folder.joinpath("meta.pkl"), mode="rb") as f:
+            meta = pickle.load(f)
+
+        return cls(
+            meta["symbol"],
+            meta["exchange"],
+            meta["interval"],
+            tzinfo=meta["tzinfo"],
+            gateway_name=meta["gateway_name"],
+            **data
+        )
+
+    def get_dates(self) -> np.ndarray:
+        """
+        Get date of every bar as datetime64[D] array.
+        """
+        return self.datetime.astype("datetime64[D]")
+
+    def get_bar(self, ix: int) -> BarData:
+        """
+        Create bar data object of index ix.
+        """
+        dt = self.datetime[ix].item()
+        if self.tzinfo:
+            dt = dt.replace(tzinfo=self.tzinfo)
+
+        return BarData(
+            symbol=self.symbol,
+            exchange=self.exchange,
+            datetime=dt,
+            interval=self.interval,
+            volume=self.volume[ix].item(),
+            open_interest=self.open_interest[ix].item(),
+            open_price=self.open_price[ix].item(),
+            high_price=self.high_price[ix].item(),
+            low_price=self.low_price[ix].item(),
+            close_price=self.close_price[ix].item(),
+            gateway_name=self.gateway_name
+        )
+
+    def iter_bars(
+        self,
+        start: int = 0,
+        end: int = None,
+        chunk_size: int = 10000
+    ) -> Iterator[BarData]:
+        """
+        Generate bar data objects of index range [start, end) lazily.
+
+        Arrays are converted to python objects chunk by chunk, which is
+        much faster than item access on numpy arrays.
+        """
+        if end is None:
+            end = len(self)
+
+        symbol = self.symbol
+        exchange = self.exchange
+        interval = self.interval
+        tz = self.tzinfo
+        gateway_name = self.gateway_name
+
+        for chunk_start in range(start, end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, end)
+            s = slice(chunk_start, chunk_end)
+
+            columns = zip(
+                self.datetime[s].tolist(),
+                self.open_price[s].tolist(),
+                self.high_price[s].tolist(),
+                self.low_price[s].tolist(),
+                self.close_price[s].tolist(),
+                self.volume[s].tolist(),
+                self.open_interest[s].tolist(),
+            )
+
+            for dt, open_price, high_price, low_price, close_price, volume, open_interest in columns:
+                if tz:
+                    dt = dt.replace(tzinfo=tz)
+
+                yield BarData(
+                    symbol=symbol,
+                    exchange=exchange,
+                    datetime=dt,
+                    interval=interval,
+                    volume=volume,
+                    open_interest=open_interest,
+                    open_price=open_price,
+                    high_price=high_price,
+                    low_price=low_price,
+                    close_price=close_price,
+                    gateway_name=gateway_name
+                )
+
+
+def aggregate_bar_arrays(
+    symbol: str,
+    exchange: Exchange,
+    interval: Interval,
+    datetime: np.ndarray,
+    starts: np.ndarray,
+    open_price: np.ndarray,
+    high_price: np.ndarray,
+    low_price: np.ndarray,
+    close_price: np.ndarray,
+    volume: np.ndarray,
+    open_interest: np.ndarray,
+    tzinfo: tzinfo = None,
+    gateway_name: str = ""
+) -> BarArrays:
+    """
+    Aggregate groups of rows (beginning at index of starts) into bars.
+    """
+    if not len(starts):
+        empty = np.array([], dtype=float)
+        return BarArrays(
+            symbol,
+            exchange,
+            interval,
+            np.array([], dtype="datetime64[us]"),
+            empty, empty, empty, empty, empty, empty,
+            tzinfo=tzinfo,
+            gateway_name=gateway_name
+        )
+
+    ends = np.append(starts[1:], len(close_price)) - 1
+
+    return BarArrays(
+        symbol,
+        exchange,
+        interval,
+        datetime,
+        open_price=open_price[starts],
+        high_price=np.maximum.reduceat(high_price, starts),
+        low_price=np.minimum.reduceat(low_price, starts),
+        close_price=close_price[ends],
+        volume=np.add.reduceat(volume, starts),
+        open_interest=open_interest[ends],
+        tzinfo=tzinfo,
+        gateway_name=gateway_name
+    )
+
+
+def generate_bar_arrays(
+    datetime: np.ndarray,
+    last_price: np.ndarray,
+    volume: np.ndarray,
+    open_interest: np.ndarray,
+    symbol: str = "",
+    exchange: Exchange = None,
+    tzinfo: tzinfo = None,
+    gateway_name: str = "",
+    include_unfinished: bool = False
+) -> BarArrays:
+    """
+    Batch version of BarGenerator.update_tick, which resamples tick data
+    arrays (datetime64 of wall clock time, last price, cumulative volume
+    and open interest) into 1 minute bar arrays with numpy.
+
+    Same as update_tick:
+    1. ticks with 0 last price or older timestamp are filtered
+    2. a new bar starts when minute of tick changes
+    3. bar volume is sum of positive volume changes between ticks
+
+    The last bar is still unfinished as it is in BarGenerator, and only
+    returned with include_unfinished.
+    """
+    datetime = np.asarray(datetime, dtype="datetime64[us]")
+    last_price = np.asarray(last_price, dtype=float)
+    volume = np.asarray(volume, dtype=float)
+    open_interest = np.asarray(open_interest, dtype=float)
+
+    # Filter tick data with 0 last price
+    mask = last_price != 0
+    datetime = datetime[mask]
+    last_price = last_price[mask]
+    volume = volume[mask]
+    open_interest = open_interest[mask]
+
+    # Filter tick data with older timestamp than any tick before
+    mask = datetime == np.maximum.accumulate(datetime)
+    datetime = datetime[mask]
+    last_price = last_price[mask]
+    volume = volume[mask]
+    open_interest = open_interest[mask]
+
+    minutes = datetime.astype("datetime64[m]")
+    minute_of_hour = minutes.astype(np.int64) % 60
+    starts = np.flatnonzero(np.diff(minute_of_hour, prepend=-1))
+
+    volume_change = np.maximum(np.diff(volume, prepend=volume[:1]), 0)
+
+    # Bar datetime is the last tick datetime with second cut off
+    ends = np.append(starts[1:], len(datetime)) - 1
+    bar_datetime = minutes[ends[ends >= 0]].astype("datetime64[us]")
+
+    # Only ticks of finished bars are aggregated
+    if include_unfinished or not len(starts):
+        count = len(datetime)
+    else:
+        count = starts[-1]
+        starts = starts[:-1]
+        bar_datetime = bar_datetime[:-1]
+
+    return aggregate_bar_arrays(
+        symbol,
+        exchange,
+        Interval.MINUTE,
+        bar_datetime,
+        starts,
+        last_price[:count],
+        last_price[:count],
+        last_price[:count],
+        last_price[:count],
+        volume_change[:count],
+        open_interest[:count],
+        tzinfo,
+        gateway_name
+    )
+
+
+def generate_window_arrays(
+    bars: BarArrays,
+    window: int,
+    interval: Interval = Interval.MINUTE,
+    include_unfinished: bool = False
+) -> BarArrays:
+    """
+    Batch version of BarGenerator.update_bar, which resamples 1 minute bar
+    arrays into x minute, x hour or daily bar arrays with numpy.
+
+    Windows are split in the same way as update_bar:
+    1. x minute bar finishes after bar with (minute + 1) divisible by x
+    2. x hour bar finishes on every x changes of hour, including the
+    first bar of the new hour
+    3. daily bar (not supported by BarGenerator) finishes before bar of
+    the next day
+
+    Volume of 1 minute bars is truncated into integer before summed up
+    like update_bar. The last unfinished window is only returned with
+    include_unfinished. ValueError is raised for other intervals.
+    """
+    if interval not in (Interval.MINUTE, Interval.HOUR, Interval.DAILY):
+        raise ValueError(f"Unsupported interval: {interval}")
+
+    datetime = bars.datetime
+
+    if interval == Interval.MINUTE:
+        minute_of_hour = datetime.astype("datetime64[m]").astype(np.int64) % 60
+        finished = (minute_of_hour + 1) % window == 0
+    elif interval == Interval.HOUR:
+        hours = datetime.astype("datetime64[h]")
+        hour_changed = np.diff(hours, prepend=hours[:1]) != np.timedelta64(0, "h")
+        change_count = np.cumsum(hour_changed)
+        finished = hour_changed & (change_count % window == 0)
+    else:
+        days = datetime.astype("datetime64[D]")
+        finished = np.append(days[1:] != days[:-1], False)
+
+    ends = np.flatnonzero(finished)
+    starts = np.concatenate(([0], ends + 1))
+
+    # Only rows of finished windows are aggregated
+    if include_unfinished:
+        starts = starts[starts < len(datetime)]
+        count = len(datetime)
+    else:
+        starts = starts[:-1]
+        count = ends[-1] + 1 if len(ends) else 0
+
+    # Window bar datetime is the first bar datetime cut off to minute
+    # (x minute bar) or hour (others), daily bar uses the date
+    if interval == Interval.MINUTE:
+        window_datetime = datetime[starts].astype("datetime64[m]")
+    elif interval == Interval.HOUR:
+        window_datetime = datetime[starts].astype("datetime64[h]")
+    else:
+        window_datetime = datetime[starts].astype("datetime64[D]")
+
+    return aggregate_bar_arrays(
+        bars.symbol,
+        bars.exchange,
+        interval,
+        window_datetime.astype("datetime64[us]"),
+        starts,
+        bars.open_price[:count],
+        bars.high_price[:count],
+        bars.low_price[:count],
+        bars.close_price[:count],
+        np.trunc(bars.volume[:count]),
+        bars.open_interest[:count],
+        bars.tzinfo,
+        bars.gateway_name
+    )
+
+
 def virtual(func: Callable) -> Callable:
     """
     mark a function as "virtual", which means that this function can be override.